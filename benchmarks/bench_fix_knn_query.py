@@ -0,0 +1,76 @@
+"""
+Micro-benchmark for `scarf.ann.fix_knn_query`.
+
+Compares the vectorized implementation against the earlier per-row loop at various
+rates of missed self-recall and checks that both give identical output.
+
+Usage: python benchmarks/bench_fix_knn_query.py [n_cells] [k]
+"""
+
+import sys
+import timeit
+import numpy as np
+from scarf.ann import fix_knn_query
+
+
+def fix_knn_query_loop(
+    indices: np.ndarray, distances: np.ndarray, ref_idx: np.ndarray
+):
+    # Earlier implementation, kept here as reference
+    fixed_ind, fixed_dist = indices.copy()[:, 1:], distances.copy()[:, 1:]
+    mis_idx = indices[:, 0].reshape(1, -1)[0] != ref_idx
+    n_mis = mis_idx.sum()
+    if n_mis > 0:
+        for n, i, j, k in zip(
+            np.where(mis_idx)[0], ref_idx[mis_idx], indices[mis_idx], distances[mis_idx]
+        ):
+            p = np.where(j == i)[0]
+            if len(p) > 0:
+                p = p[0]
+                j = np.array(list(j[:p]) + list(j[p + 1 :]))
+                k = np.array(list(k[:p]) + list(k[p + 1 :]))
+            else:
+                j = j[:-1]
+                k = k[:-1]
+            fixed_ind[n] = j
+            fixed_dist[n] = k
+    return fixed_ind, fixed_dist, n_mis
+
+
+def make_query(n_cells: int, k: int, miss_rate: float, seed: int = 0):
+    """
+    Creates a mock KNN query result for `n_cells` self-queried cells. A fraction,
+    `miss_rate`, of the cells do not have themselves as the first neighbour; half of
+    these have the self loop at a later position and the other half not at all.
+    """
+    rng = np.random.default_rng(seed)
+    ref_idx = np.arange(n_cells)
+    indices = rng.integers(0, n_cells, size=(n_cells, k + 1)).astype(np.uint64)
+    indices[indices == ref_idx.reshape(-1, 1)] = n_cells  # no accidental self loops
+    indices[:, 0] = ref_idx
+    distances = np.sort(rng.random((n_cells, k + 1)), axis=1)
+    distances[:, 0] = 0
+    mis = np.where(rng.random(n_cells) < miss_rate)[0]
+    shifted = mis[: len(mis) // 2]
+    pos = rng.integers(1, k + 1, size=len(shifted))
+    indices[shifted, 0] = n_cells + 1
+    indices[shifted, pos] = shifted
+    indices[mis[len(mis) // 2 :], 0] = n_cells + 1
+    return indices, distances, ref_idx
+
+
+def main(n_cells: int = 100000, k: int = 11):
+    print(f"n_cells={n_cells}, k={k}")
+    print(f"{'miss rate':>10} {'loop (s)':>10} {'vectorized (s)':>15} {'speedup':>8}")
+    for miss_rate in [0, 0.01, 0.05, 0.2, 0.5, 1]:
+        args = make_query(n_cells, k, miss_rate)
+        a, b = fix_knn_query_loop(*args), fix_knn_query(*args)
+        assert np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1])
+        assert a[2] == b[2]
+        t_loop = min(timeit.repeat(lambda: fix_knn_query_loop(*args), number=1, repeat=3))
+        t_vec = min(timeit.repeat(lambda: fix_knn_query(*args), number=1, repeat=3))
+        print(f"{miss_rate:>10} {t_loop:>10.4f} {t_vec:>15.4f} {t_loop / t_vec:>8.1f}")
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:]])
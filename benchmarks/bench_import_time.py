@@ -0,0 +1,74 @@
+"""
+Import-time benchmark for `scarf`.
+
+Measures, in fresh interpreters, the time taken by a bare `import scarf` and by the first access of
+`scarf.DataStore` (which loads the heavy dependencies). Also checks that a bare `import scarf` does not
+load any of the heavy dependencies, and exits with an error if it does or if the bare import is slower
+than `max_ms` milliseconds.
+
+Usage: python benchmarks/bench_import_time.py [n_repeats] [max_ms]
+"""
+
+import sys
+import subprocess
+import numpy as np
+
+HEAVY_MODULES = [
+    "dask",
+    "zarr",
+    "numba",
+    "pandas",
+    "scipy",
+    "h5py",
+    "requests",
+    "matplotlib",
+    "seaborn",
+    "cmocean",
+]
+
+SNIPPETS = {
+    "import scarf": "import scarf",
+    "scarf.DataStore": "import scarf; scarf.DataStore",
+}
+
+
+def time_snippet(snippet: str) -> float:
+    code = (
+        "import time; t = time.perf_counter(); "
+        f"{snippet}; "
+        "print(time.perf_counter() - t)"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    )
+    return float(out.stdout.strip().splitlines()[-1]) * 1000
+
+
+def loaded_heavy_modules() -> list:
+    code = (
+        "import sys, scarf; "
+        f"print(','.join(x for x in {HEAVY_MODULES!r} if x in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    )
+    lines = out.stdout.strip().splitlines()
+    return [x for x in lines[-1].split(",") if x] if lines else []
+
+
+def main(n_repeats: int = 5, max_ms: float = 100):
+    print(f"{'snippet':>16} {'median (ms)':>12} {'min (ms)':>10}")
+    res = {}
+    for name, snippet in SNIPPETS.items():
+        t = [time_snippet(snippet) for _ in range(n_repeats)]
+        res[name] = np.median(t)
+        print(f"{name:>16} {np.median(t):>12.1f} {min(t):>10.1f}")
+    heavy = loaded_heavy_modules()
+    if heavy:
+        sys.exit(f"Heavy modules loaded by a bare `import scarf`: {', '.join(heavy)}")
+    if res["import scarf"] > max_ms:
+        sys.exit(f"`import scarf` took {res['import scarf']:.1f} ms (limit: {max_ms} ms)")
+
+
+if __name__ == "__main__":
+    main(*[float(x) if n else int(x) for n, x in enumerate(sys.argv[1:])])
@@ -33,20 +33,110 @@ PyPI: https://pypi.org/project/scarf/
 """
 
 import warnings
-from dask.array import PerformanceWarning
-from importlib_metadata import version
+import importlib
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
-warnings.filterwarnings("ignore", category=PerformanceWarning)
-
-try:
-    __version__ = version("scarf")
-except ImportError:
-    print("Scarf is not installed", flush=True)
-
-from .datastore import *
-from .readers import *
-from .writers import *
-from .meld_assay import *
-from .utils import *
-from .downloader import *
+
+# Submodules and heavy dependencies (dask, zarr, numba, pandas, h5py, requests) are only loaded when one of the
+# exported names is first accessed (PEP 562). The names must match the `__all__` of the respective module.
+_lazy_exports = {
+    "datastore": ["DataStore"],
+    "readers": [
+        "CrH5Reader",
+        "CrDirReader",
+        "CrReader",
+        "H5adReader",
+        "NaboH5Reader",
+        "LoomReader",
+    ],
+    "writers": [
+        "create_zarr_dataset",
+        "create_zarr_obj_array",
+        "create_zarr_count_assay",
+        "write_sparse_counts",
+        "ChunkedCountsWriter",
+        "load_zarr_counts",
+        "subset_assay_zarr",
+        "dask_to_zarr",
+        "ZarrMerge",
+        "SubsetZarr",
+        "CrToZarr",
+        "H5adToZarr",
+        "NaboH5ToZarr",
+        "LoomToZarr",
+        "SparseToZarr",
+        "to_h5ad",
+        "to_mtx",
+    ],
+    "meld_assay": ["GffReader", "coordinate_melding"],
+    "utils": [
+        "logger",
+        "tqdmbar",
+        "tqdm_params",
+        "set_verbosity",
+        "get_log_level",
+        "system_call",
+        "rescale_array",
+        "clean_array",
+        "show_dask_progress",
+        "controlled_compute",
+        "set_scheduler",
+        "close_thread_pools",
+        "prefetch_blocks",
+        "prefetch_iter",
+        "ObjectCache",
+        "calc_summary_stats",
+        "segmented_aggregate",
+        "rolling_window",
+    ],
+    "downloader": ["show_available_datasets", "fetch_dataset"],
+}
+_export_modules = {x: k for k, v in _lazy_exports.items() for x in v}
+_submodules = [
+    "ann",
+    "assay",
+    "bio_data",
+    "datastore",
+    "dendrogram",
+    "downloader",
+    "feat_utils",
+    "knn_utils",
+    "mapping_utils",
+    "markers",
+    "meld_assay",
+    "metadata",
+    "plots",
+    "readers",
+    "umap",
+    "utils",
+    "writers",
+]
+
+__all__ = list(_export_modules)
+
+
+def _get_version() -> str:
+    from importlib_metadata import version
+
+    try:
+        return version("scarf")
+    except ImportError:
+        print("Scarf is not installed", flush=True)
+
+
+def __getattr__(name: str):
+    if name in _export_modules:
+        value = getattr(importlib.import_module(f".{_export_modules[name]}", __name__), name)
+    elif name in _submodules:
+        value = importlib.import_module(f".{name}", __name__)
+    elif name == "__version__":
+        value = _get_version()
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Cache the value so that `__getattr__` is not called again for this name
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_submodules))
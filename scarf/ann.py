@@ -1,6 +1,6 @@
 import numpy as np
 from threadpoolctl import threadpool_limits
-from .utils import controlled_compute, logger, tqdmbar
+from .utils import controlled_compute, logger, prefetch_blocks, tqdmbar
 from numpy.linalg import LinAlgError
 
 __all__ = ["AnnStream", "instantiate_knn_index", "fix_knn_query"]
@@ -24,26 +24,22 @@ def instantiate_knn_index(
 
 
 def fix_knn_query(indices: np.ndarray, distances: np.ndarray, ref_idx: np.ndarray):
-    fixed_ind, fixed_dist = indices.copy()[:, 1:], distances.copy()[:, 1:]
+    # The query itself is removed from its neighbours. When the first neighbour is not the query itself (i.e. a
+    # missed recall, e.g. due to duplicate cells), then the position of the self loop is excluded. If no self was found
+    # at all (poor recall?), then simply the last neighbour is removed.
+    k = indices.shape[1]
+    fixed_ind, fixed_dist = indices[:, 1:].copy(), distances[:, 1:].copy()
     # Identify positions where first index is not a self loop
-    mis_idx = indices[:, 0].reshape(1, -1)[0] != ref_idx
-    n_mis = mis_idx.sum()
+    mis_idx = np.where(indices[:, 0] != ref_idx)[0]
+    n_mis = len(mis_idx)
     if n_mis > 0:
-        for n, i, j, k in zip(
-            np.where(mis_idx)[0], ref_idx[mis_idx], indices[mis_idx], distances[mis_idx]
-        ):
-            p = np.where(j == i)[0]
-            if len(p) > 0:
-                # p is the position of self loop. We exclude this position
-                p = p[0]
-                j = np.array(list(j[:p]) + list(j[p + 1 :]))
-                k = np.array(list(k[:p]) + list(k[p + 1 :]))
-            else:
-                # No self found at all. Poor recall? simply remove the last k neighbour
-                j = j[:-1]
-                k = k[:-1]
-            fixed_ind[n] = j
-            fixed_dist[n] = k
+        mis_ind, mis_dist = indices[mis_idx], distances[mis_idx]
+        is_self = mis_ind == ref_idx[mis_idx].reshape(-1, 1)
+        drop_pos = np.where(is_self.any(axis=1), is_self.argmax(axis=1), k - 1)
+        keep = np.ones(mis_ind.shape, dtype=bool)
+        keep[np.arange(n_mis), drop_pos] = False
+        fixed_ind[mis_idx] = mis_ind[keep].reshape(n_mis, k - 1)
+        fixed_dist[mis_idx] = mis_dist[keep].reshape(n_mis, k - 1)
     return fixed_ind, fixed_dist, n_mis
 
 
@@ -71,6 +67,10 @@ class AnnStream:
         ann_idx,
         lsi_skip_first: bool,
         lsi_params: dict,
+        prefetch_depth: int = 2,
+        prefetch_max_mem: float = 1024,
+        embedding_store=None,
+        embedding_loc: str = None,
     ):
         self.data = data
         self.k = k
@@ -92,16 +92,24 @@ class AnnStream:
             self.annThreads = self.nthreads
         else:
             self.annThreads = 1
+        self.prefetchDepth = prefetch_depth
+        self.prefetchMaxMem = prefetch_max_mem
+        self.embeddingStore = embedding_store
+        self.embeddingLoc = embedding_loc
+        self._embedding = None
         self.randState = rand_state
         self.batchSize = self._handle_batch_size()
         self.method = reduction_method
         self.nCells, self.nFeats = self.data.shape
         self.clusterLabels: np.ndarray = np.repeat(-1, self.nCells)
+        self.explainedVarianceRatio = None
         disable_reduction = False
         if self.dims < 1:
             disable_reduction = True
+        self.disableReduction = disable_reduction
+        self.disableScaling = disable_scaling
         with threadpool_limits(limits=self.nthreads):
-            if self.method == "pca":
+            if self.method in ["pca", "pca_randomized"]:
                 self.mu, self.sigma = mu, sigma
                 if self.loadings is None or len(self.loadings) == 0:
                     if len(use_for_pca) != self.nCells:
@@ -109,7 +117,10 @@ class AnnStream:
                             "ERROR: `use_for_pca` does not have sample length as nCells"
                         )
                     if disable_reduction is False:
-                        self._fit_pca(disable_scaling, use_for_pca)
+                        if self.method == "pca_randomized":
+                            self._fit_pca_randomized(disable_scaling, use_for_pca)
+                        else:
+                            self._fit_pca(disable_scaling, use_for_pca)
                 else:
                     # Even though the dims might have been already adjusted according to loadings before calling
                     # AnnStream, it could still be overwritten by _handle_batch_size. Hence need to hard set it here.
@@ -174,8 +185,73 @@ class AnnStream:
         return batch_size
 
     def iter_blocks(self, msg: str = "") -> np.ndarray:
-        for i in tqdmbar(self.data.blocks, desc=msg, total=self.data.numblocks[0]):
-            yield controlled_compute(i, self.nthreads)
+        yield from prefetch_blocks(
+            self.data,
+            self.nthreads,
+            depth=self.prefetchDepth,
+            max_mem=self.prefetchMaxMem,
+            msg=msg,
+        )
+
+    def _get_embedding(self):
+        """
+        Returns the reduced data (cells x dims) as a Dask array backed by `embedding_loc` in
+        `embedding_store`. The reduced data is computed and saved in the first call and
+        reused if it already exists. Returns None when there is no store to save the
+        reduced data in or when no dimension reduction was performed.
+        """
+        import dask.array as daskarr
+        from .writers import create_zarr_dataset
+
+        if self._embedding is not None:
+            return self._embedding
+        if (
+            self.embeddingStore is None
+            or self.embeddingLoc is None
+            or self.disableReduction
+            or self.loadings is None
+        ):
+            return None
+        shape = (self.nCells, self.dims)
+        loc = self.embeddingLoc
+        if (
+            loc in self.embeddingStore
+            and self.embeddingStore[loc].shape == shape
+            and self.embeddingStore[loc].attrs.get("disable_scaling")
+            == self.disableScaling
+        ):
+            z = self.embeddingStore[loc]
+        else:
+            z = create_zarr_dataset(
+                self.embeddingStore, loc, (self.batchSize,), "f8", shape
+            )
+            s = 0
+            for i in self.iter_blocks(msg="Saving reduced data"):
+                a = self.reducer(i)
+                z[s : s + a.shape[0], :] = a
+                s += a.shape[0]
+            z.attrs["disable_scaling"] = self.disableScaling
+        self._embedding = daskarr.from_zarr(z, inline_array=True)
+        return self._embedding
+
+    def iter_reduced_blocks(self, msg: str = "") -> np.ndarray:
+        """
+        Yields blocks of reduced data, i.e. the output of `reducer`. The blocks are
+        read from the saved reduced data when available, so that the normalized data
+        need not be read again.
+        """
+        embedding = self._get_embedding()
+        if embedding is None:
+            for i in self.iter_blocks(msg=msg):
+                yield self.reducer(i)
+        else:
+            yield from prefetch_blocks(
+                embedding,
+                self.nthreads,
+                depth=self.prefetchDepth,
+                max_mem=self.prefetchMaxMem,
+                msg=msg,
+            )
 
     def transform_z(self, a: np.ndarray) -> np.ndarray:
         return (a - self.mu) / self.sigma
@@ -242,6 +318,64 @@ class AnnStream:
                 flush=True,
             )
         self.loadings = self._pca.components_[:-1, :].T
+        self.explainedVarianceRatio = self._pca.explained_variance_ratio_
+
+    def _fit_pca_randomized(
+        self,
+        disable_scaling: bool,
+        use_for_pca: np.ndarray,
+        n_oversamples: int = 10,
+        n_iter: int = 4,
+    ) -> None:
+        """
+        Fits PCA using randomized subspace iterations (Halko et al., 2011). Each iteration is a
+        single pass over the data that computes X.T @ (X @ Q) block-wise in parallel. The data is
+        centered implicitly so the normalized data is never modified. A final Rayleigh-Ritz step
+        on the subspace gives the principal axes.
+
+        Args:
+            disable_scaling: If True, then the data is not z-scaled with `mu` and `sigma`
+            use_for_pca: Boolean array marking the cells to be used for fitting
+            n_oversamples: Number of extra dimensions in the random subspace
+            n_iter: Number of passes over the data
+
+        Returns:
+            None
+        """
+        x = self.data
+        if use_for_pca.sum() != self.nCells:
+            x = x[use_for_pca]
+        if disable_scaling is False:
+            x = (x - self.mu) / self.sigma
+        n, p = x.shape
+        # As in `_fit_pca`, we fit 1 extra PC dim than specified and then ignore the last PC.
+        n_comps = self.dims + 1
+        rng = np.random.default_rng(self.randState)
+        q, _ = np.linalg.qr(rng.standard_normal((p, min(p, n_comps + n_oversamples))))
+        col_sum, sq_sum, z = None, None, None
+        for it in tqdmbar(range(n_iter), desc="Fitting randomized PCA"):
+            z = x.T.dot(x.dot(q))
+            if col_sum is None:
+                z, col_sum, sq_sum = controlled_compute(
+                    [z, x.sum(axis=0), (x**2).sum()], self.nthreads
+                )
+            else:
+                z = controlled_compute(z, self.nthreads)
+            # Centering: Xc.T @ Xc @ Q = X.T @ X @ Q - s @ s.T @ Q / n, where s is sum of columns
+            z = z - np.outer(col_sum, col_sum.dot(q)) / n
+            if it < n_iter - 1:
+                q, _ = np.linalg.qr(z)
+        g = q.T.dot(z)
+        evals, evecs = np.linalg.eigh((g + g.T) / 2)
+        order = np.argsort(evals)[::-1][:n_comps]
+        comps = q.dot(evecs[:, order])
+        # Deterministic signs, same convention as sklearn's `svd_flip`
+        signs = np.sign(comps[np.abs(comps).argmax(axis=0), range(comps.shape[1])])
+        signs[signs == 0] = 1
+        comps = comps * signs
+        total_var = sq_sum - col_sum.dot(col_sum) / n
+        self.explainedVarianceRatio = evals[order] / total_var
+        self.loadings = comps[:, :-1]
 
     def _fit_lsi(self, lsi_skip_first, lsi_params) -> None:
         import warnings
@@ -290,8 +424,8 @@ class AnnStream:
             self.annEf,
             self.annThreads,
         )
-        for i in self.iter_blocks(msg="Fitting ANN"):
-            ann_idx.add_items(self.reducer(i))
+        for i in self.iter_reduced_blocks(msg="Fitting ANN"):
+            ann_idx.add_items(i)
         return ann_idx
 
     def _fit_kmeans(self, do_ann_fit):
@@ -306,9 +440,9 @@ class AnnStream:
         )
         temp = []
         with threadpool_limits(limits=self.nthreads):
-            for i in self.iter_blocks(msg="Fitting kmeans"):
-                kmeans.partial_fit(self.reducer(i))
-            for i in self.iter_blocks(msg="Estimating seed partitions"):
-                temp.extend(kmeans.predict(self.reducer(i)))
+            for i in self.iter_reduced_blocks(msg="Fitting kmeans"):
+                kmeans.partial_fit(i)
+            for i in self.iter_reduced_blocks(msg="Estimating seed partitions"):
+                temp.extend(kmeans.predict(i))
         self.clusterLabels = np.array(temp)
         return kmeans
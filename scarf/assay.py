@@ -14,9 +14,16 @@ import numpy as np
 import dask.array as daskarr
 import zarr
 from .metadata import MetaData
-from .utils import show_dask_progress, controlled_compute, logger
+from .utils import (
+    show_dask_progress,
+    controlled_compute,
+    calc_summary_stats,
+    prefetch_blocks,
+    logger,
+)
+from .writers import load_zarr_counts
 from scipy.sparse import csr_matrix, vstack
-from typing import Tuple, List, Generator, Optional
+from typing import Tuple, List, Generator, Optional, Dict
 import pandas as pd
 
 __all__ = ["Assay", "RNAassay", "ATACassay", "ADTassay"]
@@ -123,6 +130,9 @@ class Assay:
         attrs: Zarr attributes for the zarr group of the assay
         normMethod: normalization method to use.
         sf: scaling factor for doing library-size normalization
+        rawCellStats: Per-cell summary statistics (see `utils.calc_summary_stats`) of the raw data. These are
+                      computed in the same pass as the feature properties, when not already present in the cell
+                      attribute table, and are otherwise None.
     """
 
     def __init__(
@@ -137,17 +147,22 @@ class Assay:
         self.z = z[self.name]
         self.cells = cell_data
         self.nthreads = nthreads
-        self.rawData = daskarr.from_zarr(self.z["counts"], inline_array=True)
+        self.rawData = load_zarr_counts(self.z["counts"])
         self.feats = MetaData(self.z["featureData"])
         self.attrs = self.z.attrs
         if "percentFeatures" not in self.attrs:
             self.attrs["percentFeatures"] = {}
         self.normMethod = norm_dummy
         self.sf = None
+        self.rawCellStats = None
         self._ini_feature_props(min_cells_per_feature)
 
     def normed(
-        self, cell_idx: np.ndarray = None, feat_idx: np.ndarray = None, **kwargs
+        self,
+        cell_idx: np.ndarray = None,
+        feat_idx: np.ndarray = None,
+        counts: daskarr = None,
+        **kwargs,
     ) -> daskarr:
         """
         This function normalizes the raw and returns a delayed dask array of the normalized
@@ -160,6 +175,9 @@ class Assay:
             feat_idx: Indices of features to be included in the normalized matrix
                       (Default value: All those marked True in 'I' column of
                       feature attribute table)
+            counts: A dask array (cells x features) with the raw counts to be normalized. It must have
+                    the same values as `rawData`, but may differ in chunking.
+                    (Default value: `rawData`)
             **kwargs:
 
         Returns: A dask array (delayed matrix) containing normalized data.
@@ -169,7 +187,9 @@ class Assay:
             cell_idx = self.cells.active_index("I")
         if feat_idx is None:
             feat_idx = self.feats.active_index("I")
-        counts = self.rawData[:, feat_idx][cell_idx, :]
+        if counts is None:
+            counts = self.rawData
+        counts = counts[:, feat_idx][cell_idx, :]
         return self.normMethod(self, counts)
 
     def to_raw_sparse(self, cell_key) -> csr_matrix:
@@ -200,6 +220,10 @@ class Assay:
 
     def _ini_feature_props(self, min_cells: int) -> None:
         """
+        Calculates the number of cells wherein each feature is present. If the
+        cell attribute table lacks nCounts or nFeatures for this assay, then the
+        per-cell statistics are calculated in the same pass over the raw data
+        and saved in `rawCellStats`.
 
         Args:
             min_cells: Minimum number of cells per feature. Features below this
@@ -211,11 +235,18 @@ class Assay:
         if "nCells" in self.feats.columns and "dropOuts" in self.feats.columns:
             pass
         else:
-            ncells = show_dask_progress(
-                (self.rawData > 0).sum(axis=0),
-                f"({self.name}) Computing nCells and dropOuts",
-                self.nthreads,
-            )
+            stats = [calc_summary_stats(self.rawData, axis=0)]
+            msg = f"({self.name}) Computing nCells and dropOuts"
+            if not all(
+                f"{self.name}_{x}" in self.cells.columns
+                for x in ["nCounts", "nFeatures"]
+            ):
+                stats.append(calc_summary_stats(self.rawData, axis=1))
+                msg = f"({self.name}) Computing nCells, dropOuts, nCounts and nFeatures"
+            stats = show_dask_progress(stats, msg, self.nthreads)
+            if len(stats) == 2:
+                self.rawCellStats = stats[1]
+            ncells = stats[0]["nnz"].astype(int)
             self.feats.insert("nCells", ncells, overwrite=True)
             self.feats.insert(
                 "dropOuts",
@@ -235,39 +266,60 @@ class Assay:
         Returns:
 
         """
-        if name in self.attrs["percentFeatures"]:
-            if self.attrs["percentFeatures"][name] == feat_pattern:
-                return None
-            else:
-                logger.info(f"Pattern for percentage feature {name} updated.")
-        self.attrs["percentFeatures"] = {
-            **{k: v for k, v in self.attrs["percentFeatures"].items()},
-            **{name: feat_pattern},
-        }
-        feat_idx = sorted(
-            self.feats.get_index_by(self.feats.grep(feat_pattern), "names")
-        )
-        if len(feat_idx) == 0:
-            logger.warning(
-                f"No matches found for pattern {feat_pattern}."
-                f" Will not add/update percentage feature"
+        self.add_percent_features({name: feat_pattern})
+
+    def add_percent_features(self, patterns: Dict[str, str]) -> None:
+        """
+        Same as `add_percent_feature` but for multiple patterns at once. The totals for all
+        the patterns are calculated in a single pass over the raw data.
+
+        Args:
+            patterns: A dictionary with column names as keys and regular expression patterns, to identify the
+                      features of interest, as values.
+
+        Returns:
+
+        """
+        totals = {}
+        for name, feat_pattern in patterns.items():
+            if name in self.attrs["percentFeatures"]:
+                if self.attrs["percentFeatures"][name] == feat_pattern:
+                    continue
+                else:
+                    logger.info(f"Pattern for percentage feature {name} updated.")
+            self.attrs["percentFeatures"] = {
+                **{k: v for k, v in self.attrs["percentFeatures"].items()},
+                **{name: feat_pattern},
+            }
+            feat_idx = sorted(
+                self.feats.get_index_by(self.feats.grep(feat_pattern), "names")
             )
+            if len(feat_idx) == 0:
+                logger.warning(
+                    f"No matches found for pattern {feat_pattern}."
+                    f" Will not add/update percentage feature"
+                )
+                continue
+            totals[name] = self.rawData[:, feat_idx].sum(axis=1)
+        if len(totals) == 0:
             return None
-        total = show_dask_progress(
-            self.rawData[:, feat_idx].sum(axis=1),
-            f"({self.name}) Computing {name}",
+        values = show_dask_progress(
+            list(totals.values()),
+            f"({self.name}) Computing {', '.join(totals.keys())}",
             self.nthreads,
         )
-        if total.sum() == 0:
-            logger.warning(
-                f"Percentage feature {name} not added because not detected in any cell"
+        for name, total in zip(totals.keys(), values):
+            if total.sum() == 0:
+                logger.warning(
+                    f"Percentage feature {name} not added because not detected in any cell"
+                )
+                continue
+            self.cells.insert(
+                name,
+                100 * total / self.cells.fetch_all(self.name + "_nCounts"),
+                overwrite=True,
             )
-            return None
-        self.cells.insert(
-            name,
-            100 * total / self.cells.fetch_all(self.name + "_nCounts"),
-            overwrite=True,
-        )
+        return None
 
     def _verify_keys(self, cell_key: str, feat_key: str) -> None:
         """
@@ -484,6 +536,91 @@ class Assay:
             self.attrs["latest_cell_key"] = cell_key
         return daskarr.from_zarr(self.z[location + "/data"], inline_array=True)
 
+    def save_feature_major_counts(
+        self, feat_chunk_size: int = 50, max_mem: float = 1024
+    ) -> None:
+        """
+        Saves a copy of the raw counts in feature-major layout, i.e. as a features x cells matrix chunked
+        along the features, under 'counts_fm' in the assay's group. Once saved, this copy is used by
+        `iter_normed_feature_wise` so that a batch of features can be read without reading the entire
+        counts matrix. The counts are transposed block by block so that only a bounded amount of data is
+        held in memory.
+
+        Args:
+            feat_chunk_size: Number of features in each chunk of the copy. (Default value: 50)
+            max_mem: Approximate upper limit, in MB, of memory used while transposing. Larger values allow
+                     writing larger chunks along the cells axis. (Default value: 1024)
+
+        Returns:
+            None
+        """
+        from .writers import create_zarr_dataset
+
+        n_cells, n_feats = self.rawData.shape
+        block_size = self.rawData.chunksize[0]
+        # Memory used for a dense block and its transposed copy
+        block_mem = 2 * block_size * n_feats * self.rawData.dtype.itemsize / 1024**2
+        n_blocks = int(max(1, max_mem // max(block_mem, 1)))
+        store = create_zarr_dataset(
+            self.z,
+            "counts_fm",
+            (feat_chunk_size, block_size * n_blocks),
+            self.rawData.dtype,
+            (n_feats, n_cells),
+        )
+        buffer, start = [], 0
+        for n, block in enumerate(
+            prefetch_blocks(
+                self.rawData,
+                self.nthreads,
+                msg=f"({self.name}) Saving feature-major copy of counts",
+            ),
+            start=1,
+        ):
+            buffer.append(block)
+            if len(buffer) == n_blocks or n == self.rawData.numblocks[0]:
+                a = np.vstack(buffer)
+                store[:, start : start + a.shape[0]] = a.T
+                start += a.shape[0]
+                buffer = []
+        store.attrs["counts_token"] = self._counts_token()
+        return None
+
+    def _counts_token(self) -> str:
+        """
+        Returns the token that identifies the current version of the counts (see `_update_counts_token` in
+        writers module). Counts saved by older versions do not have a token, hence one is created for them.
+        """
+        from .writers import _update_counts_token
+
+        counts = self.z["counts"]
+        if "token" not in counts.attrs:
+            _update_counts_token(counts)
+        return counts.attrs["token"]
+
+    def _load_feature_major_counts(self) -> Optional[daskarr.Array]:
+        """
+        Loads the feature-major copy of counts saved by `save_feature_major_counts`.
+
+        Returns:
+            A dask array of shape (cells x features) chunked along features, or None if the copy
+            does not exist or is out of sync with the counts.
+        """
+        if "counts_fm" not in self.z:
+            return None
+        store = self.z["counts_fm"]
+        n_cells, n_feats = self.rawData.shape
+        if (
+            store.shape != (n_feats, n_cells)
+            or store.attrs.get("counts_token") is None
+            or store.attrs["counts_token"] != self.z["counts"].attrs.get("token")
+        ):
+            logger.warning(
+                f"({self.name}) Feature-major copy of counts is out of sync with counts and will not be used"
+            )
+            return None
+        return daskarr.from_zarr(store, inline_array=True).T
+
     def iter_normed_feature_wise(
         self,
         cell_key: Optional[str],
@@ -493,7 +630,9 @@ class Assay:
         **norm_params,
     ) -> Generator[pd.DataFrame, None, None]:
         """
-        This generator iterates over all the features marked by `feat_key` in batches.
+        This generator iterates over all the features marked by `feat_key` in batches. If a feature-major copy of
+        the counts is available (see `save_feature_major_counts`), then the data is read from there such that each
+        batch reads only the data for its own features.
 
         Args:
             cell_key: Name of the key (column) from cell attribute table. The data will be fetched
@@ -524,6 +663,7 @@ class Assay:
         data = self.normed(
             cell_idx=cell_idx,
             feat_idx=feat_idx,
+            counts=self._load_feature_major_counts(),
             **norm_params,
         )
         logger.debug("Will iterate over data of shape: ", data.shape)
@@ -672,6 +812,70 @@ class Assay:
         ret_val2 = self.z[location + "/feature_indices"][:]
         return ret_val1[: ret_val2.shape[0]], ret_val2
 
+    def score_feature_sets(
+        self,
+        feature_sets: Dict[str, List[str]],
+        cell_key: str,
+        ctrl_size: int,
+        n_bins: int,
+        rand_seed: int,
+    ) -> pd.DataFrame:
+        """
+        Calculates the scores of multiple sets of features in given cells (as marked by cell_key). The score of a
+        feature set is the mean value of its features minus the mean value of a set of control features that are
+        randomly sampled from the same expression bins. The control sets of all the feature sets are sampled
+        beforehand and then all the scores are calculated in a single pass over the normalized data.
+
+        Args:
+            feature_sets: A dictionary with names of feature sets as keys and the list of names (as in 'names'
+                          column of the feature attribute table) of features in each set as values.
+            cell_key: Name of the key (column) from cell attribute table.
+            ctrl_size: Number of reference features to be sampled from each bin.
+            n_bins: Number of bins for sampling.
+            rand_seed: The seed to use for the random number generation.
+
+        Returns:
+            A pandas DataFrame with one row per cell and one column per feature set.
+
+        """
+
+        from .feat_utils import binned_sampling
+
+        identifier = self._load_stats_loc(cell_key)
+        obs_avg = pd.Series(self.feats.fetch_all(f"{identifier}_avg"))
+
+        # Each feature set contributes a column of weights: +1/n to its features and -1/n to its control features
+        rows, cols, weights = [], [], []
+        for n, (name, feature_names) in enumerate(feature_sets.items()):
+            feature_idx = self.feats.get_index_by(feature_names, "names", None)
+            if len(feature_idx) == 0:
+                raise ValueError(
+                    f"ERROR: No feature ids found for any of the provided {len(feature_names)} features "
+                    f"in the set '{name}'"
+                )
+            control_idx = binned_sampling(
+                obs_avg, list(feature_idx), ctrl_size, n_bins, rand_seed
+            )
+            for idx, sign in ((feature_idx, 1), (control_idx, -1)):
+                rows.extend(idx)
+                cols.extend([n] * len(idx))
+                weights.extend([sign / len(idx)] * len(idx))
+
+        feat_idx, rows = np.unique(np.array(rows, dtype=int), return_inverse=True)
+        weights = csr_matrix(
+            (weights, (rows, cols)), shape=(len(feat_idx), len(feature_sets))
+        )
+        cell_idx, _ = self._get_cell_feat_idx(cell_key, "I")
+        scores = [
+            block @ weights
+            for block in prefetch_blocks(
+                self.normed(cell_idx=cell_idx, feat_idx=feat_idx),
+                self.nthreads,
+                msg="Scoring feature sets",
+            )
+        ]
+        return pd.DataFrame(np.vstack(scores), columns=list(feature_sets))
+
     def score_features(
         self,
         feature_names: List[str],
@@ -696,31 +900,9 @@ class Assay:
 
         """
 
-        from .feat_utils import binned_sampling
-
-        def _names_to_idx(i):
-            return self.feats.get_index_by(i, "names", None)
-
-        def _calc_mean(i):
-            return (
-                self.normed(cell_idx=cell_idx, feat_idx=np.array(sorted(i)))
-                .mean(axis=1)
-                .compute()
-            )
-
-        feature_idx = _names_to_idx(feature_names)
-        if len(feature_idx) == 0:
-            raise ValueError(
-                f"ERROR: No feature ids found for any of the provided {len(feature_names)} features"
-            )
-
-        identifier = self._load_stats_loc(cell_key)
-        obs_avg = pd.Series(self.feats.fetch_all(f"{identifier}_avg"))
-        control_idx = binned_sampling(
-            obs_avg, list(feature_idx), ctrl_size, n_bins, rand_seed
-        )
-        cell_idx, _ = self._get_cell_feat_idx(cell_key, "I")
-        return _calc_mean(feature_idx) - _calc_mean(control_idx)
+        return self.score_feature_sets(
+            {"score": feature_names}, cell_key, ctrl_size, n_bins, rand_seed
+        )["score"].values
 
     def __repr__(self):
         f = self.feats.fetch_all("I")
@@ -762,6 +944,7 @@ class RNAassay(Assay):
         feat_idx: np.ndarray = None,
         renormalize_subset: bool = False,
         log_transform: bool = False,
+        counts: daskarr = None,
         **kwargs,
     ) -> daskarr:
         """
@@ -781,6 +964,9 @@ class RNAassay(Assay):
                                 `feat_key` column rather using total expression of all features in a cell
                                 (Default value: False)
             log_transform: If True, then the normalized data is log-transformed (Default value: False).
+            counts: A dask array (cells x features) with the raw counts to be normalized. It must have
+                    the same values as `rawData`, but may differ in chunking.
+                    (Default value: `rawData`)
             **kwargs: kwargs have no effect here.
 
         Returns:
@@ -791,7 +977,9 @@ class RNAassay(Assay):
             cell_idx = self.cells.active_index("I")
         if feat_idx is None:
             feat_idx = self.feats.active_index("I")
-        counts = self.rawData[:, feat_idx][cell_idx, :]
+        if counts is None:
+            counts = self.rawData
+        counts = counts[:, feat_idx][cell_idx, :]
         norm_method_cache = self.normMethod
         if log_transform:
             self.normMethod = norm_lib_size_log
@@ -828,21 +1016,13 @@ class RNAassay(Assay):
         if self._validate_stats_loc(stats_loc, cell_idx, feat_idx) is True:
             logger.info(f"Using cached feature stats for cell_key {cell_key}")
             return None
-        n_cells = show_dask_progress(
-            (self.normed(cell_idx, feat_idx) > 0).sum(axis=0),
-            f"({self.name}) Computing nCells",
-            self.nthreads,
-        )
-        tot = show_dask_progress(
-            self.normed(cell_idx, feat_idx).sum(axis=0),
-            f"({self.name}) Computing normed_tot",
-            self.nthreads,
-        )
-        sigmas = show_dask_progress(
-            self.normed(cell_idx, feat_idx).var(axis=0),
-            f"({self.name}) Computing sigmas",
+        stats = show_dask_progress(
+            calc_summary_stats(self.normed(cell_idx, feat_idx), axis=0),
+            f"({self.name}) Computing nCells, normed_tot and sigmas",
             self.nthreads,
         )
+        n_cells, tot = stats["nnz"], stats["total"]
+        sigmas = stats["m2"] / stats["n"]
         idx = n_cells > min_cells
         self.feats.update_key(idx, key=feat_key)
         n_cells, tot, sigmas = n_cells[idx], tot[idx], sigmas[idx]
@@ -1039,7 +1219,11 @@ class ATACassay(Assay):
         self.n_docs_per_term = None
 
     def normed(
-        self, cell_idx: np.ndarray = None, feat_idx: np.ndarray = None, **kwargs
+        self,
+        cell_idx: np.ndarray = None,
+        feat_idx: np.ndarray = None,
+        counts: daskarr = None,
+        **kwargs,
     ) -> daskarr:
         """
         This function normalizes the raw and returns a delayed dask array of the normalized
@@ -1055,6 +1239,9 @@ class ATACassay(Assay):
             feat_idx: Indices of features to be included in the normalized matrix
                       (Default value: All those marked True in 'I' column of
                       feature attribute table)
+            counts: A dask array (cells x features) with the raw counts to be normalized. It must have
+                    the same values as `rawData`, but may differ in chunking.
+                    (Default value: `rawData`)
             **kwargs:
 
         Returns: A dask array (delayed matrix) containing normalized data.
@@ -1064,7 +1251,9 @@ class ATACassay(Assay):
             cell_idx = self.cells.active_index("I")
         if feat_idx is None:
             feat_idx = self.feats.active_index("I")
-        counts = self.rawData[:, feat_idx][cell_idx, :]
+        if counts is None:
+            counts = self.rawData
+        counts = counts[:, feat_idx][cell_idx, :]
         self.n_term_per_doc = self.cells.fetch_all(self.name + "_nFeatures")[cell_idx]
         self.n_docs = len(cell_idx)
         self.n_docs_per_term = self.feats.fetch_all("nCells")[feat_idx]
@@ -1168,7 +1357,11 @@ class ADTassay(Assay):
         self.normMethod = norm_clr
 
     def normed(
-        self, cell_idx: np.ndarray = None, feat_idx: np.ndarray = None, **kwargs
+        self,
+        cell_idx: np.ndarray = None,
+        feat_idx: np.ndarray = None,
+        counts: daskarr = None,
+        **kwargs,
     ) -> daskarr:
         """
         This function normalizes the raw and returns a delayed dask array of the normalized
@@ -1183,6 +1376,9 @@ class ADTassay(Assay):
             feat_idx: Indices of features to be included in the normalized matrix
                       (Default value: All those marked True in 'I' column of
                       feature attribute table)
+            counts: A dask array (cells x features) with the raw counts to be normalized. It must have
+                    the same values as `rawData`, but may differ in chunking.
+                    (Default value: `rawData`)
             **kwargs:
 
         Returns: A dask array (delayed matrix) containing normalized data.
@@ -1192,5 +1388,7 @@ class ADTassay(Assay):
             cell_idx = self.cells.active_index("I")
         if feat_idx is None:
             feat_idx = self.feats.active_index("I")
-        counts = self.rawData[:, feat_idx][cell_idx, :]
+        if counts is None:
+            counts = self.rawData
+        counts = counts[:, feat_idx][cell_idx, :]
         return self.normMethod(self, counts)
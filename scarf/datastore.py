@@ -7,7 +7,7 @@ Contains the primary interface to interact with data (i. e. DataStore) and its s
 
 import os
 import numpy as np
-from typing import List, Iterable, Tuple, Generator, Union, Optional
+from typing import Dict, List, Iterable, Tuple, Generator, Union, Optional
 import pandas as pd
 import zarr
 import dask.array as daskarr
@@ -20,6 +20,10 @@ from .utils import (
     system_call,
     clean_array,
     controlled_compute,
+    calc_summary_stats,
+    prefetch_blocks,
+    segmented_aggregate,
+    ObjectCache,
     logger,
     tqdmbar,
 )
@@ -71,6 +75,9 @@ class BaseDataStore:
         synchronizer: Used as `synchronizer` parameter when opening the Zarr file. Please refer to this page for
                       more details: https://zarr.readthedocs.io/en/stable/api/sync.html. By default
                       ThreadSynchronizer will be used.
+        cache_max_mem: Maximum memory (in MB) used to keep the loaded graphs, MAGIC diffusion operators and initial
+                       embeddings in memory for reuse. The least recently used objects are evicted first. Set to 0
+                       to disable caching. (Default value: 1024)
 
     Attributes:
         cells: MetaData object with cells and info about each cell (e. g. RNA_nCounts ids).
@@ -90,6 +97,7 @@ class BaseDataStore:
         nthreads: int,
         zarr_mode: str,
         synchronizer,
+        cache_max_mem: float = 1024,
     ):
         if type(zarr_loc) != str:
             self.z: zarr.hierarchy = zarr.group(zarr_loc, synchronizer=synchronizer)
@@ -104,10 +112,9 @@ class BaseDataStore:
         self._load_assays(min_cells_per_feature, assay_types)
         # TODO: Reset all attrs, pca, dendrogram etc
         self._ini_cell_props(min_features_per_cell, mito_pattern, ribo_pattern)
-        self._cachedMagicOperator = None
-        self._cachedMagicOperatorLoc = None
+        # Objects derived from the Zarr hierarchy (graphs, diffusion operators, etc.) that are kept for reuse
+        self._cache = ObjectCache(cache_max_mem)
         self._integratedGraphsLoc = "integratedGraphs"
-        # TODO: Implement _caches to hold are cached data
         # TODO: Implement _defaults to hold default parameters for methods
 
     def _load_cells(self) -> MetaData:
@@ -336,13 +343,21 @@ class BaseDataStore:
         for from_assay in self.assay_names:
             assay = self._get_assay(from_assay)
 
-            var_name = from_assay + "_nCounts"
-            if var_name not in self.cells.columns:
-                n_c = show_dask_progress(
-                    assay.rawData.sum(axis=1),
-                    f"({from_assay}) Computing nCounts",
+            stats = assay.rawCellStats
+            if stats is None and not all(
+                f"{from_assay}_{x}" in self.cells.columns
+                for x in ["nCounts", "nFeatures"]
+            ):
+                stats = show_dask_progress(
+                    calc_summary_stats(assay.rawData, axis=1),
+                    f"({from_assay}) Computing nCounts and nFeatures",
                     self.nthreads,
                 )
+            assay.rawCellStats = None
+
+            var_name = from_assay + "_nCounts"
+            if var_name not in self.cells.columns:
+                n_c = stats["total"]
                 self.cells.insert(var_name, n_c.astype(np.float_), overwrite=True)
                 if type(assay) == RNAassay:
                     min_nc = min(n_c)
@@ -353,29 +368,25 @@ class BaseDataStore:
                         )
             var_name = from_assay + "_nFeatures"
             if var_name not in self.cells.columns:
-                n_f = show_dask_progress(
-                    (assay.rawData > 0).sum(axis=1),
-                    f"({from_assay}) Computing nFeatures",
-                    self.nthreads,
-                )
+                n_f = stats["nnz"]
                 self.cells.insert(var_name, n_f.astype(np.float_), overwrite=True)
 
             if type(assay) == RNAassay:
+                percent_patterns = {}
                 if mito_pattern == "":
                     pass
                 else:
                     if mito_pattern is None:
                         mito_pattern = "MT-|mt"
-                    var_name = from_assay + "_percentMito"
-                    assay.add_percent_feature(mito_pattern, var_name)
+                    percent_patterns[from_assay + "_percentMito"] = mito_pattern
 
                 if ribo_pattern == "":
                     pass
                 else:
                     if ribo_pattern is None:
                         ribo_pattern = "RPS|RPL|MRPS|MRPL"
-                    var_name = from_assay + "_percentRibo"
-                    assay.add_percent_feature(ribo_pattern, var_name)
+                    percent_patterns[from_assay + "_percentRibo"] = ribo_pattern
+                assay.add_percent_features(percent_patterns)
 
             if from_assay == self._defaultAssay:
                 v = self.cells.fetch(from_assay + "_nFeatures")
@@ -509,6 +520,27 @@ class BaseDataStore:
                 vals[vals > max_v] = max_v
         return vals
 
+    def close(self) -> None:
+        """
+        Releases the memory held by this DataStore's caches: the cached graphs and operators and the
+        cached cell metadata columns. The DataStore can still be used after calling this method.
+
+        The thread pools used by `utils.controlled_compute` are shared by all the DataStores in the
+        process and hence are not shut down here. They are shut down at exit, or explicitly with
+        `utils.close_thread_pools`.
+
+        Returns:
+            None
+        """
+        self._cache.invalidate()
+        self.cells._invalidate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     def __repr__(self):
         res = (
             f"DataStore has {self.cells.active_index('I').shape[0]} ({self.cells.N}) cells with"
@@ -610,19 +642,20 @@ class GraphDataStore(BaseDataStore):
 
         Args:
             assay: Assay object.
-            reduction_method: Name of reduction method to use. It can be one from either: 'pca', 'lsi', 'auto'.
+            reduction_method: Name of reduction method to use. It can be one from either: 'pca', 'pca_randomized',
+                              'lsi', 'auto'.
 
         Returns:
-            The name of dimension reduction method to be used. Either 'pca' or 'lsi'
+            The name of dimension reduction method to be used. Either 'pca', 'pca_randomized' or 'lsi'
 
         Raises:
-            ValueError: If `reduction_method` is not one of either 'pca', 'lsi', 'auto'
+            ValueError: If `reduction_method` is not one of either 'pca', 'pca_randomized', 'lsi', 'auto'
 
         """
         reduction_method = reduction_method.lower()
-        if reduction_method not in ["pca", "lsi", "auto", "custom"]:
+        if reduction_method not in ["pca", "pca_randomized", "lsi", "auto", "custom"]:
             raise ValueError(
-                "ERROR: Please choose either 'pca' or 'lsi' as reduction method"
+                "ERROR: Please choose either 'pca', 'pca_randomized' or 'lsi' as reduction method"
             )
         if reduction_method == "auto":
             assay_type = str(assay.__class__).split(".")[-1][:-2]
@@ -984,13 +1017,21 @@ class GraphDataStore(BaseDataStore):
         normed_loc = f"{from_assay}/normed__{cell_key}__{feat_key}"
         reduction_loc = self.z[normed_loc].attrs["latest_reduction"]
         kmeans_loc = self.z[reduction_loc].attrs["latest_kmeans"]
-        pc = PCA(n_components=n_comps).fit_transform(
-            self.z[kmeans_loc]["cluster_centers"][:]
-        )
-        for i in range(n_comps):
-            pc[:, i] = rescale_array(pc[:, i])
-        clusters = self.z[kmeans_loc]["cluster_labels"][:].astype(np.uint32)
-        return np.array([pc[x] for x in clusters]).astype(np.float32, order="C")
+        cache_key = (kmeans_loc, "ini_embed", n_comps)
+        ini_embed = self._cache.get(cache_key)
+        if ini_embed is None:
+            pc = PCA(n_components=n_comps).fit_transform(
+                self.z[kmeans_loc]["cluster_centers"][:]
+            )
+            for i in range(n_comps):
+                pc[:, i] = rescale_array(pc[:, i])
+            clusters = self.z[kmeans_loc]["cluster_labels"][:].astype(np.uint32)
+            ini_embed = np.array([pc[x] for x in clusters]).astype(
+                np.float32, order="C"
+            )
+            self._cache.put(cache_key, ini_embed)
+        # The embedding is optimized in place by UMAP, hence a copy is returned
+        return ini_embed.copy()
 
     def _get_graph_ncells_k(self, graph_loc: str) -> Tuple[int, int]:
         """
@@ -1030,21 +1071,38 @@ class GraphDataStore(BaseDataStore):
             use_k = k
         if use_k < 1:
             use_k = 1
-        if use_k != k:
-            indexer = np.tile([True] * use_k + [False] * (k - use_k), n_cells)
-        else:
-            indexer = None
-        w, e = store["weights"][:], store["edges"][:]
-        if indexer is not None:
-            w, e = w[indexer], e[indexer]
+        if "edges" in store:
+            # Graph saved in the earlier layout. It can be converted using `migrate_graphs`
+            if use_k != k:
+                indexer = np.tile([True] * use_k + [False] * (k - use_k), n_cells)
+            else:
+                indexer = None
+            w, e = store["weights"][:], store["edges"][:]
+            if indexer is not None:
+                w, e = w[indexer], e[indexer]
+            if sparse_format == "csr":
+                return n_cells, csr_matrix(
+                    (w, (e[:, 0], e[:, 1])), shape=(n_cells, n_cells)
+                )
+            else:
+                return n_cells, coo_matrix(
+                    (w, (e[:, 0], e[:, 1])), shape=(n_cells, n_cells)
+                )
+        # Each cell has exactly k edges, sorted by rank, so the top `use_k` edges are the first `use_k` columns and
+        # the CSR matrix can be built without any conversion.
+        idx = store["indices"][:, :use_k].ravel()
+        w = store["weights"][:, :use_k].astype(np.float64).ravel()
+        graph = csr_matrix(
+            (w, idx, np.arange(0, n_cells * use_k + 1, use_k)),
+            shape=(n_cells, n_cells),
+        )
+        graph.sort_indices()
+        if store.attrs.get("transposed", False):
+            graph = graph.T
         if sparse_format == "csr":
-            return n_cells, csr_matrix(
-                (w, (e[:, 0], e[:, 1])), shape=(n_cells, n_cells)
-            )
+            return n_cells, graph.tocsr()
         else:
-            return n_cells, coo_matrix(
-                (w, (e[:, 0], e[:, 1])), shape=(n_cells, n_cells)
-            )
+            return n_cells, graph.tocoo()
 
     def make_graph(
         self,
@@ -1074,7 +1132,9 @@ class GraphDataStore(BaseDataStore):
         feat_scaling: bool = True,
         lsi_skip_first: bool = True,
         show_elbow_plot: bool = False,
-        ann_index_save_path: str = None
+        ann_index_save_path: str = None,
+        prefetch_depth: int = 2,
+        prefetch_max_mem: float = 1024,
     ):
         """
         Creates a cell neighbourhood graph. Performs following steps in the process:
@@ -1101,8 +1161,8 @@ class GraphDataStore(BaseDataStore):
             │       │       ├── distances (7648, 21) float64  # Raw distance matrix for k neighbours
             │       │       ├── indices (7648, 21) uint64     # Indices for k neighbours
             │       │       └── graph__1.0__1.5               # sparse graph with continuous form distance values
-            │       │           ├── edges (160608, 2) uint64
-            │       │           └── weights (160608,) float64
+            │       │           ├── indices (7648, 21) uint32     # Indices of the neighbours of each cell
+            │       │           └── weights (7648, 21) float32    # Edge weights
             │       └── kmeans__100__4466                     # Kmeans groups
             │           ├── cluster_centers (100, 31) float64 # Centroid matrix
             │           └── cluster_labels (7648,) float64    # Cluster labels for cells
@@ -1126,9 +1186,11 @@ class GraphDataStore(BaseDataStore):
                           mechanism to subset the normalized data only for PCA fitting step. This parameter can be
                           useful, for example, the data has cells from multiple replicates which wont merge together, in
                           which case the `pca_cell_key` can be used to fit PCA on cells from only one of the replicate.
-            reduction_method: Method to use for linear dimension reduction. Could be either 'pca', 'lsi' or 'auto'. In
-                              case of 'auto' `_choose_reduction_method` will be used to determine best reduction type
-                              for the assay.
+            reduction_method: Method to use for linear dimension reduction. Could be either 'pca', 'pca_randomized',
+                              'lsi' or 'auto'. In case of 'auto' `_choose_reduction_method` will be used to determine
+                              best reduction type for the assay. 'pca_randomized' fits PCA using a few passes of
+                              randomized subspace iterations over the data rather than IncrementalPCA. It is faster
+                              when a large number of `dims` are used.
             dims: Number of top reduced dimensions to use (Default value: 11)
             k: Number of nearest neighbours to query for each cell (Default value: 11)
             ann_metric: Refer to HNSWlib link above (Default value: 'l2')
@@ -1178,6 +1240,9 @@ class GraphDataStore(BaseDataStore):
             show_elbow_plot: If True, then an elbow plot is shown when PCA is fitted to the data. Not shown when using
                             existing PCA loadings or custom loadings. (Default value: False)
             ann_index_save_path: Used to save ANN index binary file when the DataStore is not a Zarr Directory Store.
+            prefetch_depth: Number of data blocks that are read from the disk in background, ahead of the block
+                            being processed. Set to 0 to disable the read-ahead. (Default value: 2)
+            prefetch_max_mem: Maximum memory (in MB) used by the blocks that are read ahead. (Default value: 1024)
 
         Returns:
             Either None or `AnnStream` object
@@ -1289,6 +1354,13 @@ class GraphDataStore(BaseDataStore):
         fit_kmeans = True
         mu, sigma = np.ndarray([]), np.ndarray([])
         use_for_pca = self.cells.fetch(pca_cell_key, key=cell_key)
+        if (
+            reduction_loc in self.z
+            and "embedding" in self.z[reduction_loc]
+            and "reduction" not in self.z[reduction_loc]
+        ):
+            # Only the reduced data was saved, i.e. the previous run was interrupted before saving the loadings
+            del self.z[reduction_loc]
         if reduction_loc in self.z:
             # TODO: In future move 'mu' and 'sigma' to normed_loc rather than reduction_loc. This may however introduce
             # breaking changes.
@@ -1306,7 +1378,7 @@ class GraphDataStore(BaseDataStore):
 
                     del self.z[reduction_loc]
         else:
-            if reduction_method in ["pca", "manual"]:
+            if reduction_method in ["pca", "pca_randomized", "manual"]:
                 mu = clean_array(
                     show_dask_progress(
                         data.mean(axis=0),
@@ -1355,6 +1427,8 @@ class GraphDataStore(BaseDataStore):
             fit_kmeans = False
             logger.info(f"using existing kmeans cluster centers")
         disable_scaling = True if feat_scaling is False else False
+        # Reduced data is saved in reduction_loc by AnnStream, so we need to check this beforehand
+        save_reduction = reduction_loc not in self.z
         # TODO: expose LSImodel parameters
         ann_obj = AnnStream(
             data=data,
@@ -1378,11 +1452,17 @@ class GraphDataStore(BaseDataStore):
             ann_idx=ann_idx,
             lsi_skip_first=lsi_skip_first,
             lsi_params={},
+            prefetch_depth=prefetch_depth,
+            prefetch_max_mem=prefetch_max_mem,
+            embedding_store=self.z,
+            embedding_loc=f"{reduction_loc}/embedding",
         )
 
-        if reduction_loc not in self.z:
+        if save_reduction:
+            # Any cached objects derived from an earlier reduction at this location are stale
+            self._cache.invalidate(reduction_loc)
             logger.debug(f"Saving loadings to {reduction_loc}")
-            self.z.create_group(reduction_loc, overwrite=True)
+            self.z.require_group(reduction_loc)
             if ann_obj.loadings is not None:
                 # can be None when no dimred is performed
                 g = create_zarr_dataset(
@@ -1394,7 +1474,7 @@ class GraphDataStore(BaseDataStore):
                 )
                 g[:, :] = ann_obj.loadings
             # TODO: This belongs better in normed_loc
-            if reduction_method in ["pca", "manual"]:
+            if reduction_method in ["pca", "pca_randomized", "manual"]:
                 g = create_zarr_dataset(
                     self.z[reduction_loc], "mu", (100000,), "f8", mu.shape
                 )
@@ -1409,6 +1489,7 @@ class GraphDataStore(BaseDataStore):
             if ann_idx_loc is not None:
                 ann_obj.annIdx.save_index(os.path.join(ann_idx_loc, 'ann_idx'))
         if fit_kmeans:
+            self._cache.invalidate(kmeans_loc)
             logger.debug(f"Saving kmeans clusters to {kmeans_loc}")
             self.z.create_group(kmeans_loc, overwrite=True)
             g = create_zarr_dataset(
@@ -1432,6 +1513,7 @@ class GraphDataStore(BaseDataStore):
         else:
             from .knn_utils import self_query_knn, smoothen_dists
 
+            self._cache.invalidate(knn_loc)
             recall = None
             if knn_loc not in self.z:
                 recall = self_query_knn(
@@ -1449,6 +1531,7 @@ class GraphDataStore(BaseDataStore):
                 local_connectivity,
                 bandwidth,
                 batch_size,
+                self.nthreads,
             )
             if recall is not None:
                 logger.info(f"ANN recall: {recall}%")
@@ -1463,12 +1546,10 @@ class GraphDataStore(BaseDataStore):
         if show_elbow_plot:
             from .plots import plot_elbow
 
-            try:
-                var_exp = 100 * ann_obj._pca.explained_variance_ratio_
-            except AttributeError:
+            if ann_obj.explainedVarianceRatio is None:
                 logger.warning("PCA was not fitted so not showing an Elbow plot")
             else:
-                plot_elbow(var_exp)
+                plot_elbow(100 * ann_obj.explainedVarianceRatio)
         return None
 
     def load_graph(
@@ -1522,12 +1603,22 @@ class GraphDataStore(BaseDataStore):
                 f"{graph_loc} not found in zarr location {self._fn}. "
                 f"Run `make_graph` for assay {from_assay}"
             )
-        n_cells, graph = self._store_to_sparse(graph_loc, "csr", use_k)
-        if symmetric is True:
-            graph = symmetrize(graph)
-            if upper_only is True:
-                graph = triu(graph)
-        return graph
+        cache_key = (
+            graph_loc,
+            symmetric is True,
+            symmetric is True and upper_only is True,
+            use_k,
+        )
+        graph = self._cache.get(cache_key)
+        if graph is None:
+            n_cells, graph = self._store_to_sparse(graph_loc, "csr", use_k)
+            if symmetric is True:
+                graph = symmetrize(graph)
+                if upper_only is True:
+                    graph = triu(graph)
+            self._cache.put(cache_key, graph)
+        # A copy is returned so that the cached graph is not modified by the caller
+        return graph.copy()
         # idx = None
         # if min_edge_weight > 0:
         #     idx = graph.data > min_edge_weight
@@ -1540,6 +1631,49 @@ class GraphDataStore(BaseDataStore):
         #     graph = graph.tocoo()
         #     return csr_matrix((graph.data[idx], (graph.row[idx], graph.col[idx])), shape=(n_cells, n_cells))
 
+    def migrate_graphs(self, chunk_size: int = 10000) -> None:
+        """
+        Converts the graphs (including integrated graphs) saved by earlier versions of Scarf, as an `edges` array of
+        shape (n_cells * k, 2) and a flat `weights` array, into the current layout with `indices` (uint32) and
+        `weights` (float32) arrays of shape (n_cells, k). Graphs in the earlier layout can still be loaded without
+        migration, but each load requires a conversion to the CSR format. Note that the migrated graphs cannot be
+        read by earlier versions of Scarf.
+
+        Args:
+            chunk_size: Number of cells to convert at a time (Default value: 10000)
+
+        Returns:
+            None
+        """
+        from .knn_utils import migrate_graph
+
+        graph_locs = []
+
+        def _find_graphs(name: str) -> None:
+            if name.rsplit("/", 1)[-1].startswith("graph__") or (
+                name.startswith(f"{self._integratedGraphsLoc}/") and name.count("/") == 1
+            ):
+                graph_locs.append(name)
+
+        self.z.visit(_find_graphs)
+        for graph_loc in graph_locs:
+            if "edges" not in self.z[graph_loc]:
+                continue
+            n_cells, k = self._get_graph_ncells_k(graph_loc)
+            if migrate_graph(
+                self.z[graph_loc],
+                n_cells,
+                k,
+                graph_loc.startswith(self._integratedGraphsLoc),
+                chunk_size,
+            ):
+                logger.info(f"Migrated graph: {graph_loc}")
+            else:
+                logger.warning(
+                    f"Graph {graph_loc} does not have {k} edges per cell and was not migrated"
+                )
+        return None
+
     def run_tsne(
         self,
         *,
@@ -1632,6 +1766,7 @@ class GraphDataStore(BaseDataStore):
                         "ERROR: Provided initial embedding does not shape required shape: "
                         f"{(graph.shape[0], tsne_dims)}"
                     )
+                ini_embed = ini_embed.flatten()
             h.write("\n".join(map(str, ini_embed)))
         out_fn = Path(temp_file_loc, f"{uid}_output.txt").resolve()
         if parallel:
@@ -1845,6 +1980,7 @@ class GraphDataStore(BaseDataStore):
         graph_upper_only: bool = False,
         label: str = "leiden_cluster",
         random_seed: int = 4444,
+        resolutions: Optional[List[float]] = None,
     ) -> None:
         """
         Executes Leiden graph clustering algorithm on the cell-neighbourhood graph and saves cluster identities in the
@@ -1861,6 +1997,15 @@ class GraphDataStore(BaseDataStore):
             graph_upper_only: This parameter is forwarded to `load_graph` and is same as there. (Default value: True)
             label: base label for cluster identity in the cell metadata column (Default value: 'leiden_cluster')
             random_seed: (Default value: 4444)
+            resolutions: A list of resolution values. When provided, `resolution` is ignored and a partition is
+                         computed for each of the values. The partitions are computed in parallel using up to
+                         `nthreads` (the datastore's attribute) worker processes that share the graph, and the
+                         cluster identities are saved under columns named `{label}_{resolution}`. The worker
+                         processes are started with the 'spawn' method, which re-imports the main module, so when
+                         more than one resolution is given and `nthreads` is greater than 1, scripts must run
+                         Scarf under an `if __name__ == "__main__":` guard; otherwise Python raises a RuntimeError
+                         while bootstrapping the workers. Set `nthreads` to 1 to compute the partitions
+                         sequentially in the current process. (Default value: None)
 
         Returns:
 
@@ -1874,8 +2019,7 @@ class GraphDataStore(BaseDataStore):
                 "here: https://github.com/vtraag/leidenalg#installation. Also, consider running Paris "
                 "instead of Leiden clustering using `run_clustering` method"
             )
-        # noinspection PyPackageRequirements
-        import igraph  # python-igraph
+        from .knn_utils import leiden_partitions
 
         from_assay, cell_key, feat_key = self._get_latest_keys(
             from_assay, cell_key, feat_key
@@ -1895,23 +2039,21 @@ class GraphDataStore(BaseDataStore):
             upper_only=graph_upper_only,
             graph_loc=graph_loc,
         )
-        sources, targets = graph.nonzero()
-        g = igraph.Graph()
-        g.add_vertices(graph.shape[0])
-        g.add_edges(list(zip(sources, targets)))
-        g.es["weight"] = graph[sources, targets].A1
-        part = leidenalg.find_partition(
-            g,
-            leidenalg.RBConfigurationVertexPartition,
-            resolution_parameter=resolution,
-            seed=random_seed,
+        if resolutions is None:
+            labels = {label: resolution}
+        else:
+            labels = {f"{label}_{r}": r for r in resolutions}
+        memberships = leiden_partitions(
+            graph, list(labels.values()), random_seed, nthreads=self.nthreads
         )
 
         if integrated_graph is not None:
             from_assay = integrated_graph
-        self.cells.insert(
-            self._col_renamer(from_assay, cell_key, label),
-            np.array(part.membership) + 1,
+        self.cells.insert_many(
+            {
+                self._col_renamer(from_assay, cell_key, k): v + 1
+                for k, v in zip(labels, memberships)
+            },
             fill_value=-1,
             key=cell_key,
             overwrite=True,
@@ -2200,9 +2342,9 @@ class GraphDataStore(BaseDataStore):
                        used feature for the given assay will be used.
             t: Same as the t parameter in MAGIC. Higher values lead to larger diffusion of values. Too large values
                can slow down the algorithm and cause over-smoothening. (Default value: 2)
-            cache_operator: Whether to keep the diffusion operator in memory after the method returns. Can be useful
-                            to set to True if many features are to imputed in a batch but can lead to increased memory
-                            usage. (Default value: True)
+            cache_operator: Whether to keep the diffusion operator in the DataStore's cache after the method returns.
+                            Can be useful to set to True if many features are to imputed in a batch but can lead to
+                            increased memory usage. (Default value: True)
 
         Returns:
             An array of imputed values for the given feature
@@ -2230,11 +2372,11 @@ class GraphDataStore(BaseDataStore):
 
         graph_loc = self._get_latest_graph_loc(from_assay, cell_key, feat_key)
         magic_loc = f"{graph_loc}/magic_{t}"
+        cache_key = (magic_loc,)
         if magic_loc in self.z:
             logger.info("Using existing MAGIC diffusion operator")
-            if self._cachedMagicOperatorLoc == magic_loc:
-                diff_op = self._cachedMagicOperator
-            else:
+            diff_op = self._cache.get(cache_key)
+            if diff_op is None:
                 n_cells, _ = self._get_graph_ncells_k(graph_loc)
                 store = self.z[magic_loc]
                 diff_op = coo_matrix(
@@ -2242,11 +2384,7 @@ class GraphDataStore(BaseDataStore):
                     shape=(n_cells, n_cells),
                 )
                 if cache_operator:
-                    self._cachedMagicOperator = diff_op
-                    self._cachedMagicOperatorLoc = magic_loc
-                else:
-                    self._cachedMagicOperator = None
-                    self._cachedMagicOperatorLoc = None
+                    self._cache.put(cache_key, diff_op)
         else:
             graph = self.load_graph(
                 from_assay=from_assay,
@@ -2263,11 +2401,10 @@ class GraphDataStore(BaseDataStore):
                 zg[:] = diff_op.__getattribute__(i)
             self.z[graph_loc].attrs["latest_magic"] = magic_loc
             if cache_operator:
-                self._cachedMagicOperator = diff_op
-                self._cachedMagicOperatorLoc = magic_loc
-            else:
-                self._cachedMagicOperator = None
-                self._cachedMagicOperatorLoc = None
+                self._cache.put(cache_key, diff_op)
+        if not cache_operator:
+            # Frees the operator if it was cached by an earlier call
+            self._cache.invalidate(magic_loc)
         return diff_op.dot(data)
 
     def run_pseudotime_scoring(
@@ -2465,7 +2602,7 @@ class GraphDataStore(BaseDataStore):
         Returns: None
 
         """
-        from .knn_utils import merge_graphs
+        from .knn_utils import merge_graphs, create_graph_datasets
 
         merged_graph = []
         for assay in assays:
@@ -2490,20 +2627,17 @@ class GraphDataStore(BaseDataStore):
             self.z.create_group(ig_loc)
         if label in self.z[ig_loc]:
             del self.z[f"{ig_loc}/{label}"]
+        self._cache.invalidate(f"{ig_loc}/{label}")
         store = self.z.create_group(f"{ig_loc}/{label}")
         store.attrs["n_cells"] = n_cells
         store.attrs["n_neighbors"] = n_neighbors
+        # `merge_graphs` returns the neighbours of each cell along a column, so the rows of the saved arrays
+        # are the columns of the merged graph.
+        store.attrs["transposed"] = True
 
-        zge = create_zarr_dataset(
-            store, f"edges", (chunk_size,), ("u8", "u8"), (n_cells * n_neighbors, 2)
-        )
-        zgw = create_zarr_dataset(
-            store, f"weights", (chunk_size,), "f8", (n_cells * n_neighbors)
-        )
-
-        zge[:, 0] = merged_graph.row
-        zge[:, 1] = merged_graph.col
-        zgw[:] = merged_graph.data
+        zgi, zgw = create_graph_datasets(store, n_cells, n_neighbors, chunk_size)
+        zgi[:] = merged_graph.row.reshape(n_cells, n_neighbors)
+        zgw[:] = merged_graph.data.reshape(n_cells, n_neighbors)
 
 
 # Note for the docstring: Attributes are copied from BaseDataStore docstring since the constructor is inherited.
@@ -2655,7 +2789,7 @@ class MappingDatastore(GraphDataStore):
                 target_assay.z[f"normed__I__{target_feat_key}/data_coral"],
                 inline_array=True,
             )
-        if ann_obj.method == "pca" and run_coral is False:
+        if ann_obj.method in ["pca", "pca_randomized"] and run_coral is False:
             if ref_mu is False:
                 mu = show_dask_progress(
                     target_data.mean(axis=0),
@@ -2677,12 +2811,13 @@ class MappingDatastore(GraphDataStore):
         zi = create_zarr_dataset(store, "indices", (batch_size,), "u8", (nc, nk))
         zd = create_zarr_dataset(store, "distances", (batch_size,), "f8", (nc, nk))
         entry_start = 0
-        for i in tqdmbar(
-            target_data.blocks,
-            desc=f"Mapping cells from {target_name}",
-            total=target_data.numblocks[0],
+        for a in prefetch_blocks(
+            target_data,
+            self.nthreads,
+            depth=ann_obj.prefetchDepth,
+            max_mem=ann_obj.prefetchMaxMem,
+            msg=f"Mapping cells from {target_name}",
         ):
-            a: np.ndarray = controlled_compute(i, self.nthreads)
             ki, kd = ann_obj.transform_ann(ann_obj.reducer(a), k=save_k)
             entry_end = entry_start + len(ki)
             zi[entry_start:entry_end, :] = ki
@@ -2735,6 +2870,8 @@ class MappingDatastore(GraphDataStore):
                 f"ERROR: Projections have not been computed for {target_name} in th latest graph. Please"
                 f" run `run_mapping` or update latest_graph by running `make_graph` with desired parameters"
             )
+        from .mapping_utils import group_mapping_scores
+
         store = self.z[store_loc]
 
         indices = store["indices"][:]
@@ -2749,22 +2886,17 @@ class MappingDatastore(GraphDataStore):
                     f"ERROR: Length of target_groups {len(target_groups)} not same as number of target "
                     f"cells in the projection {n_cells}"
                 )
-            groups = pd.Series(target_groups)
         else:
-            groups = pd.Series(np.zeros(n_cells))
+            target_groups = np.zeros(n_cells)
+        if not weighted:
+            dists = np.full(dists.shape, fixed_weight)
 
         ref_n_cells = self.cells.fetch_all(cell_key).sum()
-        for group in sorted(groups.unique()):
-            coi = {x: None for x in groups[groups == group].index.values}
-            ms = np.zeros(ref_n_cells)
-            for n, i, j in zip(range(len(indices)), indices, dists):
-                if n in coi:
-                    for x, y in zip(i, j):
-                        if weighted:
-                            ms[x] += y
-                        else:
-                            ms[x] += fixed_weight
-            ms = multiplier * ms / len(coi)
+        groups, scores, group_sizes = group_mapping_scores(
+            indices, dists, target_groups, ref_n_cells
+        )
+        for n, group in enumerate(groups):
+            ms = multiplier * scores[n].toarray().ravel() / group_sizes[n]
             if log_transform:
                 ms = np.log1p(ms)
             yield group, ms
@@ -2822,32 +2954,19 @@ class MappingDatastore(GraphDataStore):
         if target_subset is not None:
             if type(target_subset) != list:
                 raise TypeError("ERROR:  `target_subset` should be <list> type")
-            target_subset = {x: None for x in target_subset}
+        from .mapping_utils import predict_target_classes
 
         store = self.z[store_loc]
         indices = store["indices"][:]
         dists = store["distances"][:]
-        preds = []
+        if target_subset is not None:
+            subset = np.isin(np.arange(indices.shape[0]), target_subset)
+            indices, dists = indices[subset], dists[subset]
         weights = 1 - (dists / dists.max(axis=1).reshape(-1, 1))
-        for n in range(indices.shape[0]):
-            if target_subset is not None and n not in target_subset:
-                continue
-            wd = {}
-            for i, j in zip(indices[n, :-1], weights[n, :-1]):
-                k = ref_groups[i]
-                if k not in wd:
-                    wd[k] = 0
-                wd[k] += j
-            temp = na_val
-            s = weights[n, :-1].sum()
-            for i, j in wd.items():
-                if j / s > threshold_fraction:
-                    if temp == na_val:
-                        temp = i
-                    else:
-                        temp = na_val
-                        break
-            preds.append(temp)
+        # The farthest neighbour always has zero weight and is hence not used
+        preds = predict_target_classes(
+            indices[:, :-1], weights[:, :-1], ref_groups, threshold_fraction, na_val
+        )
         return pd.Series(preds)
 
     def load_unified_graph(
@@ -2884,23 +3003,22 @@ class MappingDatastore(GraphDataStore):
         if feat_key is None:
             feat_key = self._get_latest_feat_key(from_assay)
         graph_loc = self._get_latest_graph_loc(from_assay, cell_key, feat_key)
-        edges = self.z[graph_loc].edges[:]
-        weights = self.z[graph_loc].weights[:]
+        _, ref_graph = self._store_to_sparse(graph_loc, "coo")
         ref_n_cells = self.cells.fetch_all(cell_key).sum()
         store = self.z[from_assay].projections
         pidx = np.vstack([store[x].indices[:, :use_k] for x in target_names])
         n_cells = [ref_n_cells] + [store[x].indices.shape[0] for x in target_names]
-        ne = []
-        nw = []
-        for n, i in enumerate(pidx):
-            for j in i:
-                ne.append([ref_n_cells + n, j])
-                # TODO: Better way to weigh the target edges
-                nw.append(target_weight)
-        me = np.vstack([edges, ne]).astype(int)
-        mw = np.hstack([weights, nw])
+        rows = np.hstack(
+            [
+                ref_graph.row,
+                np.repeat(np.arange(ref_n_cells, ref_n_cells + pidx.shape[0]), pidx.shape[1]),
+            ]
+        )
+        cols = np.hstack([ref_graph.col, pidx.ravel()]).astype(int)
+        # TODO: Better way to weigh the target edges
+        mw = np.hstack([ref_graph.data, np.full(pidx.size, target_weight)])
         tot_cells = ref_n_cells + pidx.shape[0]
-        graph = csr_matrix((mw, (me[:, 0], me[:, 1])), shape=(tot_cells, tot_cells))
+        graph = csr_matrix((mw, (rows, cols)), shape=(tot_cells, tot_cells))
         return n_cells, graph
 
     def _get_uni_ini_embed(
@@ -3395,6 +3513,9 @@ class DataStore(MappingDatastore):
         synchronizer: Used as `synchronizer` parameter when opening the Zarr file. Please refer to this page for
                       more details: https://zarr.readthedocs.io/en/stable/api/sync.html. By default
                       ThreadSynchronizer will be used.
+        cache_max_mem: Maximum memory (in MB) used to keep the loaded graphs, MAGIC diffusion operators and initial
+                       embeddings in memory for reuse. The least recently used objects are evicted first. Set to 0
+                       to disable caching. (Default value: 1024)
     """
 
     def __init__(
@@ -3409,6 +3530,7 @@ class DataStore(MappingDatastore):
         nthreads: int = 2,
         zarr_mode: str = "r+",
         synchronizer=None,
+        cache_max_mem: float = 1024,
     ):
         if zarr_mode not in ["r", "r+"]:
             raise ValueError(
@@ -3427,6 +3549,7 @@ class DataStore(MappingDatastore):
             nthreads=nthreads,
             zarr_mode=zarr_mode,
             synchronizer=synchronizer,
+            cache_max_mem=cache_max_mem,
         )
 
     def filter_cells(
@@ -3656,6 +3779,33 @@ class DataStore(MappingDatastore):
             )
         assay.mark_prevalent_peaks(cell_key, top_n, prevalence_key_name)
 
+    def make_feature_major_counts(
+        self,
+        *,
+        from_assay: str = None,
+        feat_chunk_size: int = 50,
+        max_mem: float = 1024,
+    ) -> None:
+        """
+        Saves a copy of the raw counts of an assay in feature-major layout (features x cells). Methods that
+        iterate over the data feature-wise, like `run_marker_search`, `run_pseudotime_marker_search` and
+        `run_pseudotime_aggregation`, then read only the data for the features being processed instead of the
+        entire counts matrix for each batch of features. The copy occupies roughly the same space on disk as the
+        counts.
+
+        Args:
+            from_assay: Name of the assay to be used. If no value is provided then the default assay will be used.
+            feat_chunk_size: Number of features in each chunk of the copy. (Default value: 50)
+            max_mem: Approximate upper limit, in MB, of memory used while creating the copy. (Default value: 1024)
+
+        Returns:
+            None
+        """
+        assay = self._get_assay(from_assay)
+        assay.save_feature_major_counts(
+            feat_chunk_size=feat_chunk_size, max_mem=max_mem
+        )
+
     def run_marker_search(
         self,
         *,
@@ -3666,6 +3816,7 @@ class DataStore(MappingDatastore):
         gene_batch_size: int = 50,
         use_prenormed: bool = True,
         prenormed_store: Optional[str] = None,
+        calc_stats: bool = False,
         **norm_params,
     ) -> None:
         """
@@ -3689,6 +3840,9 @@ class DataStore(MappingDatastore):
                            This can speed up the results. (Default value: True)
             prenormed_store: If prenormalized values were computed in a custom manner then, the Zarr group's location
                              can be provided here. (Default value: None)
+            calc_stats: If True, then AUROC and p-value of Wilcoxon rank-sum test (group vs rest of the cells) are also
+                        saved for each marker. These are included in the table returned by `get_markers`.
+                        (Default value: False)
 
         Returns:
             None
@@ -3711,6 +3865,7 @@ class DataStore(MappingDatastore):
             gene_batch_size,
             use_prenormed,
             prenormed_store,
+            calc_stats,
             **norm_params,
         )
         z = self.z[assay.name]
@@ -3725,6 +3880,14 @@ class DataStore(MappingDatastore):
                 create_zarr_obj_array(
                     g, "names", np.array(list(vals.index)), dtype="uint64"
                 )
+                if calc_stats:
+                    stats = vals
+                    vals = stats["score"]
+                    for j, k in [("auroc", "auroc"), ("p_value", "p_values")]:
+                        g_s = create_zarr_dataset(
+                            g, k, (10000,), float, stats[j].values.shape
+                        )
+                        g_s[:] = stats[j].values
                 g_s = create_zarr_dataset(
                     g, "scores", (10000,), float, vals.values.shape
                 )
@@ -3736,7 +3899,7 @@ class DataStore(MappingDatastore):
         *,
         from_assay: str = None,
         cell_key: str = None,
-        pseudotime_key: str = None,
+        pseudotime_key: Union[str, List[str]] = None,
         min_cells: int = 10,
         gene_batch_size: int = 50,
         **norm_params,
@@ -3752,7 +3915,8 @@ class DataStore(MappingDatastore):
             cell_key: To run the test on specific subset of cells, provide the name of a boolean column in
                         the cell metadata table. (Default value: 'I')
             pseudotime_key: Required parameter. This has to be a column name from cell metadata table. This column
-                            contains values for pseudotime ordering of the cells.
+                            contains values for pseudotime ordering of the cells. A list of column names can be
+                            provided to test multiple regressors while reading the data only once.
             min_cells: Minimum number of cells where a gene should have non-zero value to be considered for test.
                        (Default: 10)
             gene_batch_size: Number of genes to be loaded in memory at a time. (Default value: 50).
@@ -3771,21 +3935,26 @@ class DataStore(MappingDatastore):
             )
         if cell_key is None:
             cell_key = "I"
+        if isinstance(pseudotime_key, str):
+            pseudotime_key = [pseudotime_key]
         assay = self._get_assay(from_assay)
-        ptime = assay.cells.fetch(pseudotime_key, key=cell_key)
+        ptime = pd.DataFrame(
+            {x: assay.cells.fetch(x, key=cell_key) for x in pseudotime_key}
+        )
         markers = find_markers_by_regression(
             assay, cell_key, ptime, min_cells, gene_batch_size, **norm_params
         )
-        assay.feats.insert(
-            f"{cell_key}__{pseudotime_key}__r",
-            markers["r_value"].values,
-            overwrite=True,
-        )
-        assay.feats.insert(
-            f"{cell_key}__{pseudotime_key}__p",
-            markers["p_value"].values,
-            overwrite=True,
-        )
+        for i in pseudotime_key:
+            assay.feats.insert(
+                f"{cell_key}__{i}__r",
+                markers[(i, "r_value")].values,
+                overwrite=True,
+            )
+            assay.feats.insert(
+                f"{cell_key}__{i}__p",
+                markers[(i, "p_value")].values,
+                overwrite=True,
+            )
 
     def run_pseudotime_aggregation(
         self,
@@ -3909,7 +4078,8 @@ class DataStore(MappingDatastore):
                       Results are returned for this group
 
         Returns:
-            Pandas dataframe with marker feature names and scores
+            Pandas dataframe with marker feature names and scores. If `run_marker_search` was run with `calc_stats`
+            then the 'auroc' and 'p_value' columns are also included.
         """
 
         if cell_key is None:
@@ -3950,6 +4120,9 @@ class DataStore(MappingDatastore):
             # Backward compatibility when we using 'ids' as indices
             idx = assay.feats.get_index_by(df.index, "ids")
         df["names"] = assay.feats.fetch_all("names")[idx]
+        if "auroc" in g[group_id]:
+            df["auroc"] = g[group_id]["auroc"][:]
+            df["p_value"] = g[group_id]["p_values"][:]
         return df
 
     def export_markers_to_csv(
@@ -4003,6 +4176,60 @@ class DataStore(MappingDatastore):
         pd.DataFrame(markers_table).fillna("").to_csv(csv_filename, index=False)
         return None
 
+    def run_feature_set_scoring(
+        self,
+        *,
+        from_assay: str = None,
+        cell_key: str = None,
+        feature_sets: Dict[str, List[str]] = None,
+        ctrl_size: int = None,
+        n_bins: int = 50,
+        rand_seed: int = 4466,
+    ) -> None:
+        """
+        Computes a score for each of the provided feature (gene) sets. The score of a set is the average expression
+        of its features minus the average expression of a control set of features, sampled from the same expression
+        bins (see `run_cell_cycle_scoring` for details). The control sets of all the feature sets are sampled
+        beforehand and all the scores are calculated in a single pass over the data. The scores are saved in the
+        cell metadata table using the names of the feature sets as base labels.
+
+        Args:
+            from_assay: Name of assay to be used. If no value is provided then the default assay will be used.
+            cell_key: Name of a boolean column in cell metadata table. Only the cells with True value are scored.
+                      (Default value: 'I')
+            feature_sets: This is a mandatory parameter. A dictionary with names of feature sets as keys and lists of
+                          feature names as values.
+            ctrl_size: Number of control features to be sampled from each bin. If not provided then the size of the
+                       smallest feature set is used.
+            n_bins: Number of bins into which average expression of genes is divided. (Default value: 50)
+            rand_seed: A random values to set seed while sampling the control features. (Default value: 4466)
+
+        Returns: None
+
+        """
+        if feature_sets is None or len(feature_sets) == 0:
+            raise ValueError(
+                "ERROR: Please provide a dictionary of feature sets to `feature_sets`"
+            )
+        if from_assay is None:
+            from_assay = self._defaultAssay
+        assay = self._get_assay(from_assay)
+        if cell_key is None:
+            cell_key = "I"
+        if ctrl_size is None:
+            ctrl_size = min([len(x) for x in feature_sets.values()])
+
+        scores = assay.score_feature_sets(
+            feature_sets, cell_key, ctrl_size, n_bins, rand_seed
+        )
+        for i in scores:
+            self.cells.insert(
+                self._col_renamer(from_assay, cell_key, i),
+                scores[i].values,
+                key=cell_key,
+                overwrite=True,
+            )
+
     def run_cell_cycle_scoring(
         self,
         *,
@@ -4064,15 +4291,17 @@ class DataStore(MappingDatastore):
             g2m_genes = list(g2m_phase_genes)
         control_size = min(len(s_genes), len(g2m_genes))
 
-        s_score = assay.score_features(
-            s_genes, cell_key, control_size, n_bins, rand_seed
+        scores = assay.score_feature_sets(
+            {s_score_label: s_genes, g2m_score_label: g2m_genes},
+            cell_key,
+            control_size,
+            n_bins,
+            rand_seed,
         )
+        s_score = scores[s_score_label].values
+        g2m_score = scores[g2m_score_label].values
         s_score_label = self._col_renamer(from_assay, cell_key, s_score_label)
         self.cells.insert(s_score_label, s_score, key=cell_key, overwrite=True)
-
-        g2m_score = assay.score_features(
-            g2m_genes, cell_key, control_size, n_bins, rand_seed
-        )
         g2m_score_label = self._col_renamer(from_assay, cell_key, g2m_score_label)
         self.cells.insert(g2m_score_label, g2m_score, key=cell_key, overwrite=True)
 
@@ -4139,18 +4368,23 @@ class DataStore(MappingDatastore):
             dtype="float",
         )
 
+        # All the groups are aggregated in a single pass over the normalized data
         cell_idx = np.array(list(range(assay.cells.N)))
-        for n, i in tqdmbar(
-            enumerate(group_set), desc="Writing to Zarr", total=len(group_set)
-        ):
-            feat_idx = np.where(groups == i)[0]
-            temp = np.zeros(assay.cells.N)
-            temp[cell_idx] = (
-                assay.normed(cell_idx=cell_idx, feat_idx=feat_idx)
-                .mean(axis=1)
-                .compute()
-            )
-            g[:, n] = temp
+        feat_idx = np.where(np.isin(groups, group_set))[0]
+        group_index = pd.Series(np.arange(len(group_set)), index=group_set)
+
+        def _write_block(start: int, end: int, stats: np.ndarray) -> None:
+            g[start:end, :] = stats["total"] / stats["n"]
+
+        segmented_aggregate(
+            assay.normed(cell_idx=cell_idx, feat_idx=feat_idx),
+            group_index.reindex(groups[feat_idx]).values,
+            len(group_set),
+            1,
+            self.nthreads,
+            msg="Aggregating feature groups",
+            block_callback=_write_block,
+        )
 
         self._load_assays(min_cells=0, custom_assay_types={assay_label: "Assay"})
         self._ini_cell_props(min_features=0, mito_pattern="", ribo_pattern="")
@@ -4278,16 +4512,27 @@ class DataStore(MappingDatastore):
             raise ValueError("ERROR: Please provide a value for `group_key` parameter")
         groups = self.cells.fetch_all(group_key)
 
-        vals = {}
-        for g in tqdmbar(sorted(set(groups))):
+        # Each pseudo-replicate is a segment of cells. All segments are summed in a single pass over the data
+        segments = np.full(len(groups), -1)
+        seg_names = []
+        for g in sorted(set(groups)):
             if g in null_vals:
                 continue
             rep_indices = make_reps(np.where(groups == g)[0], pseudo_reps, random_seed)
             for n, idx in enumerate(rep_indices):
-                vals[f"{g}_Rep{n + 1}"] = controlled_compute(
-                    assay.rawData[idx].sum(axis=0), self.nthreads
-                )
-        vals = pd.DataFrame(vals)
+                segments[idx] = len(seg_names)
+                seg_names.append(f"{g}_Rep{n + 1}")
+        sums = segmented_aggregate(
+            assay.rawData,
+            segments,
+            len(seg_names),
+            0,
+            self.nthreads,
+            msg="Making pseudo-bulk profiles",
+        )["total"]
+        if np.issubdtype(assay.rawData.dtype, np.integer):
+            sums = sums.astype(np.zeros(1, dtype=assay.rawData.dtype).sum().dtype)
+        vals = pd.DataFrame(sums.T, columns=seg_names)
         vals = vals[(vals.sum(axis=1) != 0)]
         vals["names"] = (
             pd.Series(assay.feats.fetch_all("names")).reindex(vals.index).values
@@ -4295,6 +4540,122 @@ class DataStore(MappingDatastore):
         vals.index = pd.Series(assay.feats.fetch_all("ids")).reindex(vals.index).values
         return vals
 
+    def aggregate(
+        self,
+        *,
+        from_assay: str = None,
+        cell_key: str = None,
+        group_key: str = None,
+        on: str = "cells",
+        stats: Union[str, List[str]] = "mean",
+        normalized: bool = False,
+        null_vals: list = None,
+        **norm_params,
+    ) -> Union[pd.DataFrame, dict]:
+        """
+        Aggregates the data of groups of cells or groups of features. All the groups are aggregated in a single
+        pass over the data.
+
+        Args:
+            from_assay: Name of assay to be used. If no value is provided then the default assay will be used.
+            cell_key: Name of a boolean column in cell metadata table. Only the cells with True value are used.
+                      (Default value: 'I')
+            group_key: Name of the column to be used for grouping. This column is taken from the cell metadata
+                       table when `on` is 'cells' and from the feature metadata table when `on` is 'features'.
+            on: Either 'cells' or 'features'. When 'cells', the values of cells from the same group are aggregated
+                and the output has one row per feature. When 'features', the values of features from the same group
+                are aggregated and the output has one row per cell. (Default value: 'cells')
+            stats: One or more of: 'sum', 'mean', 'nnz' (number of nonzero values) and 'var' (population variance).
+                   (Default value: 'mean')
+            normalized: If True, the normalized data is aggregated, otherwise the raw data is used.
+                        (Default value: False)
+            null_vals: Values in the `group_key` column that should be ignored. (Default value: [-1])
+            **norm_params: Passed to the `normed` method of the assay. Only used when `normalized` is True.
+
+        Returns:
+            A pandas DataFrame with groups as columns if `stats` is a string. If `stats` is a list then a
+            dictionary with the names of statistics as keys and the corresponding DataFrames as values.
+
+        """
+        if group_key is None:
+            raise ValueError("ERROR: Please provide a value for `group_key` parameter")
+        if on not in ("cells", "features"):
+            raise ValueError("ERROR: `on` can only be either 'cells' or 'features'")
+        stat_names = [stats] if isinstance(stats, str) else list(stats)
+        for i in stat_names:
+            if i not in ("sum", "mean", "nnz", "var"):
+                raise ValueError(
+                    f"ERROR: {i} is not a valid statistic. Please choose from: 'sum', 'mean', 'nnz' and 'var'"
+                )
+        if cell_key is None:
+            cell_key = "I"
+        if null_vals is None:
+            null_vals = [-1]
+        assay = self._get_assay(from_assay)
+        cell_idx = assay.cells.active_index(cell_key)
+        feat_idx = np.array(list(range(assay.feats.N)))
+        if on == "cells":
+            groups = assay.cells.fetch(group_key, key=cell_key)
+        else:
+            groups = assay.feats.fetch_all(group_key)
+        group_set = sorted(set(groups).difference(null_vals))
+        group_index = pd.Series(np.arange(len(group_set)), index=group_set)
+        group_index = group_index.reindex(groups).fillna(-1).values.astype(int)
+
+        if normalized:
+            arr = assay.normed(cell_idx=cell_idx, feat_idx=feat_idx, **norm_params)
+        else:
+            arr = assay.rawData[cell_idx, :]
+
+        def _get_stats(res: np.ndarray) -> dict:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                funcs = {
+                    "sum": lambda: res["total"],
+                    "mean": lambda: res["total"] / res["n"],
+                    "nnz": lambda: res["nnz"],
+                    "var": lambda: res["m2"] / res["n"],
+                }
+                return {i: funcs[i]() for i in stat_names}
+
+        if on == "cells":
+            vals = _get_stats(
+                segmented_aggregate(
+                    arr,
+                    group_index,
+                    len(group_set),
+                    0,
+                    self.nthreads,
+                    msg=f"Aggregating {on}",
+                )
+            )
+            vals = {k: v.T for k, v in vals.items()}
+            index = assay.feats.fetch_all("ids")
+        else:
+            # Only the requested statistics are kept, filled one block of cells at a time
+            vals = {i: np.empty((arr.shape[0], len(group_set))) for i in stat_names}
+
+            def _write_block(start: int, end: int, res: np.ndarray) -> None:
+                for k, v in _get_stats(res).items():
+                    vals[k][start:end] = v
+
+            segmented_aggregate(
+                arr,
+                group_index,
+                len(group_set),
+                1,
+                self.nthreads,
+                msg=f"Aggregating {on}",
+                block_callback=_write_block,
+            )
+            index = assay.cells.fetch("ids", key=cell_key)
+        dfs = {
+            i: pd.DataFrame(vals[i], index=index, columns=group_set)
+            for i in stat_names
+        }
+        if isinstance(stats, str):
+            return dfs[stats]
+        return dfs
+
     def to_anndata(
         self, *, from_assay: str = None, cell_key: str = None, layers: dict = None
     ):
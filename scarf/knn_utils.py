@@ -5,13 +5,21 @@ import numpy as np
 from .writers import create_zarr_dataset
 from .ann import AnnStream
 from .utils import tqdmbar
-import pandas as pd
 from scipy.sparse import csr_matrix, coo_matrix
-from typing import List
-from numba import jit
+from typing import List, Tuple
+from numba import jit, prange
 
 
-__all__ = ["self_query_knn", "smoothen_dists", "export_knn_to_mtx", "merge_graphs"]
+__all__ = [
+    "self_query_knn",
+    "smoothen_dists",
+    "create_graph_datasets",
+    "migrate_graph",
+    "export_knn_to_mtx",
+    "csr_to_igraph",
+    "leiden_partitions",
+    "merge_graphs",
+]
 
 
 def self_query_knn(ann_obj: AnnStream, store, chunk_size: int, nthreads: int) -> float:
@@ -39,10 +47,10 @@ def self_query_knn(ann_obj: AnnStream, store, chunk_size: int, nthreads: int) ->
     nsample_start = 0
     tnm = 0  # Number of missed recall
     with threadpool_limits(limits=nthreads):
-        for i in ann_obj.iter_blocks(msg="Saving KNN graph"):
+        for i in ann_obj.iter_reduced_blocks(msg="Saving KNN graph"):
             nsample_end = nsample_start + i.shape[0]
             ki, kv, nm = ann_obj.transform_ann(
-                ann_obj.reducer(i),
+                i,
                 k=n_neighbors,
                 self_indices=np.arange(nsample_start, nsample_end),
             )
@@ -65,7 +73,9 @@ def _is_umap_version_new():
         return False
 
 
-def smoothen_dists(store, z_idx, z_dist, lc: float, bw: float, chunk_size: int):
+def smoothen_dists(
+    store, z_idx, z_dist, lc: float, bw: float, chunk_size: int, nthreads: int = 1
+):
     """
     Smoothens KNN distances.
 
@@ -76,70 +86,162 @@ def smoothen_dists(store, z_idx, z_dist, lc: float, bw: float, chunk_size: int):
         lc ():
         bw ():
         chunk_size ():
+        nthreads: Number of threads used to read and write chunks in parallel. (Default value: 1)
 
     Returns:
         None
 
     """
     from umap.umap_ import smooth_knn_dist, compute_membership_strengths
+    from concurrent.futures import ThreadPoolExecutor
 
     umap_is_latest = _is_umap_version_new()
 
     n_cells, n_neighbors = z_idx.shape
-    zge = create_zarr_dataset(
-        store, f"edges", (chunk_size,), ("u8", "u8"), (n_cells * n_neighbors, 2)
-    )
-    zgw = create_zarr_dataset(
-        store, f"weights", (chunk_size,), "f8", (n_cells * n_neighbors,)
-    )
-    last_row = 0
-    val_counts = 0
+    zgi, zgw = create_graph_datasets(store, n_cells, n_neighbors, chunk_size)
+
+    def _read_chunk(i: int):
+        return z_idx[i : i + chunk_size, :], z_dist[i : i + chunk_size, :]
+
+    def _write_chunk(start: int, cols, vals):
+        end = start + cols.shape[0]
+        zgi[start:end] = cols
+        zgw[start:end] = vals
+
+    # Reading and writing of chunks (including (de)compression) is done on `nthreads` threads while the
+    # current chunk is being processed. The UMAP functions are run on the main thread as
+    # `compute_membership_strengths` is itself parallelized by numba.
+    starts = list(range(0, n_cells, chunk_size))
+    reads, writes = {}, []
     null_idx = []
     global_min = 1
-    for i in tqdmbar(range(0, n_cells, chunk_size), desc="Smoothening KNN distances"):
-        if i + chunk_size > n_cells:
-            ki, kv = z_idx[i:n_cells, :], z_dist[i:n_cells, :]
-        else:
-            ki, kv = z_idx[i: i + chunk_size, :], z_dist[i: i + chunk_size, :]
-        kv = kv.astype(np.float32, order="C")
-        sigmas, rhos = smooth_knn_dist(
-            kv, k=n_neighbors, local_connectivity=lc, bandwidth=bw
+    with ThreadPoolExecutor(max_workers=max(nthreads, 1)) as pool:
+        for n, i in enumerate(tqdmbar(starts, desc="Smoothening KNN distances")):
+            for j in starts[n : n + nthreads + 1]:
+                if j not in reads:
+                    reads[j] = pool.submit(_read_chunk, j)
+            ki, kv = reads.pop(i).result()
+            kv = kv.astype(np.float32, order="C")
+            sigmas, rhos = smooth_knn_dist(
+                kv, k=n_neighbors, local_connectivity=lc, bandwidth=bw
+            )
+            if umap_is_latest:
+                rows, cols, vals, _ = compute_membership_strengths(
+                    ki, kv, sigmas, rhos
+                )
+            else:
+                rows, cols, vals = compute_membership_strengths(ki, kv, sigmas, rhos)
+            # Each cell has exactly n_neighbors edges (in order of distance), so the row of each edge is
+            # implicit and chunks are written to non-overlapping regions
+            cols = cols.reshape(-1, n_neighbors)
+            vals = vals.reshape(-1, n_neighbors)
+            writes.append(pool.submit(_write_chunk, i, cols, vals))
+            while len(writes) > nthreads:
+                writes.pop(0).result()
+
+            # Edges with 0 weights are fixed once all chunks are written. Here we only record
+            # their positions and the minimum non-zero weight.
+            nidx = vals == 0
+            if nidx.sum() > 0:
+                min_val = vals[~nidx].min()
+                if min_val < global_min:
+                    global_min = min_val
+                null_idx.append(np.flatnonzero(nidx) + i * n_neighbors)
+        for w in writes:
+            w.result()
+    if len(null_idx) > 0:
+        # Only the chunks that contain the zero weight edges are rewritten
+        zgw.set_coordinate_selection(
+            np.unravel_index(np.hstack(null_idx), zgw.shape), global_min
         )
-        if umap_is_latest:
-            rows, cols, vals, _ = compute_membership_strengths(ki, kv, sigmas, rhos)
-        else:
-            rows, cols, vals = compute_membership_strengths(ki, kv, sigmas, rhos)
-        rows = rows + last_row
-        start = val_counts
-        end = val_counts + len(rows)
-        last_row = rows[-1] + 1
-        val_counts += len(rows)
-        zge[start:end, 0] = rows
-        zge[start:end, 1] = cols
-        zgw[start:end] = vals
-
-        # Fixing edges with 0 weights
-        # We are doing these steps here to have minimum operations outside
-        # the scope of a progress bar
-        nidx = vals == 0
-        if nidx.sum() > 0:
-            min_val = vals[~nidx].min()
-            if min_val < global_min:
-                global_min = min_val
-        null_idx.extend(nidx)
-
-    # The whole zarr array needs to copied, modified and written back.
-    # Or is this assumption wrong?
-    w = zgw[:]
-    w[null_idx] = global_min
-    zgw[:] = w
     return None
 
 
+def create_graph_datasets(store, n_cells: int, n_neighbors: int, chunk_size: int):
+    """
+    Creates the Zarr arrays of a graph in which each cell has the same number of edges. `indices` (uint32) holds the
+    target cell of each edge and `weights` (float32) the edge weights. Both have shape (n_cells, n_neighbors), the
+    row of an edge being its source cell. Edges of a cell are stored in order of rank (for KNN graphs, in decreasing
+    order of weight) so that the top k edges of each cell are the first k columns.
+
+    Args:
+        store: Zarr group of the graph
+        n_cells: Number of cells in the graph
+        n_neighbors: Number of edges per cell
+        chunk_size: Number of cells in each chunk
+
+    Returns:
+        A tuple of the `indices` and `weights` Zarr arrays
+    """
+    zgi = create_zarr_dataset(
+        store, "indices", (chunk_size,), "u4", (n_cells, n_neighbors)
+    )
+    zgw = create_zarr_dataset(
+        store, "weights", (chunk_size,), "f4", (n_cells, n_neighbors)
+    )
+    return zgi, zgw
+
+
+def migrate_graph(
+    store, n_cells: int, n_neighbors: int, transposed: bool, chunk_size: int = 10000
+) -> bool:
+    """
+    Converts a graph saved in the earlier layout, i.e. an `edges` array of shape (n_cells * n_neighbors, 2) and a
+    flat `weights` array, into the layout created by `create_graph_datasets`. The graph is converted in place,
+    one chunk of cells at a time.
+
+    Args:
+        store: Zarr group of the graph
+        n_cells: Number of cells in the graph
+        n_neighbors: Number of edges per cell
+        transposed: Whether the source cells of the edges are in the second column of `edges` (as is the case for
+                    integrated graphs)
+        chunk_size: Number of cells to convert at a time (Default value: 10000)
+
+    Returns:
+        False if the graph is not in the earlier layout or if it does not have exactly `n_neighbors` consecutive edges
+        per cell, in which case it is left unchanged. True otherwise.
+    """
+    if "edges" not in store:
+        return False
+    edges, weights = store["edges"], store["weights"]
+    if edges.shape[0] != n_cells * n_neighbors:
+        return False
+    src, tgt = (1, 0) if transposed else (0, 1)
+    for i in range(0, n_cells, chunk_size):
+        e = edges[i * n_neighbors : (i + chunk_size) * n_neighbors, src]
+        if not np.array_equal(
+            e, np.repeat(np.arange(i, i + len(e) // n_neighbors), n_neighbors)
+        ):
+            return False
+    # The new arrays are created under temporary names as `weights` exists in both layouts
+    zgi, zgw = create_graph_datasets(
+        store.create_group("_migrated", overwrite=True),
+        n_cells,
+        n_neighbors,
+        chunk_size,
+    )
+    for i in tqdmbar(range(0, n_cells, chunk_size), desc="Migrating graph"):
+        s, e = i * n_neighbors, (i + chunk_size) * n_neighbors
+        zgi[i : i + chunk_size] = edges[s:e, tgt].reshape(-1, n_neighbors)
+        zgw[i : i + chunk_size] = weights[s:e].reshape(-1, n_neighbors)
+    del store["edges"], store["weights"]
+    store.move("_migrated/indices", "indices")
+    store.move("_migrated/weights", "weights")
+    del store["_migrated"]
+    if transposed:
+        store.attrs["transposed"] = True
+    return True
+
+
 def export_knn_to_mtx(mtx: str, csr_graph, batch_size: int = 1000) -> None:
     """
     Exports KNN matrix in Matrix Market format.
 
+    The edges are written row by row, in the order they are stored in the CSR matrix.
+    Each batch of rows is formatted in a single pass over plain Python lists, which avoids
+    the overhead of building and serializing a DataFrame for every batch.
+
     Args:
         mtx:
         csr_graph:
@@ -149,7 +251,9 @@ def export_knn_to_mtx(mtx: str, csr_graph, batch_size: int = 1000) -> None:
         None
 
     """
+    csr_graph = csr_matrix(csr_graph)
     n_cells = csr_graph.shape[0]
+    indptr = csr_graph.indptr
     with open(mtx, "w") as h:
         h.write("%%MatrixMarket matrix coordinate real general\n% Generated by Scarf\n")
         h.write(f"{n_cells} {n_cells} {csr_graph.nnz}\n")
@@ -160,9 +264,17 @@ def export_knn_to_mtx(mtx: str, csr_graph, batch_size: int = 1000) -> None:
         ):
             if e > n_cells:
                 e = n_cells
-            sg = csr_graph[s:e].tocoo()
-            df = pd.DataFrame({"row": sg.row + s + 1, "col": sg.col + 1, "d": sg.data})
-            df.to_csv(h, sep=" ", header=False, index=False, mode="a")
+            rows = np.repeat(np.arange(s + 1, e + 1), np.diff(indptr[s : e + 1]))
+            cols = csr_graph.indices[indptr[s] : indptr[e]] + 1
+            vals = csr_graph.data[indptr[s] : indptr[e]]
+            h.write(
+                "".join(
+                    [
+                        f"{i} {j} {v!r}\n"
+                        for i, j, v in zip(rows.tolist(), cols.tolist(), vals.tolist())
+                    ]
+                )
+            )
             s = e
         if s != n_cells:
             raise ValueError(
@@ -171,7 +283,191 @@ def export_knn_to_mtx(mtx: str, csr_graph, batch_size: int = 1000) -> None:
     return None
 
 
+def _csr_edge_arrays(graph) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Extracts the edges and their weights from a sparse graph, in row-major order
+    and ignoring any explicitly stored zeros.
+
+    Args:
+        graph: A scipy sparse matrix representing the graph.
+
+    Returns:
+        An (n_edges, 2) array of source and target vertex indices and an array of
+        edge weights
+    """
+    graph = csr_matrix(graph)
+    if not graph.has_canonical_format:
+        graph = graph.copy()
+        graph.sum_duplicates()
+    rows = np.repeat(np.arange(graph.shape[0], dtype=np.int64), np.diff(graph.indptr))
+    mask = graph.data != 0
+    edges = np.empty((mask.sum(), 2), dtype=np.int64)
+    edges[:, 0] = rows[mask]
+    edges[:, 1] = graph.indices[mask]
+    return edges, graph.data[mask].astype(np.float64)
+
+
+def _make_igraph(n_vertices: int, edges: np.ndarray, weights: np.ndarray):
+    # noinspection PyPackageRequirements
+    import igraph  # python-igraph
+
+    g = igraph.Graph(n_vertices)
+    # Passing the integer array directly avoids creating a list of Python tuples
+    g.add_edges(edges)
+    g.es["weight"] = weights
+    return g
+
+
+def csr_to_igraph(graph):
+    """
+    Builds a weighted undirected igraph Graph directly from the `indptr`, `indices` and
+    `data` arrays of a sparse graph. The edges are added in the same order as returned
+    by `graph.nonzero()`.
+
+    Args:
+        graph: A scipy sparse matrix representing the graph.
+
+    Returns:
+        An igraph Graph object with edge weights saved under 'weight' attribute.
+    """
+    edges, weights = _csr_edge_arrays(graph)
+    return _make_igraph(graph.shape[0], edges, weights)
+
+
+def _leiden_membership(g, resolution: float, seed: int) -> np.ndarray:
+    # noinspection PyPackageRequirements
+    import leidenalg
+
+    part = leidenalg.find_partition(
+        g,
+        leidenalg.RBConfigurationVertexPartition,
+        resolution_parameter=resolution,
+        seed=seed,
+    )
+    return np.array(part.membership)
+
+
+def _leiden_worker(
+    edges_shm: str,
+    weights_shm: str,
+    n_vertices: int,
+    n_edges: int,
+    resolution: float,
+    seed: int,
+) -> np.ndarray:
+    """
+    Runs Leiden clustering in a worker process on a graph whose edges and weights are
+    read from shared memory blocks.
+    """
+    from multiprocessing import shared_memory
+
+    e_shm = shared_memory.SharedMemory(name=edges_shm)
+    w_shm = shared_memory.SharedMemory(name=weights_shm)
+    try:
+        edges = np.ndarray((n_edges, 2), dtype=np.int64, buffer=e_shm.buf)
+        weights = np.ndarray(n_edges, dtype=np.float64, buffer=w_shm.buf)
+        g = _make_igraph(n_vertices, edges, weights)
+        # The views must be released before the shared memory can be closed
+        del edges, weights
+        return _leiden_membership(g, resolution, seed)
+    finally:
+        e_shm.close()
+        w_shm.close()
+
+
+def leiden_partitions(
+    graph, resolutions: List[float], seed: int, nthreads: int = 1
+) -> List[np.ndarray]:
+    """
+    Runs Leiden clustering (using `RBConfigurationVertexPartition`) on a graph once for
+    each of the given resolution values. When `nthreads` is greater than 1, the
+    resolutions are processed in parallel in a pool of worker processes that read the
+    graph's edges from shared memory, rather than each receiving a pickled copy.
+    The worker processes are spawned, so scripts that call this function with `nthreads`
+    greater than 1 need to guard their entry point with `if __name__ == "__main__":`.
+
+    Args:
+        graph: A scipy sparse matrix representing the graph.
+        resolutions: A list of resolution parameter values.
+        seed: Random seed used for every partition.
+        nthreads: Maximum number of worker processes to use. (Default value: 1)
+
+    Returns:
+        A list of arrays of zero-based cluster memberships, in the same order as `resolutions`
+    """
+    n_workers = min(nthreads, len(resolutions))
+    if n_workers <= 1 or graph.count_nonzero() == 0:
+        g = csr_to_igraph(graph)
+        return [_leiden_membership(g, r, seed) for r in resolutions]
+    edges, weights = _csr_edge_arrays(graph)
+    n_vertices, n_edges = graph.shape[0], len(edges)
+
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context, shared_memory
+
+    e_shm = shared_memory.SharedMemory(create=True, size=edges.nbytes)
+    w_shm = shared_memory.SharedMemory(create=True, size=weights.nbytes)
+    try:
+        np.ndarray(edges.shape, dtype=edges.dtype, buffer=e_shm.buf)[:] = edges
+        np.ndarray(weights.shape, dtype=weights.dtype, buffer=w_shm.buf)[:] = weights
+        del edges, weights
+        # Forking a process that has running threads (dask, numba, blosc) is unsafe,
+        # hence the workers are started afresh
+        with ProcessPoolExecutor(
+            max_workers=n_workers, mp_context=get_context("spawn")
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _leiden_worker,
+                    e_shm.name,
+                    w_shm.name,
+                    n_vertices,
+                    n_edges,
+                    r,
+                    seed,
+                )
+                for r in resolutions
+            ]
+            return [f.result() for f in tqdmbar(futures, desc="Leiden clustering")]
+    finally:
+        e_shm.close()
+        e_shm.unlink()
+        w_shm.close()
+        w_shm.unlink()
+
+
 @jit(nopython=True)
+def _count_shared(a: np.ndarray, b: np.ndarray) -> int:
+    """
+    Counts the number of unique values shared by two sorted 1D arrays.
+    """
+    n = 0
+    p, q = 0, 0
+    while p < a.shape[0] and q < b.shape[0]:
+        if a[p] < b[q]:
+            p += 1
+        elif a[p] > b[q]:
+            q += 1
+        else:
+            n += 1
+            v = a[p]
+            while p < a.shape[0] and a[p] == v:
+                p += 1
+            while q < b.shape[0] and b[q] == v:
+                q += 1
+    return n
+
+
+@jit(nopython=True, parallel=True)
+def _calc_snn_sorted(indices: np.ndarray, sorted_indices: np.ndarray) -> np.ndarray:
+    ncells, nk = indices.shape
+    snn = np.zeros((ncells, nk))
+    for i in prange(ncells):
+        for j in range(nk):
+            snn[i, j] = _count_shared(sorted_indices[i], sorted_indices[indices[i, j]])
+    return snn
+
+
 def calc_snn(indices: np.ndarray) -> np.ndarray:
     """
     Calculates shared nearest neighbour between each node and its neighbour.
@@ -182,12 +478,8 @@ def calc_snn(indices: np.ndarray) -> np.ndarray:
     Returns: A numpy matrix of shape (n_cells, n neighbours)
 
     """
-    ncells, nk = indices.shape
-    snn = np.zeros((ncells, nk))
-    for i in range(ncells):
-        for j in range(nk):
-            k = indices[i][j]
-            snn[i][j] = len(set(indices[i]).intersection(set(indices[k])))
+    nk = indices.shape[1]
+    snn = _calc_snn_sorted(indices, np.sort(indices, axis=1))
     return snn / (nk - 1)
 
 
@@ -195,35 +487,42 @@ def weight_sort_indices(
     i: np.ndarray, w: np.ndarray, wn: np.ndarray, n: int
 ) -> (np.ndarray, np.ndarray):
     """
-    Sort the array i and w based on values of wn. Only keep the top n values.
+    Sort the arrays i and w based on values of wn. Only keep the top n values. Each row of the
+    input arrays is processed independently.
 
     Args:
-        i: A 1D array of indices
-        w: A 1D array of weights
-        wn: A 1D array of weights. These weights are used for sorting
+        i: A 2D array of indices
+        w: A 2D array of weights
+        wn: A 2D array of weights. These weights are used for sorting
         n: Number of neighbours to retain.
 
-    Returns: A tuple of two 1D arrays representing sorted and filtered
+    Returns: A tuple of two 2D arrays representing sorted and filtered
              indices and their corresponding weights
 
     """
-
-    idx = np.argsort(wn)[::-1]
-    i = i[idx]
-    w = w[idx]
-    # Removing duplicate neighbours
-    _, idx = np.unique(i, return_index=True)
-    idx = sorted(idx)
-    return i[idx][:n], w[idx][:n]
-
-
-def merge_graphs(csr_mats: List[csr_matrix]) -> coo_matrix:
+    rows = np.arange(i.shape[0]).reshape(-1, 1)
+    idx = np.argsort(wn, axis=1)[:, ::-1]
+    i = i[rows, idx]
+    w = w[rows, idx]
+    # Removing duplicate neighbours, keeping their first occurrence
+    idx = np.argsort(i, axis=1, kind="stable")
+    si = i[rows, idx]
+    first = np.ones(i.shape, dtype=bool)
+    first[:, 1:] = si[:, 1:] != si[:, :-1]
+    keep = np.zeros(i.shape, dtype=bool)
+    keep[rows, idx] = first
+    keep &= np.cumsum(keep, axis=1) <= n
+    return i[keep].reshape(-1, n), w[keep].reshape(-1, n)
+
+
+def merge_graphs(csr_mats: List[csr_matrix], batch_size: int = 10000) -> coo_matrix:
     """
     Merge multiple graphs of same size and shape such that the merged graph have the same size and shape.
     Edge values are sorted based on their weight and the shared neighbours.
 
     Args:
         csr_mats: A list of two or more CSR matrices representing the graphs to be merged.
+        batch_size: Number of cells (rows) to merge at a time. (Default value: 10000)
 
     Returns: A merged graph in CSR matrix form.
              The merged graph has same number of edges as each graph
@@ -238,20 +537,22 @@ def merge_graphs(csr_mats: List[csr_matrix]) -> coo_matrix:
     except AssertionError:
         raise ValueError("ERROR: All graphs do not have the same number of edges")
 
+    s = csr_mats[0].shape
     nk = csr_mats[0][0].indices.shape[0]
+    indices = [mat.indices.reshape((s[0], nk)) for mat in csr_mats]
+    weights = [mat.data.reshape((s[0], nk)) for mat in csr_mats]
     snns = []
-    for mat in tqdmbar(csr_mats, desc="Identifying SNNs in graphs"):
-        snns.append(
-            calc_snn(mat.indices.reshape((mat.shape[0], mat[0].indices.shape[0])))
-        )
+    for idx in tqdmbar(indices, desc="Identifying SNNs in graphs"):
+        snns.append(calc_snn(idx))
     row, data = [], []
-    for i in tqdmbar(range(csr_mats[0].shape[0]), desc="Merging graph edges"):
-        mi = np.hstack([mat[i].indices for mat in csr_mats])
-        mwn = np.hstack([mat[i].data + snns[n][i] for n, mat in enumerate(csr_mats)])
-        mw = np.hstack([mat[i].data for mat in csr_mats])
+    for start in tqdmbar(range(0, s[0], batch_size), desc="Merging graph edges"):
+        end = start + batch_size
+        mi = np.hstack([x[start:end] for x in indices])
+        mwn = np.hstack([w[start:end] + x[start:end] for w, x in zip(weights, snns)])
+        mw = np.hstack([x[start:end] for x in weights])
         mi, mw = weight_sort_indices(mi, mw, mwn, nk)
-        row.extend(mi)
-        data.extend(mw)
-    s = csr_mats[0].shape
+        row.append(mi.ravel())
+        data.append(mw.ravel())
+    row, data = np.hstack(row), np.hstack(data)
     col = np.repeat(range(s[0]), nk)
     return coo_matrix((data, (row, col)), shape=s)
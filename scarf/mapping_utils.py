@@ -3,12 +3,13 @@ Utility functions for the mapping.
 """
 import dask.array as daskarr
 import numpy as np
+from scipy.sparse import csr_matrix
 from typing import Tuple
 from .assay import Assay
 from .utils import controlled_compute, show_dask_progress, logger, tqdmbar
 import pandas as pd
 
-__all__ = ["align_features", "coral"]
+__all__ = ["align_features", "coral", "group_mapping_scores", "predict_target_classes"]
 
 
 def _cov_diaged(da: daskarr) -> daskarr:
@@ -211,3 +212,83 @@ def align_features(
         og[pos_start:pos_end, :] = a
         pos_start = pos_end
     return s_idx
+
+
+def _neighbour_matrix(
+    indices: np.ndarray, weights: np.ndarray, n_ref: int
+) -> csr_matrix:
+    """
+    Creates a weighted incidence matrix of target cells (rows) and reference cells
+    (columns) from the nearest neighbour indices of the projected cells. Weights of
+    repeated neighbours are summed.
+    """
+    n, k = indices.shape
+    rows = np.repeat(np.arange(n), k)
+    return csr_matrix(
+        (weights.ravel(), (rows, indices.ravel().astype(np.int64))), shape=(n, n_ref)
+    )
+
+
+def group_mapping_scores(
+    indices: np.ndarray, weights: np.ndarray, target_groups: np.ndarray, n_ref: int
+) -> Tuple[np.ndarray, csr_matrix, np.ndarray]:
+    """
+    Sums the edge weights received by each reference cell from the projected target cells
+    of each target group. This is done for all the groups at once by multiplying a group
+    indicator matrix with the target-reference incidence matrix.
+
+    Args:
+        indices: Indices of reference cells that are nearest neighbours of the target cells.
+                 Shape is (n_target_cells, k).
+        weights: Edge weights, same shape as `indices`.
+        target_groups: Group identity of each target cell.
+        n_ref: Number of reference cells.
+
+    Returns:
+        Sorted unique groups, a sparse matrix of shape (n_groups, n_ref) with summed weights
+        for each group and the number of target cells in each group.
+    """
+    groups, codes = np.unique(target_groups, return_inverse=True)
+    n = len(codes)
+    indicator = csr_matrix((np.ones(n), (codes, np.arange(n))), shape=(len(groups), n))
+    scores = indicator @ _neighbour_matrix(indices, weights, n_ref)
+    return groups, scores.tocsr(), np.bincount(codes, minlength=len(groups))
+
+
+def predict_target_classes(
+    indices: np.ndarray,
+    weights: np.ndarray,
+    ref_groups: np.ndarray,
+    threshold_fraction: float,
+    na_val,
+) -> list:
+    """
+    Predicts the class of each target cell as the reference group that contributes more
+    than `threshold_fraction` of the cell's total edge weight. Cells for which none, or
+    more than one, of the groups cross the threshold are assigned `na_val`.
+
+    Args:
+        indices: Indices of reference cells that are nearest neighbours of the target cells.
+                 Shape is (n_target_cells, k).
+        weights: Edge weights, same shape as `indices`.
+        ref_groups: Group identity of each reference cell.
+        threshold_fraction: The threshold for deciding if a cell belongs to a group or not.
+        na_val: Value to be used if a cell is not classified to any of the groups.
+
+    Returns:
+        A list of predicted classes, one for each target cell.
+    """
+    classes, codes = np.unique(ref_groups, return_inverse=True)
+    n = indices.shape[0]
+    group_weights = _neighbour_matrix(codes[indices], weights, len(classes))
+    group_weights.sum_duplicates()
+    totals = weights.sum(axis=1)
+    rows = np.repeat(np.arange(n), np.diff(group_weights.indptr))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        passed = group_weights.data / totals[rows] > threshold_fraction
+    n_passed = np.bincount(rows[passed], minlength=n)
+    preds = np.full(n, na_val, dtype=object)
+    rows, cols = rows[passed], group_weights.indices[passed]
+    unique = n_passed[rows] == 1
+    preds[rows[unique]] = classes[cols[unique]]
+    return preds.tolist()
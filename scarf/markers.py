@@ -3,11 +3,11 @@ Module to find biomarkers.
 """
 from .assay import Assay
 from .utils import logger, tqdmbar
-from numba import jit
+from numba import jit, prange
+import math
 import numpy as np
 import pandas as pd
-from scipy.stats import linregress
-from typing import Optional
+from typing import Optional, Union
 
 
 __all__ = [
@@ -28,6 +28,73 @@ def read_prenormed_batches(store, cell_idx: np.ndarray, batch_size: int, desc: s
         yield pd.DataFrame(batch)
 
 
+@jit(nopython=True, parallel=True, cache=True)
+def calc_rank_stats(
+    data: np.ndarray, groups: np.ndarray, n_groups: int
+) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Ranks the values of each feature (column) across cells (rows) and calculates per-group statistics
+    in a single scan over the sorted values. Features are processed in parallel.
+
+    Args:
+        data: A 2D array of shape (n_cells, n_features). Fortran order is preferable.
+        groups: Group index (0 to n_groups - 1) of each cell
+        n_groups: Number of groups
+
+    Returns:
+        A tuple of three arrays, each of shape (n_features, n_groups):
+        - Mean dense rank of the feature in each group, scaled such that the values sum to 1 for each feature
+        - AUROC of the feature for each group versus rest of the cells
+        - p-values of two-sided Wilcoxon rank-sum test (normal approximation with tie correction)
+    """
+    n, m = data.shape
+    sizes = np.zeros(n_groups)
+    for i in range(n):
+        sizes[groups[i]] += 1
+    mean_ranks = np.zeros((m, n_groups))
+    auroc = np.zeros((m, n_groups))
+    pvals = np.ones((m, n_groups))
+    for j in prange(m):
+        v = data[:, j]
+        order = np.argsort(v, kind="mergesort")
+        dense_sums = np.zeros(n_groups)
+        avg_sums = np.zeros(n_groups)
+        tie_sum = 0.0
+        dense_rank = 0
+        s = 0
+        while s < n:
+            e = s + 1
+            while e < n and v[order[e]] == v[order[s]]:
+                e += 1
+            dense_rank += 1
+            avg_rank = (s + e + 1) / 2
+            for t in range(s, e):
+                g = groups[order[t]]
+                dense_sums[g] += dense_rank
+                avg_sums[g] += avg_rank
+            t = e - s
+            tie_sum += t**3 - t
+            s = e
+        total = 0.0
+        for g in range(n_groups):
+            mean_ranks[j, g] = dense_sums[g] / sizes[g]
+            total += mean_ranks[j, g]
+        for g in range(n_groups):
+            mean_ranks[j, g] = mean_ranks[j, g] / total
+            n1 = sizes[g]
+            n2 = n - n1
+            if n2 == 0:
+                auroc[j, g] = np.nan
+                continue
+            u = avg_sums[g] - n1 * (n1 + 1) / 2
+            auroc[j, g] = u / (n1 * n2)
+            sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_sum / (n * (n - 1))))
+            if sigma > 0:
+                z = (u - n1 * n2 / 2) / sigma
+                pvals[j, g] = math.erfc(abs(z) / math.sqrt(2))
+    return mean_ranks, auroc, pvals
+
+
 def find_markers_by_rank(
     assay: Assay,
     group_key: str,
@@ -36,6 +103,7 @@ def find_markers_by_rank(
     batch_size: int,
     use_prenormed: bool,
     prenormed_store: Optional[str],
+    calc_stats: bool = False,
     **norm_params,
 ) -> dict:
     """
@@ -49,36 +117,21 @@ def find_markers_by_rank(
         batch_size:
         use_prenormed:
         prenormed_store:
+        calc_stats: If True, then AUROC and p-values of Wilcoxon rank-sum test are also returned for each marker
+                    (Default value: False)
 
     Returns:
-
+        A dictionary with group names as keys. The values are pandas Series of marker scores, or, if `calc_stats`
+        is True, pandas DataFrames with columns: 'score', 'auroc' and 'p_value'. These are sorted by scores in
+        descending order.
     """
-
-    @jit(nopython=True)
-    def calc_mean_rank(v):
-        """
-        Calculates the mean rank of the data.
-        """
-        r = np.ones(n_groups)
-        for x in range(n_groups):
-            r[x] = v[int_indices == x].mean()
-        return r / r.sum()
-
-    def mean_rank_wrapper(v):
-        """
-        Wraps `calc_mean_rank` function.
-        """
-        return calc_mean_rank(v.values)
-
     groups = assay.cells.fetch(group_key, cell_key)
     group_set = sorted(set(groups))
     n_groups = len(group_set)
     # Since, numba needs int arrays to work properly but the dtype of 'groups' may not be integer type
     # Hence we need to create a indexed version of 'groups'
     idx_map = dict(zip(group_set, range(n_groups)))
-    rev_idx_map = {v: k for k, v in idx_map.items()}
     int_indices = np.array([idx_map[x] for x in groups])
-    results = {x: [] for x in group_set}
     if use_prenormed:
         if prenormed_store is None:
             if 'prenormed' in assay.z:
@@ -102,40 +155,112 @@ def find_markers_by_rank(
             **norm_params
         )
 
+    feat_ids, mean_ranks, auroc, pvals = [], [], [], []
     for val in batch_iterator:
-        res = val.rank(method="dense").astype(int).apply(mean_rank_wrapper)
-        # Removing genes that were below the threshold in all the groups
-        res = res.T[(res < threshold).sum() != n_groups]
-        for j in res:
-            results[rev_idx_map[j]].append(res[j][res[j] > threshold])
-
-    for i in results:
-        results[i] = pd.concat(results[i]).sort_values(ascending=False)
+        mr, au, pv = calc_rank_stats(
+            np.asfortranarray(val.values), int_indices, n_groups
+        )
+        feat_ids.append(val.columns.values)
+        mean_ranks.append(mr)
+        auroc.append(au)
+        pvals.append(pv)
+    feat_ids = np.hstack(feat_ids)
+    scores = np.vstack(mean_ranks)
+    auroc, pvals = np.vstack(auroc), np.vstack(pvals)
+    # Removing genes that were below the threshold in all the groups
+    valid_feats = (scores < threshold).sum(axis=1) != n_groups
+
+    results = {}
+    for n, i in enumerate(group_set):
+        idx = valid_feats & (scores[:, n] > threshold)
+        res = pd.Series(scores[idx, n], index=feat_ids[idx], name=n)
+        if calc_stats:
+            res = pd.DataFrame(
+                {"score": res, "auroc": auroc[idx, n], "p_value": pvals[idx, n]}
+            ).sort_values(by="score", ascending=False)
+        else:
+            res = res.sort_values(ascending=False)
+        results[i] = res
     return results
 
 
+def calc_pearson_stats(
+    data: np.ndarray, regressors: np.ndarray, min_cells: int
+) -> (np.ndarray, np.ndarray):
+    """
+    Calculates Pearson correlation coefficient, and the corresponding p-value, between each feature (column)
+    in `data` and each of the regressors. The correlations for the whole batch are obtained from a single
+    matrix product against the centred regressors. The values are the same as the `rvalue` and `pvalue`
+    attributes of `scipy.stats.linregress`.
+
+    Args:
+        data: A 2D array of shape (n_cells, n_features)
+        regressors: A 2D array of shape (n_cells, n_regressors)
+        min_cells: Features with non-zero values in fewer than or equal to these many cells are given an
+                   r value of 0 and a p-value of 1.
+
+    Returns:
+        A tuple of two arrays, each of shape (n_features, n_regressors): r values and p-values
+
+    """
+    from scipy.special import stdtr
+
+    tiny = 1.0e-20
+    n = data.shape[0]
+    data = data.astype(np.float64, copy=False)
+    reg_c = regressors - regressors.mean(axis=0)
+    reg_ss = (reg_c**2).mean(axis=0)
+    data_ss = data.var(axis=0)
+    denom = np.sqrt(np.outer(data_ss, reg_ss))
+    valid = denom > 0
+    r = np.zeros(denom.shape)
+    r[valid] = ((data.T @ reg_c) / n)[valid] / denom[valid]
+    r = np.clip(r, -1.0, 1.0)
+    r[(data > 0).sum(axis=0) <= min_cells] = 0
+    df = n - 2
+    t = r * np.sqrt(df / ((1.0 - r + tiny) * (1.0 + r + tiny)))
+    p = 2 * stdtr(df, -np.abs(t))
+    p[r == 0] = 1
+    return r, p
+
+
 def find_markers_by_regression(
     assay: Assay,
     cell_key: str,
-    regressor: np.ndarray,
+    regressor: Union[np.ndarray, pd.DataFrame],
     min_cells: int,
     batch_size: int = 50,
     **norm_params,
 ) -> pd.DataFrame:
     """
+    Calculates the correlation of each feature with one or more regressors (for example, pseudotime).
+    The normalized data is read only once, irrespective of the number of regressors.
 
     Args:
-        assay:
-        cell_key:
-        regressor:
-        min_cells:
-        batch_size:
+        assay: Assay object from which to read the normalized data
+        cell_key: Name of the boolean column in cell metadata table that marks the cells to be used
+        regressor: Values of the regressor for each cell. Either a 1D array or, to test multiple regressors
+                   at once, a 2D array/DataFrame of shape (n_cells, n_regressors).
+        min_cells: Minimum number of cells where a feature should have non-zero value to be considered
+                   for the test.
+        batch_size: Number of features to be loaded in memory at a time.
 
     Returns:
+        A pandas DataFrame with features as index. For a 1D regressor, the columns are 'r_value' and
+        'p_value'. For multiple regressors, the columns are a MultiIndex of (regressor name, 'r_value'/'p_value')
+        where the regressor names are the DataFrame columns or the positional indices.
 
     """
 
-    res = {}
+    if isinstance(regressor, pd.DataFrame):
+        reg_names = list(regressor.columns)
+        regressor = regressor.values
+    else:
+        regressor = np.asarray(regressor)
+        reg_names = None if regressor.ndim == 1 else list(range(regressor.shape[1]))
+    regressor = regressor.reshape(regressor.shape[0], -1).astype(np.float64)
+
+    feat_ids, r_values, p_values = [], [], []
     for df in assay.iter_normed_feature_wise(
         cell_key,
         "I",
@@ -143,15 +268,22 @@ def find_markers_by_regression(
         "Finding correlated features",
         **norm_params,
     ):
-        for i in df:
-            v = df[i].values
-            if (v > 0).sum() > min_cells:
-                lin_obj = linregress(regressor, v)
-                res[i] = (lin_obj.rvalue, lin_obj.pvalue)
-            else:
-                res[i] = (0, 1)
-    res = pd.DataFrame(res, index=["r_value", "p_value"]).T
-    return res
+        r, p = calc_pearson_stats(df.values, regressor, min_cells)
+        feat_ids.append(df.columns.values)
+        r_values.append(r)
+        p_values.append(p)
+    feat_ids = np.hstack(feat_ids)
+    r_values, p_values = np.vstack(r_values), np.vstack(p_values)
+
+    if reg_names is None:
+        return pd.DataFrame(
+            {"r_value": r_values[:, 0], "p_value": p_values[:, 0]}, index=feat_ids
+        )
+    res = {}
+    for n, i in enumerate(reg_names):
+        res[(i, "r_value")] = r_values[:, n]
+        res[(i, "p_value")] = p_values[:, n]
+    return pd.DataFrame(res, index=feat_ids)
 
 
 def knn_clustering(
@@ -14,7 +14,7 @@ import logging
 from typing import Tuple, List
 import pandas as pd
 import numpy as np
-from .writers import create_zarr_count_assay
+from .writers import create_zarr_count_assay, ChunkedCountsWriter
 from .utils import controlled_compute, logger, tqdmbar
 import gzip
 from numba import jit
@@ -419,6 +419,7 @@ def create_counts_mat(
     """
 
     from sparse import COO
+    from scipy.sparse import csr_matrix
 
     idx = np.where(cross_map)[0]
     feat_idx = np.repeat(idx, list(map(len, cross_map[idx])))
@@ -432,27 +433,31 @@ def create_counts_mat(
     n_docs_per_term = assay.feats.fetch_all("nCells")
 
     s = 0
-    for a in tqdmbar(assay.rawData.blocks, total=assay.rawData.numblocks[0]):
-
-        a = controlled_compute(a, assay.nthreads)
-        tf = a / n_term_per_doc[s : s + a.shape[0]].reshape(-1, 1)
-        idf = np.log2(1 + (n_docs / (n_docs_per_term + 1)))
-        a = tf * idf
-
-        df = pd.DataFrame(a[:, peak_idx]).T
-        df["fidx"] = feat_idx
-        df = df.groupby("fidx").sum().T
-        if renormalization:
-            df = (scalar_coeff * df) / df.sum(axis=1).values.reshape(-1, 1)
-        assert df.shape[1] == idx.shape[0]
-
-        coord_renamer = dict(enumerate(df.columns))
-        coo = COO(df.values)
-        coo.coords[1] = np.array([coord_renamer[x] for x in coo.coords[1]])
-        coo.shape = (coo.shape[0], store.shape[1])
-
-        store.set_coordinate_selection((s + coo.coords[0], coo.coords[1]), coo.data)
-        s += a.shape[0]
+    with ChunkedCountsWriter(store, assay.nthreads) as writer:
+        for a in tqdmbar(assay.rawData.blocks, total=assay.rawData.numblocks[0]):
+
+            a = controlled_compute(a, assay.nthreads)
+            tf = a / n_term_per_doc[s : s + a.shape[0]].reshape(-1, 1)
+            idf = np.log2(1 + (n_docs / (n_docs_per_term + 1)))
+            a = tf * idf
+
+            df = pd.DataFrame(a[:, peak_idx]).T
+            df["fidx"] = feat_idx
+            df = df.groupby("fidx").sum().T
+            if renormalization:
+                df = (scalar_coeff * df) / df.sum(axis=1).values.reshape(-1, 1)
+            assert df.shape[1] == idx.shape[0]
+
+            coord_renamer = dict(enumerate(df.columns))
+            coo = COO(df.values)
+            coo.coords[1] = np.array([coord_renamer[x] for x in coo.coords[1]])
+            writer.write(
+                csr_matrix(
+                    (coo.data, (coo.coords[0], coo.coords[1])),
+                    shape=(coo.shape[0], store.shape[1]),
+                )
+            )
+            s += a.shape[0]
 
 
 def coordinate_melding(
@@ -6,6 +6,7 @@ from zarr import array as zarr_array
 import numpy as np
 import re
 import pandas as pd
+from collections import OrderedDict
 from typing import List, Iterable, Any, Dict, Tuple
 from .feat_utils import fit_lowess
 from .writers import create_zarr_obj_array
@@ -33,22 +34,72 @@ class MetaData:
     MetaData class for cells and features.
 
     This class provides an interface to perform CRUD operations on metadata, saved in the Zarr hierarchy.
-    All the changes at the metadata are synchronized on disk.
+    All the changes at the metadata are synchronized on disk. Recently used columns are also kept in
+    memory, so that they need not be read and decompressed from the disk every time. Hence, the metadata
+    arrays should only be modified through this class.
 
     Attributes:
         locations: The locations for where the metadata is stored.
         N: The size of the primary data.
         index: A numpy array with the indices of the cells/features.
+        cacheMaxMem: Maximum memory (in bytes) used by the cached columns. Least recently used
+                     columns are evicted from the cache when this limit is exceeded.
     """
 
-    def __init__(self, zgrp: zarr_hierarchy):
+    def __init__(self, zgrp: zarr_hierarchy, max_cache_mem: float = 256):
         """
         Args:
             zgrp: Zarr hierarchy object wherein metadata arrays are saved.
+            max_cache_mem: Maximum memory (in MB) used for caching column values. Set to 0 to
+                           disable the cache. (Default value: 256)
         """
         self.locations: Dict[str, zarr_hierarchy] = {"primary": zgrp}
         self.N = self._get_size(self.locations["primary"], strict_mode=True)
         self.index = np.array(range(self.N))
+        self.cacheMaxMem = int(max_cache_mem * 1024**2)
+        self._colMap = None
+        self._arrays: Dict[str, zarr_array] = {}
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cacheMem = 0
+
+    def _invalidate(self) -> None:
+        """
+        Clears the cached column map and cached column values. Called whenever
+        columns or locations are added or removed.
+
+        Returns:
+            None
+        """
+        self._colMap = None
+        self._arrays = {}
+        self._cache.clear()
+        self._cacheMem = 0
+
+    def _cache_get(self, column: str):
+        """
+        Returns cached values of a column (marking it as recently used) or None if the
+        column is not in cache.
+        """
+        if column not in self._cache:
+            return None
+        self._cache.move_to_end(column)
+        return self._cache[column]
+
+    def _cache_set(self, column: str, values: np.ndarray) -> None:
+        """
+        Adds values of a column to the cache and evicts least recently used columns
+        if the cache is above its memory limit. Columns larger than the limit are not cached.
+        """
+        if column in self._cache:
+            self._cacheMem -= self._cache.pop(column).nbytes
+        if values.nbytes > self.cacheMaxMem:
+            return None
+        self._cache[column] = values
+        self._cacheMem += values.nbytes
+        while self._cacheMem > self.cacheMaxMem:
+            _, v = self._cache.popitem(last=False)
+            self._cacheMem -= v.nbytes
+        return None
 
     def _get_size(self, zgrp: zarr_hierarchy, strict_mode: bool = False) -> int:
         """
@@ -96,6 +147,8 @@ class MetaData:
         Returns:
 
         """
+        if self._colMap is not None:
+            return self._colMap
         reserved_cols = ["I", "ids", "names"]
         col_map = {x: "primary" for x in reserved_cols}
         for loc, zgrp in self.locations.items():
@@ -107,6 +160,7 @@ class MetaData:
                         f"upstream. This is quite unexpected. Please report this issue."
                     )
                 col_map[j] = (loc, i)
+        self._colMap = col_map
         return col_map
 
     def _get_loc(self, column: str) -> Tuple[str, str]:
@@ -133,8 +187,10 @@ class MetaData:
         Returns:
 
         """
-        loc, col = self._get_loc(column)
-        return self.locations[loc][col]
+        if column not in self._arrays:
+            loc, col = self._get_loc(column)
+            self._arrays[column] = self.locations[loc][col]
+        return self._arrays[column]
 
     def get_dtype(self, column: str) -> type:
         """
@@ -191,6 +247,7 @@ class MetaData:
                 f"Please try with a different identifier value."
             )
         self.locations[identifier] = zgrp
+        self._invalidate()
 
     def unmount_location(self, identifier: str) -> None:
         """
@@ -207,6 +264,7 @@ class MetaData:
             logger.warning(f"{identifier} is not mounted. Nothing to unmount")
             return None
         self.locations.pop(identifier)
+        self._invalidate()
 
     @property
     def columns(self) -> List[str]:
@@ -217,6 +275,23 @@ class MetaData:
         """
         return list(self._column_map().keys())
 
+    def _fetch_cached(self, column: str) -> np.ndarray:
+        """
+        Returns values of the column from the cache, reading it from the disk if required.
+        The returned array must not be modified in place.
+
+        Args:
+            column:
+
+        Returns:
+
+        """
+        values = self._cache_get(column)
+        if values is None:
+            values = self._get_array(column)[:]
+            self._cache_set(column, values)
+        return values
+
     def fetch_all(self, column: str) -> np.ndarray:
         """
 
@@ -226,7 +301,7 @@ class MetaData:
         Returns:
 
         """
-        return self._get_array(column)[:]
+        return self._fetch_cached(column).copy()
 
     def active_index(self, key: str) -> np.ndarray:
         """
@@ -238,7 +313,7 @@ class MetaData:
 
         """
         if self._verify_bool(key):
-            return self.index[self.fetch_all(key)]
+            return self.index[self._fetch_cached(key)]
         else:
             raise ValueError(
                 "ERROR: Unexpected error when verifying boolean key. Please report this issue"
@@ -256,7 +331,7 @@ class MetaData:
 
         """
 
-        return self.fetch_all(column)[self.active_index(key)]
+        return self._fetch_cached(column)[self.active_index(key)]
 
     def _save(
         self, column_name: str, values: np.ndarray, location: str = "primary"
@@ -278,9 +353,15 @@ class MetaData:
             raise ValueError(
                 f"ERROR: Values are of shape: {values.shape}. Expected shape is: ({self.N},)"
             )
-        create_zarr_obj_array(
+        zarr_arr = create_zarr_obj_array(
             self.locations[location], column_name, values, values.dtype
         )
+        col = self._col_renamer(location, column_name)
+        if self._colMap is None or col not in self._colMap:
+            # A new column, hence the column map needs to be rebuilt
+            self._invalidate()
+        self._arrays[col] = zarr_arr
+        self._cache_set(col, np.asarray(values).astype(zarr_arr.dtype))
         return None
 
     def _fill_to_index(self, values: np.array, fill_value, key: str) -> np.ndarray:
@@ -395,23 +476,77 @@ class MetaData:
         Returns:
             None
         """
-        col = self._col_renamer(location, column_name)
-        if col in ["I", "ids"] and force is False:
-            raise ValueError(
-                f"ERROR: {col} is a protected column name in MetaData class."
-            )
-        if col in self.columns and overwrite is False:
-            raise ValueError(
-                f"ERROR: {col} already exists. Please set `overwrite` to True to overwrite."
-            )
-        if type(values) == list:
-            logger.warning(
-                "'values' parameter is of `list` type and not `np.ndarray` as expected. The correct dtype "
-                "may not be assigned to the column"
+        self.insert_many(
+            {column_name: values},
+            fill_value=fill_value,
+            key=key,
+            overwrite=overwrite,
+            location=location,
+            force=force,
+        )
+        return None
+
+    def insert_many(
+        self,
+        columns: Dict[str, np.ndarray],
+        fill_value: Any = np.NaN,
+        key: str = "I",
+        overwrite: bool = False,
+        location: str = "primary",
+        force: bool = False,
+    ) -> None:
+        """
+        Insert multiple columns into the table in one call. All the columns are validated
+        before any of them is written and the column map is rebuilt at most once.
+
+        Args:
+            columns (Dict[str, np.ndarray]): A mapping of column names to the values the column should contain.
+            fill_value (Any = np.NaN): Value to fill unassigned slots with.
+            key (str = 'I'):
+            overwrite (bool = False): Should function overwrite columns if they already exist?
+            location (str = 'primary'):
+            force (bool = False): Enforce change to columns, even if column is a protected column name ('I' or 'ids').
+
+        Returns:
+            None
+        """
+        if location not in self.locations:
+            raise KeyError(
+                f"ERROR: '{location}' has not been mounted. Save data request failed!"
             )
-            values = np.array(values)
-        v = self._fill_to_index(values, fill_value, key)
-        self._save(column_name, v.astype(values.dtype), location=location)
+        filled = {}
+        for column_name, values in columns.items():
+            col = self._col_renamer(location, column_name)
+            if col in ["I", "ids"] and force is False:
+                raise ValueError(
+                    f"ERROR: {col} is a protected column name in MetaData class."
+                )
+            if col in self.columns and overwrite is False:
+                raise ValueError(
+                    f"ERROR: {col} already exists. Please set `overwrite` to True to overwrite."
+                )
+            if type(values) == list:
+                logger.warning(
+                    "'values' parameter is of `list` type and not `np.ndarray` as expected. The correct dtype "
+                    "may not be assigned to the column"
+                )
+                values = np.array(values)
+            v = self._fill_to_index(values, fill_value, key).astype(values.dtype)
+            if v.shape != (self.N,):
+                raise ValueError(
+                    f"ERROR: Values are of shape: {v.shape}. Expected shape is: ({self.N},)"
+                )
+            filled[col] = (column_name, v)
+        arrays = {
+            col: create_zarr_obj_array(self.locations[location], name, v, v.dtype)
+            for col, (name, v) in filled.items()
+        }
+        if self._colMap is None or any(col not in self._colMap for col in arrays):
+            # New columns, hence the column map needs to be rebuilt
+            self._invalidate()
+        for col, (_, v) in filled.items():
+            self._arrays[col] = arrays[col]
+            self._cache_set(col, v.astype(arrays[col].dtype))
         return None
 
     def update_key(self, values: np.array, key) -> None:
@@ -459,6 +594,7 @@ class MetaData:
         # noinspection PyUnusedLocal
         loc, col = self._get_loc(column)
         del self.locations[loc][col]
+        self._invalidate()
         return None
 
     def sift(
@@ -19,7 +19,7 @@ import os
 import sparse
 from typing import IO
 import h5py
-from .utils import logger, tqdmbar
+from .utils import logger, tqdmbar, prefetch_iter
 
 __all__ = [
     "CrH5Reader",
@@ -61,6 +61,104 @@ def read_file(fn: str):
         yield line.rstrip()
 
 
+def _is_bgzf(fn: str) -> bool:
+    """
+    Checks whether a file is compressed in the BGZF format, i.e. as a series of independent gzip members that
+    each carry their compressed size in the 'BC' extra subfield.
+    """
+    with open(fn, "rb") as fh:
+        header = fh.read(18)
+    return (
+        len(header) == 18 and header[:4] == b"\x1f\x8b\x08\x04" and header[12:14] == b"BC"
+    )
+
+
+def _iter_bgzf_chunks(fn: str, chunk_size: int, pool) -> Generator[bytes, None, None]:
+    """
+    Yields the decompressed content of a BGZF file. Compressed members are decompressed in parallel on `pool`.
+    """
+    import struct
+    import zlib
+
+    def _inflate(member: bytes) -> bytes:
+        return zlib.decompress(member, 31)
+
+    buf = b""
+    with open(fn, "rb") as fh:
+        while True:
+            data = fh.read(chunk_size)
+            buf += data
+            members, pos = [], 0
+            while pos + 18 <= len(buf):
+                size = struct.unpack("<H", buf[pos + 16 : pos + 18])[0] + 1
+                if pos + size > len(buf):
+                    break
+                members.append(buf[pos : pos + size])
+                pos += size
+            buf = buf[pos:]
+            if len(members) > 0:
+                yield b"".join(pool.map(_inflate, members))
+            if not data:
+                break
+    if len(buf) > 0:
+        raise IOError(f"ERROR: {fn} seems to be a truncated BGZF file")
+
+
+def _iter_mtx_chunks(
+    fn: str, chunk_size: int, pool
+) -> Generator[bytes, None, None]:
+    """
+    Yields the entries of an MTX file as chunks of bytes. Each chunk contains only complete lines and the header
+    (comment lines and the line with dimensions) is skipped. Gzip compressed files are supported; BGZF compressed
+    files are decompressed in parallel.
+    """
+    import gzip
+
+    if fn.rsplit(".", 1)[-1] != "gz":
+        fh = open(fn, "rb")
+        chunks = iter(lambda: fh.read(chunk_size), b"")
+    elif _is_bgzf(fn):
+        fh = None
+        chunks = _iter_bgzf_chunks(fn, chunk_size, pool)
+    else:
+        fh = gzip.open(fn, "rb")
+        chunks = iter(lambda: fh.read(chunk_size), b"")
+
+    in_header, rest = True, b""
+    try:
+        for chunk in chunks:
+            rest += chunk
+            if in_header:
+                while in_header:
+                    pos = rest.find(b"\n")
+                    if pos == -1:
+                        break
+                    # The first line that is not a comment contains the dimensions
+                    in_header = rest.startswith(b"%")
+                    rest = rest[pos + 1 :]
+                if in_header:
+                    continue
+            pos = rest.rfind(b"\n")
+            if pos == -1:
+                continue
+            yield rest[: pos + 1]
+            rest = rest[pos + 1 :]
+    finally:
+        if fh is not None:
+            fh.close()
+    if len(rest.strip()) > 0:
+        yield rest
+
+
+def _parse_mtx_chunk(chunk: bytes, sep: str) -> np.ndarray:
+    """
+    Parses a chunk of MTX entries into a 2D array with feature index, cell index and value columns.
+    """
+    from io import BytesIO
+
+    return pd.read_csv(BytesIO(chunk), sep=sep, header=None).values
+
+
 class CrReader(ABC):
     """
     A class to read in CellRanger (Cr) data.
@@ -283,12 +381,15 @@ class CrDirReader(CrReader):
         file_type (str): [DEPRECATED] Type of sequencing data ('rna' | 'atac')
         mtx_separator (str): Column delimiter in the MTX file (Default value: ' ')
         index_offset (int): This value is added to each feature index (Default value: -1)
+        nthreads (int): Number of threads used to parse (and, for BGZF compressed files, decompress) the MTX file
+                        (Default value: 2)
 
     Attributes:
         loc: Path for the directory containing the cellranger output.
         matFn: The file name for the matrix file.
         mtx_separator (str): Column delimiter in the MTX file (Default value: ' ')
         index_offset (int): This value is added to each feature index (Default value: -1)
+        nthreads: Number of threads used to parse the MTX file
     """
 
     def __init__(
@@ -297,11 +398,13 @@ class CrDirReader(CrReader):
         file_type: str = None,
         mtx_separator: str = " ",
         index_offset: int = -1,
+        nthreads: int = 2,
     ):
         self.loc: str = loc.rstrip("/") + "/"
         self.matFn = None
         self.sep = mtx_separator
         self.indexOffset = index_offset
+        self.nthreads = nthreads
         super().__init__(self._handle_version())
 
     def _handle_version(self):
@@ -379,25 +482,51 @@ class CrDirReader(CrReader):
             shape=(len(idx) + 1, self.nFeatures),
         )
 
+    def iter_mtx(self, lines_in_mem: int = int(1e5)) -> Generator[np.ndarray, None, None]:
+        """
+        Reads the MTX file and yields its entries, in order, as 2D arrays with feature index, cell index and value
+        columns. The file is cut into chunks of roughly `lines_in_mem` lines that are parsed in parallel. Parsed
+        chunks wait in a bounded queue, so at most a few chunks are held in memory ahead of the caller.
+
+        Args:
+            lines_in_mem: Approximate number of lines in each chunk (Default value: 100000)
+
+        Returns:
+            A generator of 2D arrays
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Entries in 10x MTX files are typically shorter than 16 bytes
+        chunk_size = max(1 << 16, lines_in_mem * 16)
+        nthreads = max(1, self.nthreads)
+        with ThreadPoolExecutor(max_workers=nthreads) as pool:
+            futures = (
+                pool.submit(_parse_mtx_chunk, x, self.sep)
+                for x in _iter_mtx_chunks(self.matFn, chunk_size, pool)
+            )
+            for f in prefetch_iter(futures, depth=2 * nthreads):
+                yield f.result()
+
     # noinspection DuplicatedCode
     def consume(
         self, batch_size: int, lines_in_mem: int = int(1e5)
     ) -> Generator[List[np.ndarray], None, None]:
-        stream = pd.read_csv(
-            self.matFn, skiprows=3, sep=self.sep, header=None, chunksize=lines_in_mem
-        )
         start = 1
-        dfs = []
-        for df in stream:
-            if df.iloc[-1, 1] - start >= batch_size:
-                idx = df[1] < batch_size + start
-                dfs.append(df[idx])
-                yield self.to_sparse(np.vstack(dfs))
-                dfs = [df[~idx]]
+        arrs = []
+        for a in self.iter_mtx(lines_in_mem):
+            while len(a) > 0 and a[-1, 1] - start >= batch_size:
+                idx = a[:, 1] < batch_size + start
+                arrs.append(a[idx])
+                a = a[~idx]
                 start += batch_size
-            else:
-                dfs.append(df)
-        yield self.to_sparse(np.vstack(dfs))
+                arrs = [x for x in arrs if len(x) > 0]
+                if len(arrs) > 0:
+                    yield self.to_sparse(np.vstack(arrs))
+                arrs = []
+            arrs.append(a)
+        arrs = [x for x in arrs if len(x) > 0]
+        if len(arrs) > 0:
+            yield self.to_sparse(np.vstack(arrs))
 
 
 class H5adReader:
@@ -22,6 +22,21 @@ class TestToyDataStore:
         )
         assert np.alltrue(toy_crdir_ds.HTO.rawData.compute() == [[200], [100], [100]])
 
+    def test_toy_crdir_feature_major_counts(self, toy_crdir_ds):
+        assay = toy_crdir_ds.ADT
+        exp = [x.values for x in assay.iter_normed_feature_wise(None, None, 1, None)]
+        toy_crdir_ds.make_feature_major_counts(from_assay="ADT", feat_chunk_size=1)
+        assert np.array_equal(assay.z["counts_fm"][:], [[30, 30, 0], [40, 50, 50]])
+        res = [x.values for x in assay.iter_normed_feature_wise(None, None, 1, None)]
+        assert all(np.allclose(x, y) for x, y in zip(exp, res))
+        assert assay._load_feature_major_counts() is not None
+        # The copy is not used once the counts have been rewritten, even with the same shape
+        from ..writers import ChunkedCountsWriter
+
+        with ChunkedCountsWriter(assay.z["counts"]) as writer:
+            writer.write(assay.rawData.compute())
+        assert assay._load_feature_major_counts() is None
+
 
 class TestDataStore:
     def test_graph_indices(self, make_graph, datastore):
@@ -36,7 +51,7 @@ class TestDataStore:
 
     def test_graph_weights(self, make_graph, datastore):
         a = np.load(full_path("knn_weights.npy"))
-        b = datastore.z[make_graph]["graph__1.0__1.5"]["weights"][:]
+        b = datastore.z[make_graph]["graph__1.0__1.5"]["weights"][:].ravel()
         assert np.alltrue((a - b) < 1e-5)
 
     def test_atac_graph_indices(self, make_atac_graph, atac_datastore):
@@ -62,6 +77,13 @@ class TestDataStore:
         # Disabled the following test because failing on CI
         # assert np.array_equal(leiden_clustering, cell_attrs['RNA_leiden_cluster'].values)
 
+    def test_leiden_resolutions(self, leiden_clustering, datastore):
+        datastore.run_leiden_clustering(label="lc", resolutions=[0.5, 1.0])
+        assert np.array_equal(
+            datastore.cells.fetch("RNA_lc_1.0"), datastore.cells.fetch("RNA_leiden_cluster")
+        )
+        assert len(set(datastore.cells.fetch("RNA_lc_0.5"))) < len(set(leiden_clustering))
+
     def test_paris_values(self, paris_clustering, cell_attrs):
         assert np.array_equal(paris_clustering, cell_attrs["RNA_cluster"].values)
 
@@ -75,6 +97,17 @@ class TestDataStore:
             cell_cycle_scoring, cell_attrs["RNA_cell_cycle_phase"].values
         )
 
+    def test_run_feature_set_scoring(self, cell_cycle_scoring, datastore):
+        from ..bio_data import s_phase_genes, g2m_phase_genes
+
+        datastore.run_feature_set_scoring(
+            feature_sets={"S_set": s_phase_genes, "G2M_set": g2m_phase_genes}
+        )
+        for i, j in [("S_set", "S_score"), ("G2M_set", "G2M_score")]:
+            assert np.allclose(
+                datastore.cells.fetch(f"RNA_{i}"), datastore.cells.fetch(f"RNA_{j}")
+            )
+
     def test_umap_values(self, umap, cell_attrs):
         precalc_umap = cell_attrs[["RNA_UMAP1", "RNA_UMAP2"]].values
         assert umap.shape == precalc_umap.shape
@@ -96,6 +129,15 @@ class TestDataStore:
         assert markers.equals(precalc_markers)
         remove(out_file)
 
+    def test_get_markers_with_stats(self, marker_search, paris_clustering, datastore):
+        exp_markers = datastore.get_markers(group_key="RNA_cluster", group_id=1)
+        datastore.run_marker_search(group_key="RNA_cluster", calc_stats=True)
+        markers = datastore.get_markers(group_key="RNA_cluster", group_id=1)
+        assert markers.names.equals(exp_markers.names)
+        assert markers.score.equals(exp_markers.score)
+        assert np.all((markers.auroc > 0.5) & (markers.auroc <= 1))
+        assert np.all((markers.p_value >= 0) & (markers.p_value <= 1))
+
     def test_run_unified_umap(self, run_unified_umap, datastore):
         coords = datastore.z["RNA"].projections["unified_UMAP"][:]
         precalc_coords = np.load(full_path("unified_UMAP_coords.npy"))
@@ -126,6 +168,34 @@ class TestDataStore:
         # TODO: Test the output values
         values = datastore.get_imputed(feature_name="CD4")
         assert values.shape == datastore.cells.fetch("I").shape
+        magic_keys = lambda: [k for k in datastore._cache._items if "/magic_" in k[0]]
+        assert len(magic_keys()) == 1
+        # The operator cached by the earlier call is freed when `cache_operator` is False
+        uncached = datastore.get_imputed(feature_name="CD4", cache_operator=False)
+        assert len(magic_keys()) == 0
+        assert np.allclose(values, uncached)
+
+    def test_load_graph_cached(self, make_graph, datastore):
+        kwargs = dict(from_assay="RNA", cell_key="I", feat_key="hvgs", symmetric=True)
+        a = datastore.load_graph(**kwargs)
+        # Modifying the returned graph must not affect the cached graph
+        a.data[:] = 0
+        b = datastore.load_graph(**kwargs)
+        datastore._cache.invalidate()
+        c = datastore.load_graph(**kwargs)
+        assert b.nnz == c.nnz and (b != c).nnz == 0
+
+    def test_close_keeps_shared_pools(self, datastore):
+        from ..utils import controlled_compute, _thread_pools
+        import dask.array as daskarr
+
+        controlled_compute(daskarr.ones(10, chunks=5).sum(), datastore.nthreads)
+        pool = _thread_pools[datastore.nthreads]
+        with datastore:
+            pass
+        # The pools are shared with other DataStores and must outlive the `with` block
+        assert _thread_pools[datastore.nthreads] is pool
+        assert controlled_compute(daskarr.ones(10, chunks=5).sum(), datastore.nthreads) == 10
 
     def test_run_pseudotime_scoring(self, pseudotime_scoring, cell_attrs):
         diff = pseudotime_scoring - cell_attrs["RNA_pseudotime"].values
@@ -168,6 +238,16 @@ class TestDataStore:
         df = datastore.make_bulk(group_key="RNA_cluster")
         assert df.shape == (18850, 31)
 
+    def test_aggregate(self, paris_clustering, datastore):
+        dfs = datastore.aggregate(group_key="RNA_cluster", stats=["sum", "nnz", "var"])
+        groups = datastore.cells.fetch("RNA_cluster")
+        idx = datastore.cells.active_index("I")[groups == 1]
+        counts = datastore.RNA.rawData[idx].compute()
+        assert dfs["sum"].shape == (datastore.RNA.feats.N, len(set(groups)))
+        assert np.array_equal(dfs["sum"][1].values, counts.sum(axis=0))
+        assert np.array_equal(dfs["nnz"][1].values, (counts > 0).sum(axis=0))
+        assert np.allclose(dfs["var"][1].values, counts.var(axis=0))
+
     def test_to_anndata(self, datastore):
         # TODO: Check if all the attributes copied to anndata
         datastore.to_anndata()
@@ -36,3 +36,39 @@ def test_metadata_verify_bool(dummy_metadata):
 def test_metadata_active_index(dummy_metadata):
     a = np.array([0, 1, 2, 3, 6, 7, 8])
     assert np.all(dummy_metadata.active_index(key="I") == a)
+
+
+def test_metadata_cache(dummy_metadata):
+    dummy_metadata.insert("vals", np.arange(7), key="I", fill_value=-1)
+    assert dummy_metadata._cache_get("vals") is not None
+    v = dummy_metadata.fetch_all("vals")
+    v[:] = 100  # returned values should not alter the cache
+    assert np.array_equal(dummy_metadata.fetch_all("vals"), [0, 1, 2, 3, -1, -1, 4, 5, 6])
+    dummy_metadata.insert("vals", np.arange(9) * 2, overwrite=True)
+    assert np.array_equal(dummy_metadata.fetch("vals"), [0, 2, 4, 6, 12, 14, 16])
+    dummy_metadata.drop("vals")
+    assert "vals" not in dummy_metadata.columns
+    # Columns bigger than the limit are not cached
+    dummy_metadata.cacheMaxMem = 10
+    dummy_metadata.insert("big", np.arange(9, dtype=float))
+    assert dummy_metadata._cache_get("big") is None
+    assert dummy_metadata._cacheMem <= 10
+    assert np.array_equal(dummy_metadata.fetch_all("big"), np.arange(9))
+
+
+def test_metadata_insert_many(dummy_metadata):
+    dummy_metadata.insert_many(
+        {"a": np.arange(7), "b": np.arange(7) * 2}, key="I", fill_value=-1
+    )
+    assert np.array_equal(dummy_metadata.fetch_all("a"), [0, 1, 2, 3, -1, -1, 4, 5, 6])
+    assert np.array_equal(dummy_metadata.fetch("b"), np.arange(7) * 2)
+    # No column is written if any of them is invalid
+    with pytest.raises(ValueError):
+        dummy_metadata.insert_many(
+            {"c": np.arange(7), "a": np.arange(7)}, key="I", fill_value=-1
+        )
+    assert "c" not in dummy_metadata.columns
+    # Overwriting an existing column does not clear the cache of other columns
+    dummy_metadata.insert("a", np.arange(9), overwrite=True)
+    assert dummy_metadata._cache_get("b") is not None
+    assert np.array_equal(dummy_metadata.fetch_all("a"), np.arange(9))
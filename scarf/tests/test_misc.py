@@ -12,6 +12,289 @@ def test_export_knn_to_mtx(datastore, make_graph):
         upper_only=False,
     )
     fn = full_path("test_export_mtx_from_graph.mtx")
-    ret_val = export_knn_to_mtx(fn, graph)
+    ret_val = export_knn_to_mtx(fn, graph, batch_size=7)
     assert ret_val is None
+    from scipy.io import mmread
+
+    assert (mmread(fn).tocsr() != graph).nnz == 0
     remove(fn)
+
+
+def test_calc_summary_stats():
+    from ..utils import calc_summary_stats, controlled_compute
+    import dask.array as daskarr
+    import numpy as np
+    import sparse
+
+    a = np.random.default_rng(0).poisson(0.5, size=(1005, 47)).astype("uint32")
+    for d in [
+        daskarr.from_array(a, chunks=(100, 20)),
+        daskarr.from_array(sparse.COO.from_numpy(a), chunks=(100, 47), asarray=False),
+    ]:
+        for axis in [0, 1]:
+            stats = controlled_compute(calc_summary_stats(d, axis=axis), 2)
+            assert np.allclose(stats["total"], a.sum(axis=axis))
+            assert np.allclose(stats["m2"] / stats["n"], a.var(axis=axis))
+            assert np.array_equal(stats["nnz"], (a > 0).sum(axis=axis))
+    # Sum of squared deviations of constant columns must not be negative
+    c = np.repeat(np.linspace(0.1, 100, 2000).reshape(1, -1), 37, axis=0)
+    stats = controlled_compute(calc_summary_stats(daskarr.from_array(c), axis=0), 2)
+    assert np.all(stats["m2"] >= 0)
+    # Large offsets relative to the spread must not cost precision
+    b = 1e6 + np.random.default_rng(1).random((1005, 3)) * 1e-3
+    b[:500, 2] = 0
+    for d in [
+        daskarr.from_array(b, chunks=(100, 3)),
+        daskarr.from_array(sparse.COO.from_numpy(b), chunks=(100, 3), asarray=False),
+    ]:
+        stats = controlled_compute(calc_summary_stats(d, axis=0), 2)
+        assert np.allclose(
+            stats["m2"] / stats["n"], np.var(b, axis=0), rtol=1e-4, atol=0
+        )
+
+
+def test_segmented_aggregate():
+    from ..utils import segmented_aggregate
+    import dask.array as daskarr
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    # Large offset relative to the spread, to check the precision of the variance
+    a = 1e6 + rng.random((105, 12)) * 1e-3
+    arr = daskarr.from_array(a, chunks=(20, 12))
+    for axis in (0, 1):
+        groups = rng.permutation(np.arange(a.shape[axis]) % 4 - 1)
+        res = segmented_aggregate(arr, groups, 3, axis, 1)
+        blocks = []
+        ret_val = segmented_aggregate(
+            arr,
+            groups,
+            3,
+            axis,
+            1,
+            block_callback=lambda s, e, b: blocks.append((s, e, b)),
+        )
+        if axis == 1:
+            assert ret_val is None
+            assert [(s, e) for s, e, _ in blocks] == [
+                (i, min(i + 20, 105)) for i in range(0, 105, 20)
+            ]
+            assert np.array_equal(np.vstack([b for _, _, b in blocks]), res)
+        for g in range(3):
+            v = a[groups == g] if axis == 0 else a[:, groups == g]
+            stats = res[g] if axis == 0 else res[:, g]
+            assert np.allclose(stats["total"], v.sum(axis=axis))
+            assert np.allclose(
+                stats["m2"] / stats["n"], v.var(axis=axis), rtol=1e-4, atol=0
+            )
+
+
+def test_controlled_compute_reuses_pool():
+    from ..utils import controlled_compute, close_thread_pools, _thread_pools
+    import dask.array as daskarr
+    import numpy as np
+
+    arr = daskarr.from_array(np.arange(100).reshape(10, 10), chunks=(3, 10))
+    assert controlled_compute(arr.sum(), 2) == 4950
+    pool = _thread_pools[2]
+    res = controlled_compute([arr.sum(axis=0), arr.sum(axis=1)], 2)
+    assert _thread_pools[2] is pool
+    assert np.array_equal(res[1], np.arange(100).reshape(10, 10).sum(axis=1))
+    close_thread_pools()
+    assert len(_thread_pools) == 0
+
+
+def test_prefetch_blocks():
+    from ..utils import prefetch_blocks
+    import dask.array as daskarr
+    import numpy as np
+
+    a = np.random.default_rng(0).random((103, 7))
+    arr = daskarr.from_array(a, chunks=(10, 7))
+    for depth in (0, 1, 3):
+        res = np.vstack(list(prefetch_blocks(arr, 2, depth=depth)))
+        assert np.array_equal(res, a)
+    # Stopping early should not hang the background thread
+    for n, i in enumerate(prefetch_blocks(arr, 2, depth=2)):
+        if n == 1:
+            break
+    assert np.array_equal(i, a[10:20])
+
+
+def test_ann_stream_randomized_pca():
+    from ..ann import AnnStream
+    import dask.array as daskarr
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    a = rng.standard_normal((500, 6)).dot(rng.standard_normal((6, 40)) * 3)
+    a += rng.standard_normal(a.shape) * 0.1
+    mu, sigma = a.mean(axis=0), a.std(axis=0)
+    ann_obj = AnnStream(
+        data=daskarr.from_array(a, chunks=(100, 40)),
+        k=5,
+        n_cluster=5,
+        reduction_method="pca_randomized",
+        dims=5,
+        loadings=None,
+        use_for_pca=np.ones(500, dtype=bool),
+        mu=mu,
+        sigma=sigma,
+        ann_metric="l2",
+        ann_efc=50,
+        ann_ef=50,
+        ann_m=16,
+        nthreads=1,
+        ann_parallel=False,
+        rand_state=4466,
+        do_kmeans_fit=False,
+        disable_scaling=False,
+        ann_idx=None,
+        lsi_skip_first=False,
+        lsi_params={},
+    )
+    z = (a - mu) / sigma
+    exact = np.linalg.svd(z - z.mean(axis=0), full_matrices=False)[2][:5].T
+    assert ann_obj.loadings.shape == (40, 5)
+    assert np.allclose(np.abs((exact * ann_obj.loadings).sum(axis=0)), 1)
+
+
+def test_fix_knn_query():
+    from ..ann import fix_knn_query
+    import numpy as np
+
+    indices = np.array([[0, 5, 6, 7], [9, 8, 1, 4], [3, 8, 9, 4], [2, 6, 3, 4]])
+    distances = np.arange(16).reshape(4, 4) / 10
+    ind, dist, n_mis = fix_knn_query(indices, distances, np.arange(4))
+    assert n_mis == 3
+    assert np.array_equal(ind, [[5, 6, 7], [9, 8, 4], [3, 8, 9], [2, 6, 4]])
+    assert np.allclose(dist, [[0.1, 0.2, 0.3], [0.4, 0.5, 0.7], [0.8, 0.9, 1.0], [1.2, 1.3, 1.5]])
+
+
+def test_merge_graphs():
+    from ..knn_utils import merge_graphs, calc_snn
+    from scipy.sparse import csr_matrix
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    n, k = 50, 5
+    idx = np.array([rng.choice(n, k, replace=False) for _ in range(n)])
+    graph = csr_matrix(
+        (rng.random(n * k), idx.ravel(), np.arange(0, n * k + 1, k)), shape=(n, n)
+    )
+    snn = calc_snn(idx)
+    assert snn[0, 0] == len(set(idx[0]).intersection(idx[idx[0, 0]])) / (k - 1)
+    # Merging a graph with itself returns the same edges (in transposed form)
+    merged = merge_graphs([graph, graph], batch_size=7)
+    assert np.array_equal(merged.toarray(), graph.T.toarray())
+
+
+def test_calc_pearson_stats():
+    from ..markers import calc_pearson_stats
+    from scipy.stats import linregress
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    data = rng.poisson(0.5, (200, 6)).astype(float)
+    data[:, 0] = 0
+    regressors = np.c_[rng.random(200), np.arange(200)]
+    r, p = calc_pearson_stats(data, regressors, 10)
+    assert r.shape == p.shape == (6, 2)
+    assert r[0, 0] == 0 and p[0, 0] == 1
+    for i in range(1, 6):
+        for j in range(2):
+            lin_obj = linregress(regressors[:, j], data[:, i])
+            assert np.isclose(r[i, j], lin_obj.rvalue)
+            assert np.isclose(p[i, j], lin_obj.pvalue)
+
+
+def test_lazy_exports():
+    import importlib
+    import subprocess
+    import sys
+    import scarf
+
+    for mod, names in scarf._lazy_exports.items():
+        assert importlib.import_module(f"scarf.{mod}").__all__ == names
+    assert scarf.DataStore is importlib.import_module("scarf.datastore").DataStore
+    code = (
+        "import sys, scarf; "
+        "assert not {'dask', 'zarr', 'numba', 'pandas', 'matplotlib'} & set(sys.modules)"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_migrate_graph():
+    from ..knn_utils import migrate_graph
+    import numpy as np
+    import zarr
+
+    rng = np.random.default_rng(0)
+    n, k = 23, 4
+    idx = rng.integers(0, n, size=(n, k))
+    w = rng.random((n, k))
+    for transposed in [False, True]:
+        rows = np.repeat(np.arange(n), k)
+        edges = np.vstack([rows, idx.ravel()]).T
+        if transposed:
+            edges = edges[:, ::-1]
+        store = zarr.group()
+        store.create_dataset("edges", data=edges.astype("u8"), chunks=(10,))
+        store.create_dataset("weights", data=w.ravel(), chunks=(10,))
+        assert migrate_graph(store, n, k, transposed, chunk_size=5)
+        assert sorted(store.keys()) == ["indices", "weights"]
+        assert np.array_equal(store["indices"][:], idx)
+        assert np.allclose(store["weights"][:], w)
+        assert store.attrs.get("transposed", False) == transposed
+        assert migrate_graph(store, n, k, transposed) is False
+
+
+def test_object_cache():
+    from ..utils import ObjectCache
+    import numpy as np
+
+    cache = ObjectCache(max_mem=3 / 1024)  # 3 KB
+    for i in range(3):
+        cache.put((f"a/{i}", "x"), np.zeros(128))  # 1 KB each
+    assert cache.get(("a/0", "x")) is not None
+    # `a/1` is the least recently used and is evicted to make space for `b`
+    cache.put(("b",), np.zeros(128))
+    assert ("a/1", "x") not in cache and ("a/0", "x") in cache
+    assert cache.memUsed == 3 * 1024
+    cache.put(("c",), np.zeros(1024))  # Larger than the budget
+    assert ("c",) not in cache
+    cache.invalidate("a")
+    assert len(cache) == 1 and cache.memUsed == 1024
+
+
+def test_mapping_scores_and_classes():
+    from ..mapping_utils import group_mapping_scores, predict_target_classes
+    import numpy as np
+
+    indices = np.array([[0, 1, 1], [2, 3, 0], [3, 3, 3]])
+    weights = np.array([[0.5, 0.2, 0.3], [0.4, 0.4, 0.2], [0.1, 0.1, 0.1]])
+    groups, scores, sizes = group_mapping_scores(indices, weights, ["b", "a", "b"], 5)
+    assert list(groups) == ["a", "b"] and list(sizes) == [1, 2]
+    assert np.allclose(scores.toarray(), [[0.2, 0, 0.4, 0.4, 0], [0.5, 0.5, 0, 0.3, 0]])
+    ref_groups = np.array([1, 1, 2, 2, 3])
+    assert predict_target_classes(indices, weights, ref_groups, 0.5, "NA") == [1, 2, 2]
+    # The second cell has two groups above the threshold and hence is not classified
+    assert predict_target_classes(indices, weights, ref_groups, 0.1, "NA") == [1, "NA", 2]
+
+
+def test_csr_to_igraph():
+    from ..knn_utils import csr_to_igraph, leiden_partitions
+    from scipy.sparse import csr_matrix
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    graph = csr_matrix(rng.random((30, 30)) * (rng.random((30, 30)) > 0.8))
+    graph.data[::5] = 0  # explicitly stored zeros are not edges
+    g = csr_to_igraph(graph.tocoo())
+    s, t = graph.nonzero()
+    # Edges are undirected, hence igraph may report their ends in either order
+    edges = [tuple(sorted(x)) for x in g.get_edgelist()]
+    assert g.vcount() == 30 and edges == [tuple(sorted(x)) for x in zip(s, t)]
+    assert np.array_equal(g.es["weight"], graph[s, t].A1)
+    a = leiden_partitions(graph, [0.5, 1.0], seed=1)
+    assert len(a) == 2 and all(len(x) == 30 for x in a)
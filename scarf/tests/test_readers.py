@@ -58,3 +58,39 @@ def test_h5ad_reader(h5ad_reader):
 def test_loom_reader(loom_reader):
     assert loom_reader.nCells == 298 == len(loom_reader.cell_ids())
     assert loom_reader.nFeatures == 16892 == len(loom_reader.feature_names())
+
+
+def test_crdir_reader_consume(crdir_reader):
+    a = np.vstack([x.todense() for x in crdir_reader.consume(1000, 100000)])
+    assert a.shape == (crdir_reader.nCells, crdir_reader.nFeatures)
+    # Chunks of MTX lines that span several batches of cells
+    b = np.vstack([x.todense() for x in crdir_reader.consume(50, 500)])
+    assert np.array_equal(a, b)
+
+
+def test_iter_mtx_chunks_bgzf(toy_crdir_reader):
+    from ..readers import _iter_mtx_chunks, _is_bgzf
+    from concurrent.futures import ThreadPoolExecutor
+    from . import full_path, remove
+    import struct
+    import zlib
+
+    with open(toy_crdir_reader.matFn, "rb") as fh:
+        data = fh.read()
+    fn = full_path("toy_matrix_bgzf.mtx.gz")
+    # Writes the file as BGZF blocks of 20 bytes, plus the empty EOF block
+    with open(fn, "wb") as fh:
+        for i in list(range(0, len(data), 20)) + [len(data)]:
+            block = data[i : i + 20]
+            c = zlib.compressobj(6, zlib.DEFLATED, -15)
+            cdata = c.compress(block) + c.flush()
+            fh.write(b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00")
+            fh.write(struct.pack("<H", len(cdata) + 25))
+            fh.write(cdata + struct.pack("<II", zlib.crc32(block), len(block)))
+    assert _is_bgzf(fn)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        bgzf = b"".join(_iter_mtx_chunks(fn, 50, pool))
+        plain = b"".join(_iter_mtx_chunks(toy_crdir_reader.matFn, 7, pool))
+    remove(fn)
+    assert bgzf == plain
+    assert plain == b"".join(data.splitlines(keepends=True)[3:])
@@ -59,6 +59,51 @@ def test_sparsetozarr():
     remove(fn)
 
 
+def test_sparsetozarr_sparse_counts():
+    from ..writers import SparseToZarr, load_zarr_counts
+    from scipy.sparse import csr_matrix
+    import numpy as np
+    import zarr
+
+    cols = [1, 3, 8, 2, 3, 1, 2, 8, 9]
+    rows = [0, 0, 0, 1, 1, 1, 2, 2, 2]
+    data = [1, 10, 15, 10, 20, 2, 3, 1, 5]
+    mat = csr_matrix((data, (cols, rows)), shape=(10, 3))
+
+    fn = full_path("dummy_sparse_csr.zarr")
+    writer = SparseToZarr(
+        mat,
+        zarr_fn=fn,
+        cell_ids=[f"cell_{x}" for x in range(3)],
+        feature_ids=[f"feat_{x}" for x in range(10)],
+        chunk_size=(2, 10),
+        sparse_counts=True,
+    )
+    writer.dump(batch_size=2)
+    counts = load_zarr_counts(zarr.open(fn)["RNA/counts"])
+    assert counts.chunks == ((2, 1), (10,))
+    assert np.array_equal(counts.compute().todense(), mat.T.toarray())
+    assert np.array_equal(counts[:, [3, 8]].sum(axis=0).compute().todense(), [30, 16])
+    remove(fn)
+
+
+def test_crtozarr_sparse_counts(toy_crdir_reader, toy_crdir_writer):
+    from ..writers import CrToZarr, load_zarr_counts
+    import numpy as np
+    import zarr
+
+    fn = full_path("toy_crdir_csr.zarr")
+    writer = CrToZarr(toy_crdir_reader, zarr_fn=fn, sparse_counts=True)
+    writer.dump(batch_size=7)
+    dense_z, sparse_z = zarr.open(toy_crdir_writer), zarr.open(fn)
+    for assay in toy_crdir_reader.assayFeats.columns:
+        assert np.array_equal(
+            load_zarr_counts(sparse_z[f"{assay}/counts"]).compute().todense(),
+            dense_z[f"{assay}/counts"][:],
+        )
+    remove(fn)
+
+
 def test_to_h5ad(datastore):
     # TODO: Evaluate the resulting H5ad file
     from ..writers import to_h5ad
@@ -93,6 +138,32 @@ def test_zarr_merge(datastore):
     remove(fn)
 
 
+def test_zarr_merge_values(datastore):
+    from ..writers import ZarrMerge
+    import numpy as np
+    import zarr
+
+    fn = full_path("merged_zarr_values.zarr")
+    # Chunk size that does not align with the cell boundary between the assays
+    writer = ZarrMerge(
+        zarr_path=fn,
+        assays=[datastore.RNA, datastore.RNA],
+        names=["self1", "self2"],
+        merge_assay_name="RNA",
+        chunk_size=(300, 5000),
+        prepend_text="",
+    )
+    writer.dump(nthreads=2)
+    z = zarr.open(fn, mode="r")
+    n = datastore.RNA.cells.N
+    counts = datastore.RNA.rawData[:50].compute()
+    assert z["RNA/counts"].shape == (2 * n, datastore.RNA.feats.N)
+    assert np.array_equal(z["RNA/counts"][:50], counts)
+    assert np.array_equal(z["RNA/counts"][n : n + 50], counts)
+    assert z["cellData/ids"][n] == f"self2__{datastore.cells.fetch_all('ids')[0]}"
+    remove(fn)
+
+
 def test_zarr_subset(datastore):
     # TODO: Evaluate the resulting subsetted file
 
@@ -104,3 +175,36 @@ def test_zarr_subset(datastore):
     writer = SubsetZarr(in_zarr=in_fn, out_zarr=out_fn, cell_idx=[1, 10, 100, 500])
     writer.dump()
     remove(out_fn)
+
+
+def test_subset_zarr_rows():
+    from ..writers import _subset_zarr_rows
+    import numpy as np
+    import zarr
+
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 100, size=(53, 17))
+    in_arr = zarr.array(data, chunks=(7, 5))
+    rows = rng.choice(53, 30, replace=False)
+    cols = np.array([16, 0, 3, 4, 9])
+    out_arr = zarr.zeros((30, 5), chunks=(4, 2), dtype=data.dtype)
+    _subset_zarr_rows(in_arr, out_arr, rows, cols, nthreads=3)
+    assert np.array_equal(out_arr[:], data[rows][:, cols])
+    out_arr = zarr.zeros((30, 17), chunks=(6, 17), dtype=data.dtype)
+    _subset_zarr_rows(in_arr, out_arr, np.sort(rows), nthreads=1)
+    assert np.array_equal(out_arr[:], data[np.sort(rows)])
+
+
+def test_chunked_counts_writer():
+    from ..writers import ChunkedCountsWriter
+    from scipy.sparse import random as sparse_random
+    import numpy as np
+    import zarr
+
+    mat = sparse_random(53, 17, density=0.2, format="csr", random_state=0)
+    mat.data = np.ceil(mat.data * 50)
+    store = zarr.zeros((53, 17), chunks=(8, 5), dtype="uint32")
+    with ChunkedCountsWriter(store, nthreads=3) as writer:
+        for s, e in [(0, 3), (3, 20), (20, 21), (21, 40), (40, 53)]:
+            writer.write(mat[s:e])
+    assert np.array_equal(store[:], mat.toarray().astype("uint32"))
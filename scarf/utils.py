@@ -4,16 +4,29 @@ Utility methods.
 - Methods:
     - clean_array: returns input array with nan and infinite values removed
     - controlled_compute: performs computation with Dask
+    - set_scheduler: sets the Dask scheduler used by controlled_compute
+    - close_thread_pools: shuts down the thread pools used by controlled_compute
+    - prefetch_blocks: iterates over the row blocks of a Dask array while computing the next blocks in background
+    - prefetch_iter: iterates over any iterable while producing the next elements in background
+    - calc_summary_stats: builds a single pass Dask reduction for sum, variance and nonzero counts
+    - segmented_aggregate: calculates per-group sum, variance and nonzero counts in a single pass over a Dask array
     - rescale_array: performs edge trimming on values of the input vector
     - show_progress: performs computation with Dask and shows progress bar
     - system_call: executes a command in the underlying operative system
     - rolling_window: applies rolling window mean over a vector
+- Classes:
+    - ObjectCache: in-memory cache of objects with LRU eviction and a memory budget
 """
 
 from loguru import logger
 import sys
+import atexit
+import threading
+import warnings
+from typing import Callable, Iterable, Optional
 import numpy as np
 from tqdm.dask import TqdmCallback
+from dask.array import PerformanceWarning
 from dask.array.core import Array
 from tqdm.auto import tqdm as std_tqdm
 from numba import jit
@@ -30,9 +43,20 @@ __all__ = [
     "clean_array",
     "show_dask_progress",
     "controlled_compute",
+    "set_scheduler",
+    "close_thread_pools",
+    "prefetch_blocks",
+    "prefetch_iter",
+    "ObjectCache",
+    "calc_summary_stats",
+    "segmented_aggregate",
     "rolling_window",
 ]
 
+# Set here rather than in `scarf/__init__` so that Dask is not imported by `import scarf`. Every module that uses
+# Dask imports this module.
+warnings.filterwarnings("ignore", category=PerformanceWarning)
+
 logger.remove()
 logger.add(
     sys.stdout, colorize=True, format="<level>{level}</level>: {message}", level="INFO"
@@ -132,22 +156,497 @@ def clean_array(x, fill_val: int = 0):
     return x
 
 
-def controlled_compute(arr, nthreads):
+_thread_pools = {}
+_thread_pools_lock = threading.Lock()
+_scheduler = {"scheduler": None}
+
+
+def _get_thread_pool(nthreads: int):
+    """
+    Returns the thread pool with `nthreads` threads. The pool is created on first
+    use and then reused by all the later computations with the same number of threads.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with _thread_pools_lock:
+        if nthreads not in _thread_pools:
+            _thread_pools[nthreads] = ThreadPoolExecutor(
+                max_workers=nthreads, thread_name_prefix="scarf"
+            )
+        return _thread_pools[nthreads]
+
+
+def close_thread_pools() -> None:
+    """
+    Shuts down the thread pools used by `controlled_compute`. Pools are
+    created again when required, hence it is safe to call this at any time
+    when no computation is running. This is called automatically on exit.
+
+    Returns:
+        None
     """
-    Performs computation with Dask.
+    with _thread_pools_lock:
+        for pool in _thread_pools.values():
+            pool.shutdown(wait=True)
+        _thread_pools.clear()
+
+
+atexit.register(close_thread_pools)
+
+
+def set_scheduler(scheduler=None) -> None:
+    """
+    Sets the Dask scheduler used by `controlled_compute` (and hence by all the
+    computations in Scarf).
 
     Args:
-        arr:
+        scheduler: Either of:
+                   - None: Use a persistent pool of threads for each value of `nthreads` (the default)
+                   - 'processes': Use Dask's multiprocessing scheduler with `nthreads` worker processes
+                   - A `dask.distributed.Client`, e.g. connected to a `LocalCluster`. Its workers then
+                     control the parallelism and `nthreads` is ignored.
+
+    Returns:
+        None
+    """
+    if scheduler is not None and scheduler != "processes":
+        if not hasattr(scheduler, "get"):
+            raise ValueError(
+                "ERROR: `scheduler` should be either None, 'processes' or a dask.distributed Client"
+            )
+    _scheduler["scheduler"] = scheduler
+
+
+def controlled_compute(arr, nthreads, densify: bool = True):
+    """
+    Performs computation with Dask. By default, the computation is performed on a
+    pool of `nthreads` threads that is shared by all calls with the same number of
+    threads. See `set_scheduler` to use another scheduler.
+
+    Args:
+        arr: A Dask array or a list of Dask arrays. A list of arrays is computed
+             together so that the tasks they share (e.g. reading the data) are
+             executed only once.
         nthreads: number of threads to use for computation
+        densify: If True, then sparse results (for example, from assays with sparse
+                 count layout) are converted to dense numpy arrays. (Default value: True)
 
     Returns:
-        Result of computation.
+        Result of computation. A list of results if `arr` is a list.
     """
-    from multiprocessing.pool import ThreadPool
     import dask
 
-    with dask.config.set(schedular="threads", pool=ThreadPool(nthreads)):
-        res = arr.compute()
+    scheduler = _scheduler["scheduler"]
+    if scheduler is None:
+        params = {"scheduler": "threads", "pool": _get_thread_pool(nthreads)}
+    elif scheduler == "processes":
+        params = {"scheduler": "processes", "num_workers": nthreads}
+    else:
+        params = {"scheduler": scheduler}
+    if isinstance(arr, (list, tuple)):
+        res = list(dask.compute(*arr, **params))
+    else:
+        res = dask.compute(arr, **params)[0]
+    if densify:
+        if isinstance(res, list):
+            res = [x.todense() if hasattr(x, "todense") else x for x in res]
+        elif hasattr(res, "todense"):
+            res = res.todense()
+    return res
+
+
+def prefetch_blocks(
+    arr: Array,
+    nthreads: int,
+    depth: int = 2,
+    max_mem: float = 1024,
+    msg: str = "",
+):
+    """
+    Iterates over the row blocks of a Dask array and yields each block as a computed
+    array. While a block is being used by the caller, the next blocks are read and
+    computed on a background thread, so that disk I/O and decompression overlap
+    with the caller's computation.
+
+    Args:
+        arr: A Dask array. Blocks are yielded in order along the first axis.
+        nthreads: Number of threads used to compute each block.
+        depth: Maximum number of blocks to compute ahead of the caller. Blocks are
+               computed synchronously when this is 0. (Default value: 2)
+        max_mem: Upper limit, in MB, on the memory used by the blocks held in the
+                 read-ahead buffer. The number of blocks prefetched is reduced to
+                 stay under this limit but at least one block is always prefetched
+                 when `depth` > 0. (Default value: 1024)
+        msg: Message for the progress bar.
+
+    Returns:
+        A generator of computed blocks
+    """
+    n_blocks = arr.numblocks[0]
+    if depth > 0:
+        block_mem = np.prod(arr.chunksize) * arr.dtype.itemsize / 1024**2
+        if block_mem > 0:
+            depth = int(min(depth, max(1, max_mem // block_mem)))
+    if n_blocks < 2:
+        depth = 0
+    blocks = (controlled_compute(i, nthreads) for i in arr.blocks)
+    yield from tqdmbar(prefetch_iter(blocks, depth), desc=msg, total=n_blocks)
+
+
+def prefetch_iter(items: Iterable, depth: int = 2):
+    """
+    Iterates over `items` on a background thread and yields its elements in order. At most `depth` elements are
+    held in a bounded queue ahead of the caller, so the production of the next elements (for example, reading
+    and decompression) overlaps with the caller's computation while the memory usage stays bounded. Exceptions
+    raised while producing the elements are re-raised in the caller's thread.
+
+    Args:
+        items: An iterable (typically a generator) whose elements are produced on the background thread.
+        depth: Maximum number of elements to produce ahead of the caller. The elements are produced
+               synchronously when this is 0. (Default value: 2)
+
+    Returns:
+        A generator of the elements of `items`
+    """
+    import queue
+
+    if depth <= 0:
+        yield from items
+        return
+
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _producer():
+        try:
+            for i in items:
+                if not _put((i, None)):
+                    return
+            _put((done, None))
+        except Exception as e:
+            _put((None, e))
+
+    worker = threading.Thread(target=_producer, daemon=True)
+    worker.start()
+    try:
+        while True:
+            res, err = buffer.get()
+            if err is not None:
+                raise err
+            if res is done:
+                break
+            yield res
+    finally:
+        # Also reached when the caller stops iterating early
+        stop.set()
+        worker.join()
+
+
+def _obj_nbytes(obj) -> int:
+    """
+    Estimates the memory used by the arrays of an object (NumPy arrays, SciPy sparse matrices and tuples or lists
+    of these).
+    """
+    if isinstance(obj, (tuple, list)):
+        return sum(_obj_nbytes(x) for x in obj)
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    nbytes = 0
+    for i in ["data", "indices", "indptr", "row", "col"]:
+        v = getattr(obj, i, None)
+        if isinstance(v, np.ndarray):
+            nbytes += v.nbytes
+    return nbytes if nbytes > 0 else sys.getsizeof(obj)
+
+
+class ObjectCache:
+    """
+    A thread-safe, in-memory cache of objects with least recently used (LRU) eviction. The keys are tuples whose
+    first element is the location in the Zarr hierarchy from which the object was derived, so that all objects
+    derived from a location (or its children) can be invalidated when the location is rewritten.
+
+    Args:
+        max_mem: Maximum memory (in MB) used by the cached objects. The least recently used objects are evicted once
+                 this is exceeded. Objects larger than this are not cached. Caching is disabled when this is 0.
+                 (Default value: 1024)
+
+    Attributes:
+        maxMem: Maximum memory (in MB) used by the cached objects
+        memUsed: Memory (in bytes) currently used by the cached objects
+    """
+
+    def __init__(self, max_mem: float = 1024):
+        from collections import OrderedDict
+
+        self.maxMem = max_mem
+        self.memUsed = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: tuple, default=None):
+        """
+        Returns the cached object and marks it as the most recently used.
+
+        Args:
+            key: A tuple with location in the Zarr hierarchy as the first element
+            default: Value returned when the key is not cached (Default value: None)
+
+        Returns:
+            The cached object or `default`
+        """
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key: tuple, obj) -> None:
+        """
+        Adds an object to the cache, evicting the least recently used objects if the memory budget is exceeded.
+
+        Args:
+            key: A tuple with location in the Zarr hierarchy as the first element
+            obj: The object to cache
+
+        Returns:
+            None
+        """
+        nbytes = _obj_nbytes(obj)
+        max_bytes = self.maxMem * 1024 ** 2
+        with self._lock:
+            if key in self._items:
+                self.memUsed -= self._items.pop(key)[1]
+            if nbytes > max_bytes:
+                return None
+            self._items[key] = (obj, nbytes)
+            self.memUsed += nbytes
+            while self.memUsed > max_bytes:
+                _, (_, n) = self._items.popitem(last=False)
+                self.memUsed -= n
+        return None
+
+    def invalidate(self, loc: str = None) -> None:
+        """
+        Removes the objects derived from a location in the Zarr hierarchy or from any of its children.
+
+        Args:
+            loc: Location in the Zarr hierarchy. All objects are removed if this is None. (Default value: None)
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for key in list(self._items):
+                if loc is None or key[0] == loc or key[0].startswith(f"{loc}/"):
+                    self.memUsed -= self._items.pop(key)[1]
+        return None
+
+
+SUMMARY_STATS_DTYPE = np.dtype(
+    [("n", "f8"), ("total", "f8"), ("m2", "f8"), ("nnz", "f8")]
+)
+
+
+def _summary_stats_chunk(x, axis=None, keepdims=None, **kwargs) -> np.ndarray:
+    """
+    Calculates the summary statistics of a single block. The sum of squared
+    deviations is calculated from values centered on the block's mean. Sparse
+    blocks are never densified: only the stored values are centered and each
+    implicit zero contributes the square of the mean.
+    """
+    from scipy.sparse import issparse
+
+    axis = tuple(axis)
+    n = np.prod([x.shape[i] for i in axis])
+    if issparse(x):
+        x = x.tocoo()
+        coords, data = (x.row, x.col), x.data
+    elif hasattr(x, "coords"):
+        coords, data = tuple(x.coords), x.data
+    else:
+        coords, data = None, None
+
+    if coords is None:
+        x = np.asarray(x, dtype="f8")
+        total = x.sum(axis=axis, keepdims=True)
+        mean = total / n if n > 0 else np.zeros(total.shape)
+        m2 = ((x - mean) ** 2).sum(axis=axis, keepdims=True)
+        nnz = (x != 0).sum(axis=axis, keepdims=True)
+    else:
+        data = data.astype("f8")
+        out_shape = tuple(1 if i in axis else s for i, s in enumerate(x.shape))
+        # Flat index of the output cell that each stored value is reduced into
+        idx = np.ravel_multi_index(
+            tuple(np.zeros_like(c) if i in axis else c for i, c in enumerate(coords)),
+            out_shape,
+        )
+        size = int(np.prod(out_shape))
+        total = np.bincount(idx, data, minlength=size)
+        mean = total / n if n > 0 else np.zeros(size)
+        n_stored = np.bincount(idx, minlength=size)
+        m2 = np.bincount(idx, (data - mean[idx]) ** 2, minlength=size)
+        m2 += (n - n_stored) * mean**2
+        nnz = np.bincount(idx, data != 0, minlength=size)
+        total, m2, nnz = (i.reshape(out_shape) for i in (total, m2, nnz))
+    ret_val = np.empty(total.shape, dtype=SUMMARY_STATS_DTYPE)
+    ret_val["n"] = n
+    ret_val["total"] = total
+    ret_val["m2"] = m2
+    ret_val["nnz"] = nnz
+    return ret_val
+
+
+def _summary_stats_combine(x, axis=None, keepdims=None, **kwargs) -> np.ndarray:
+    """
+    Merges the summary statistics of multiple blocks using the pairwise update
+    of Chan et al. for the sum of squared deviations.
+    """
+    n = x["n"].sum(axis=axis, keepdims=True)
+    total = x["total"].sum(axis=axis, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(n > 0, total / n, 0)
+        block_means = np.where(x["n"] > 0, x["total"] / x["n"], 0)
+    ret_val = np.empty(n.shape, dtype=SUMMARY_STATS_DTYPE)
+    ret_val["n"] = n
+    ret_val["total"] = total
+    ret_val["m2"] = (x["m2"] + x["n"] * (block_means - mean) ** 2).sum(
+        axis=axis, keepdims=True
+    )
+    ret_val["nnz"] = x["nnz"].sum(axis=axis, keepdims=True)
+    if not keepdims:
+        ret_val = ret_val.squeeze(axis=axis)
+    return ret_val
+
+
+def calc_summary_stats(arr: Array, axis: int) -> Array:
+    """
+    Builds a Dask reduction that calculates the sum, the sum of squared deviations from the mean and the number of
+    nonzero values along an axis, in a single pass over the blocks of the array. Each block is summarized
+    independently and the block summaries are then merged.
+
+    Args:
+        arr: A Dask array. The blocks can be either dense or sparse.
+        axis: The axis along which the statistics are calculated.
+
+    Returns:
+        A lazy Dask array with structured dtype `SUMMARY_STATS_DTYPE`. The fields are: 'n' (number of values),
+        'total' (sum of values), 'm2' (sum of squared deviations from the mean; the population variance is
+        m2 / n) and 'nnz' (number of nonzero values).
+    """
+    from dask.array import reduction
+
+    return reduction(
+        arr,
+        _summary_stats_chunk,
+        _summary_stats_combine,
+        combine=_summary_stats_combine,
+        axis=axis,
+        dtype=SUMMARY_STATS_DTYPE,
+        meta=np.empty((0,), dtype=SUMMARY_STATS_DTYPE),
+        concatenate=True,
+    )
+
+
+def segmented_aggregate(
+    arr: Array,
+    groups: np.ndarray,
+    n_groups: int,
+    axis: int,
+    nthreads: int,
+    msg: str = "",
+    block_callback: Callable[[int, int, np.ndarray], None] = None,
+) -> Optional[np.ndarray]:
+    """
+    Calculates the summary statistics of every group of rows (axis=0) or columns (axis=1) of a Dask array in a
+    single pass over its row blocks. Each block is multiplied with a sparse group indicator matrix, so the cost
+    does not grow with the number of groups.
+
+    Args:
+        arr: A 2D Dask array
+        groups: Group index (0 to n_groups - 1) of each row (axis=0) or column (axis=1) of `arr`.
+                Rows/columns with a negative group index are ignored.
+        n_groups: Number of groups
+        axis: 0 to aggregate rows (e.g. cells) and 1 to aggregate columns (e.g. features)
+        nthreads: Number of threads used to compute each block
+        msg: Message for the progress bar
+        block_callback: Only used when axis=1. If provided, the statistics of each row block are passed to this
+                        function, along with the start and end row of the block, as soon as they are computed, and
+                        the full result is never held in memory. (Default value: None)
+
+    Returns:
+        An array with structured dtype `SUMMARY_STATS_DTYPE` (see `calc_summary_stats`). The shape is
+        (n_groups, n_columns) when axis=0 and (n_rows, n_groups) when axis=1. None is returned when axis=1 and
+        `block_callback` is provided.
+    """
+    from scipy.sparse import csr_matrix
+
+    if axis not in (0, 1):
+        raise ValueError("ERROR: `axis` can only be 0 or 1")
+    groups = np.asarray(groups)
+    if len(groups) != arr.shape[axis]:
+        raise ValueError(
+            f"ERROR: Length of `groups` ({len(groups)}) does not match the size of the array along axis {axis}"
+        )
+
+    def _indicator(g: np.ndarray) -> csr_matrix:
+        keep = np.where(g >= 0)[0]
+        return csr_matrix(
+            (np.ones(len(keep)), (g[keep], keep)), shape=(n_groups, len(g))
+        )
+
+    # Ignored rows/columns are pointed to group 0 when centering; the indicator matrix drops them afterwards
+    group_pos = np.where(groups >= 0, groups, 0)
+    res = None
+    if axis == 0:
+        res = np.zeros((n_groups, arr.shape[1]), dtype=SUMMARY_STATS_DTYPE)
+    else:
+        ind = _indicator(groups).T.tocsr()
+        group_sizes = np.asarray(ind.sum(axis=0)).ravel()
+        if block_callback is None:
+            res = np.zeros((arr.shape[0], n_groups), dtype=SUMMARY_STATS_DTYPE)
+    start = 0
+    for block in prefetch_blocks(arr, nthreads, msg=msg):
+        block = np.asarray(block, dtype="f8")
+        end = start + block.shape[0]
+        if axis == 0:
+            ind = _indicator(groups[start:end])
+            b = np.empty(res.shape, dtype=SUMMARY_STATS_DTYPE)
+            b["n"] = np.asarray(ind.sum(axis=1))
+            b["total"] = ind @ block
+            with np.errstate(divide="ignore", invalid="ignore"):
+                mean = np.where(b["n"] > 0, b["total"] / b["n"], 0)
+            b["m2"] = ind @ ((block - mean[group_pos[start:end]]) ** 2)
+            b["nnz"] = ind @ (block != 0).astype("f8")
+            res = _summary_stats_combine(np.stack([res, b]), axis=0)
+        else:
+            b = np.empty((block.shape[0], n_groups), dtype=SUMMARY_STATS_DTYPE)
+            b["n"] = group_sizes
+            b["total"] = block @ ind
+            with np.errstate(divide="ignore", invalid="ignore"):
+                mean = np.where(b["n"] > 0, b["total"] / b["n"], 0)
+            b["m2"] = ((block - mean[:, group_pos]) ** 2) @ ind
+            b["nnz"] = (block != 0).astype("f8") @ ind
+            if block_callback is None:
+                res[start:end] = b
+            else:
+                block_callback(start, end, b)
+        start = end
     return res
 
 
@@ -156,7 +655,7 @@ def show_dask_progress(arr: Array, msg: str = None, nthreads: int = 1):
     Performs computation with Dask and shows progress bar.
 
     Args:
-        arr: A Dask array
+        arr: A Dask array or a list of Dask arrays to be computed together
         msg: message to log, default None
         nthreads: number of threads to use for computation, default 1
 
@@ -5,12 +5,15 @@ Methods and classes for writing data to disk.
     - create_zarr_dataset: Creates and returns a Zarr hierarchy/dataset.
     - create_zarr_obj_array: Creates and returns a Zarr object array.
     - create_zarr_count_assay: Creates and returns a Zarr array with name 'counts'.
+    - write_sparse_counts: Appends a block of cells to a sparse (CSR) 'counts' group.
+    - load_zarr_counts: Returns the 'counts' of an assay as a Dask array.
     - subset_assay_zarr: Selects a subset of the data in an assay in the specified Zarr hierarchy.
     - dask_to_zarr: Creates a Zarr hierarchy from a Dask array.
     - to_h5ad: Convert a Zarr file to H5ad format
     - to_mtx: Convert a Zarr file to MTX format
 
 - Classes:
+    - ChunkedCountsWriter: Writes blocks of cells into a 'counts' matrix, one complete chunk at a time.
     - ZarrMerge: Merge multiple Zarr files into a single Zarr file.
     - SubsetZarr: Extracts a subset of cells from the given Zarr file and saves into a new Zarr file.
     - CrToZarr: A class for converting data in the Cellranger format to a Zarr hierarchy.
@@ -20,18 +23,22 @@ Methods and classes for writing data to disk.
 """
 
 import zarr
-from typing import Any, Tuple, List, Union, Dict
+from typing import Any, Tuple, List, Union, Dict, Generator
 import numpy as np
 from .readers import CrReader, H5adReader, NaboH5Reader, LoomReader
 import os
 import pandas as pd
+import sparse
 from .utils import controlled_compute, logger, tqdmbar
-from scipy.sparse import csr_matrix
+from scipy.sparse import csr_matrix, vstack
 
 __all__ = [
     "create_zarr_dataset",
     "create_zarr_obj_array",
     "create_zarr_count_assay",
+    "write_sparse_counts",
+    "ChunkedCountsWriter",
+    "load_zarr_counts",
     "subset_assay_zarr",
     "dask_to_zarr",
     "ZarrMerge",
@@ -140,10 +147,15 @@ def create_zarr_count_assay(
     feat_ids: Union[np.ndarray, List[str]],
     feat_names: Union[np.ndarray, List[str]],
     dtype: str = "uint32",
+    sparse_counts: bool = False,
 ) -> zarr.hierarchy:
     """
     Creates and returns a Zarr array with name 'counts'.
 
+    When `sparse_counts` is True, 'counts' is instead created as a group with
+    the CSR arrays 'indptr', 'indices' and 'data'. The cells must then be
+    written in order using `write_sparse_counts`.
+
     Args:
         z (zarr.Group):
         assay_name (str):
@@ -152,9 +164,10 @@ def create_zarr_count_assay(
         feat_ids (Union[np.ndarray, List[str]]):
         feat_names (Union[np.ndarray, List[str]]):
         dtype (str = 'uint32'):
+        sparse_counts (bool): If True, then the counts are saved in a sparse CSR layout (Default value: False)
 
     Returns:
-        A Zarr array.
+        A Zarr array or, if `sparse_counts` is True, a Zarr group.
     """
     g = z.create_group(assay_name, overwrite=True)
     g.attrs["is_assay"] = True
@@ -164,9 +177,367 @@ def create_zarr_count_assay(
     create_zarr_obj_array(
         g, "featureData/I", [True for _ in range(len(feat_ids))], "bool"
     )
-    return create_zarr_dataset(
-        g, "counts", chunk_size, dtype, (n_cells, len(feat_ids)), overwrite=True
-    )
+    if sparse_counts:
+        store = _create_sparse_counts(g, chunk_size, dtype, (n_cells, len(feat_ids)))
+    else:
+        store = create_zarr_dataset(
+            g, "counts", chunk_size, dtype, (n_cells, len(feat_ids)), overwrite=True
+        )
+    _update_counts_token(store)
+    return store
+
+
+def _update_counts_token(store) -> None:
+    """
+    Saves a new random token in the attributes of the 'counts' array (or group). The token changes every time
+    the counts are (re)written and is used to check whether data derived from the counts, like the
+    feature-major copy, is still in sync with them.
+
+    Args:
+        store: 'counts' Zarr array or group
+
+    Returns:
+        None
+    """
+    from uuid import uuid4
+
+    store.attrs["token"] = uuid4().hex
+
+
+def _create_sparse_counts(
+    g: zarr.Group, chunk_size: Tuple[int, int], dtype: Any, shape: Tuple[int, int]
+) -> zarr.hierarchy:
+    """
+    Creates an empty 'counts' group with CSR layout. The nonzero values are
+    appended to 'indices' and 'data' as cells are written, hence these arrays
+    start with zero length.
+
+    Args:
+        g: Zarr group of the assay
+        chunk_size: Chunk size of the equivalent dense array. Only the cell
+                    chunk size is used, as the number of cells in each block
+                    when the counts are loaded.
+        dtype: Dtype of the count values
+        shape: Number of cells and features
+
+    Returns:
+        A Zarr group
+    """
+    cg = g.create_group("counts", overwrite=True)
+    cg.attrs["sparse_format"] = "csr"
+    cg.attrs["shape"] = [int(x) for x in shape]
+    cg.attrs["chunks"] = [int(chunk_size[0]), int(shape[1])]
+    nnz_chunk = int(chunk_size[0]) * int(chunk_size[1])
+    create_zarr_dataset(cg, "indptr", (nnz_chunk,), "int64", (shape[0] + 1,))
+    create_zarr_dataset(cg, "indices", (nnz_chunk,), "uint32", (0,))
+    create_zarr_dataset(cg, "data", (nnz_chunk,), dtype, (0,))
+    return cg
+
+
+def write_sparse_counts(store: zarr.Group, mat: csr_matrix, start: int) -> None:
+    """
+    Appends a block of cells to a 'counts' group that has a CSR layout. Blocks
+    must be written in order of the cells.
+
+    Args:
+        store: 'counts' group created by `create_zarr_count_assay` with `sparse_counts=True`
+        mat: A CSR matrix with cells as rows and all the features of the assay as columns
+        start: Index of the first cell of the block
+
+    Raises:
+        ValueError: Raised if the block does not start where the previous one ended.
+
+    Returns:
+        None
+    """
+    offset = store["data"].shape[0]
+    if store["indptr"][start] != offset:
+        raise ValueError(
+            f"ERROR: Cells in a sparse counts group must be written in order. Block starting at cell "
+            f"{start} does not follow the previously written cells"
+        )
+    mat = csr_matrix(mat)
+    mat.sum_duplicates()
+    store["indptr"][start + 1 : start + 1 + mat.shape[0]] = offset + mat.indptr[1:]
+    store["indices"].append(mat.indices.astype(store["indices"].dtype))
+    store["data"].append(mat.data.astype(store["data"].dtype))
+
+
+class ChunkedCountsWriter:
+    """
+    Writes consecutive blocks of cells into a 'counts' matrix. For a dense Zarr array, the incoming blocks are
+    buffered (in sparse form) until a full row of chunks is complete, and then every chunk of that row is written
+    exactly once, with the chunks being densified and compressed in parallel. Hence, the size of the incoming
+    blocks does not need to match the chunk size of the array. For a 'counts' group with a sparse CSR layout the
+    blocks are appended directly using `write_sparse_counts`.
+
+    Use the writer as a context manager, or call `close` after the last block, to write the final incomplete row
+    of chunks.
+
+    Args:
+        store: 'counts' Zarr array or, for sparse CSR layout, 'counts' group
+        nthreads: Number of chunks to be written in parallel (Default value: 2)
+
+    Attributes:
+        store: 'counts' Zarr array or group
+        nthreads: Number of chunks to be written in parallel
+        pos: Index of the cell where the next block will be written
+    """
+
+    def __init__(self, store, nthreads: int = 2):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.store = store
+        self.nthreads = max(1, nthreads)
+        self.pos = 0
+        self._isSparse = _is_sparse_counts(store)
+        self._nCells = store.attrs["shape"][0] if self._isSparse else store.shape[0]
+        self._pending: List[csr_matrix] = []
+        self._pendingStart = 0
+        self._pool = None
+        if not self._isSparse:
+            self._pool = ThreadPoolExecutor(max_workers=self.nthreads)
+        _update_counts_token(store)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        elif self._pool is not None:
+            self._pool.shutdown()
+
+    def _to_csr(self, mat) -> csr_matrix:
+        if isinstance(mat, sparse.COO):
+            return csr_matrix((mat.data, (mat.coords[0], mat.coords[1])), shape=mat.shape)
+        return csr_matrix(mat)
+
+    def _write_band(self, mat: csr_matrix, start: int) -> None:
+        """
+        Writes rows (starting at `start`) that lie within one row of chunks. The rows are densified in the
+        target dtype and each chunk of the row is then written from a view of the buffer.
+        """
+        a = mat.astype(self.store.dtype).toarray()
+        col_size = self.store.chunks[1]
+        end = start + a.shape[0]
+
+        def _write_chunk(c: int) -> None:
+            self.store[start:end, c : c + col_size] = a[:, c : c + col_size]
+
+        for f in [
+            self._pool.submit(_write_chunk, x)
+            for x in range(0, self.store.shape[1], col_size)
+        ]:
+            f.result()
+
+    def write(self, mat) -> None:
+        """
+        Writes a block of cells after the previously written cells.
+
+        Args:
+            mat: A CSR matrix, a `sparse.COO` array or a dense array with cells as rows and all the features of the
+                 assay as columns.
+
+        Returns:
+            None
+        """
+        mat = self._to_csr(mat)
+        if self.pos + mat.shape[0] > self._nCells:
+            raise ValueError(
+                f"ERROR: Block of {mat.shape[0]} cells starting at cell {self.pos} exceeds the size of the "
+                f"counts matrix"
+            )
+        if self._isSparse:
+            write_sparse_counts(self.store, mat, self.pos)
+            self.pos += mat.shape[0]
+            return None
+        self._pending.append(mat)
+        self.pos += mat.shape[0]
+        row_size = self.store.chunks[0]
+        band_end = (self._pendingStart // row_size + 1) * row_size
+        if self.pos < band_end:
+            return None
+        pending = vstack(self._pending, format="csr")
+        while pending.shape[0] >= band_end - self._pendingStart:
+            n = band_end - self._pendingStart
+            self._write_band(pending[:n], self._pendingStart)
+            pending = pending[n:]
+            self._pendingStart, band_end = band_end, band_end + row_size
+        self._pending = [pending] if pending.shape[0] > 0 else []
+
+    def close(self) -> None:
+        """
+        Writes the remaining buffered cells.
+
+        Returns:
+            None
+        """
+        if len(self._pending) > 0:
+            self._write_band(vstack(self._pending, format="csr"), self._pendingStart)
+            self._pendingStart = self.pos
+            self._pending = []
+        if self._pool is not None:
+            self._pool.shutdown()
+
+
+class SparseCountsBlock(sparse.COO):
+    """
+    A `sparse.COO` array that performs 2D orthogonal indexing through SciPy's
+    CSR indexing, which is much faster than that of `sparse.COO` when
+    selecting features from blocks of count matrix.
+    """
+
+    @classmethod
+    def from_csr(cls, mat: csr_matrix) -> "SparseCountsBlock":
+        """
+        Creates an instance from a SciPy sparse matrix.
+
+        Args:
+            mat: A SciPy sparse matrix
+
+        Returns:
+            A SparseCountsBlock
+        """
+        mat = mat.tocoo()
+        return cls(
+            np.vstack([mat.row, mat.col]),
+            mat.data,
+            shape=mat.shape,
+            has_duplicates=False,
+        )
+
+    def __getitem__(self, key):
+        if (
+            self.ndim == 2
+            and isinstance(key, tuple)
+            and len(key) == 2
+            and not any(np.isscalar(k) or k is None or k is Ellipsis for k in key)
+        ):
+            return self.from_csr(self.tocsr()[key[0]][:, key[1]])
+        return super().__getitem__(key)
+
+
+class SparseCountsArray:
+    """
+    A read-only array-like view of a 'counts' group with CSR layout. Indexing
+    returns `SparseCountsBlock` arrays, which allows wrapping the group into a Dask
+    array with sparse blocks.
+
+    Args:
+        store: 'counts' group with CSR layout
+
+    Attributes:
+        store: 'counts' group with CSR layout
+        shape: Number of cells and features
+        dtype: Dtype of the count values
+        ndim: Number of dimensions (always 2)
+        chunks: Number of cells and features in each block
+    """
+
+    def __init__(self, store: zarr.Group):
+        self.store = store
+        self.shape = tuple(store.attrs["shape"])
+        self.dtype = store["data"].dtype
+        self.ndim = 2
+        self.chunks = tuple(store.attrs["chunks"])
+
+    def read_rows(self, s: int, e: int) -> csr_matrix:
+        """
+        Reads a contiguous range of cells.
+
+        Args:
+            s: Index of the first cell
+            e: Index after the last cell
+
+        Returns:
+            A CSR matrix
+        """
+        indptr = self.store["indptr"][s : e + 1]
+        indices = self.store["indices"][indptr[0] : indptr[-1]]
+        data = self.store["data"][indptr[0] : indptr[-1]]
+        return csr_matrix(
+            (data, indices, indptr - indptr[0]), shape=(e - s, self.shape[1])
+        )
+
+    def __getitem__(self, key) -> SparseCountsBlock:
+        if not isinstance(key, tuple):
+            key = (key,)
+        key = key + (slice(None),) * (2 - len(key))
+        rows, cols = key
+        if isinstance(rows, slice) and rows.step in (None, 1):
+            s, e, _ = rows.indices(self.shape[0])
+            mat = self.read_rows(s, max(s, e))
+        else:
+            idx = np.arange(self.shape[0])[rows]
+            s = int(idx.min()) if idx.size > 0 else 0
+            e = int(idx.max()) + 1 if idx.size > 0 else 0
+            mat = self.read_rows(s, e)[np.atleast_1d(idx) - s]
+        mat = mat[:, cols]
+        ret_val = SparseCountsBlock.from_csr(mat)
+        out_shape = [
+            n for n, k in zip(ret_val.shape, (rows, cols)) if not np.isscalar(k)
+        ]
+        if len(out_shape) != 2:
+            ret_val = ret_val.reshape(tuple(out_shape))
+        return ret_val
+
+
+def _is_sparse_counts(store) -> bool:
+    """
+    Checks whether an assay's 'counts' were saved with a CSR layout.
+
+    Args:
+        store: 'counts' array or group of an assay
+
+    Returns:
+        True if the counts are in sparse layout else False
+    """
+    return isinstance(store, zarr.hierarchy.Group)
+
+
+def load_zarr_counts(store):
+    """
+    Returns the 'counts' of an assay as a Dask array. Dense layouts are
+    wrapped directly, while CSR layouts yield blocks of `sparse.COO` arrays,
+    so that the count values are never densified before computation.
+
+    Args:
+        store: 'counts' array or group of an assay
+
+    Returns:
+        A Dask array
+    """
+    import dask.array as daskarr
+
+    if _is_sparse_counts(store):
+        arr = SparseCountsArray(store)
+        return daskarr.from_array(
+            arr,
+            chunks=arr.chunks,
+            asarray=False,
+            fancy=False,
+            inline_array=True,
+            meta=SparseCountsBlock.from_csr(csr_matrix((0, 0), dtype=arr.dtype)),
+        )
+    return daskarr.from_zarr(store, inline_array=True)
+
+
+def _compute_csr_block(block, nthreads: int) -> csr_matrix:
+    """
+    Computes a block of counts, from either dense or sparse layout, into a CSR matrix.
+
+    Args:
+        block: A Dask array
+        nthreads: Number of threads to use
+
+    Returns:
+        A CSR matrix
+    """
+    a = controlled_compute(block, nthreads, densify=False)
+    if hasattr(a, "tocsr"):
+        return a.tocsr()
+    return csr_matrix(a)
 
 
 class CrToZarr:
@@ -178,20 +549,28 @@ class CrToZarr:
         zarr_fn: The file name for the Zarr hierarchy.
         chunk_size: The requested size of chunks to load into memory and process.
         dtype: the dtype of the data.
+        sparse_counts: If True, then the count matrices are saved in sparse CSR layout. (Default value: False)
 
     Attributes:
         cr: A CrReader object, containing the Cellranger data.
         fn: The file name for the Zarr hierarchy.
         chunkSizes: The requested size of chunks to load into memory and process.
+        sparseCounts: Whether the count matrices are saved in sparse CSR layout.
         z: The Zarr hierarchy (array or group).
     """
 
     def __init__(
-        self, cr: CrReader, zarr_fn: str, chunk_size=(1000, 1000), dtype: str = "uint32"
+        self,
+        cr: CrReader,
+        zarr_fn: str,
+        chunk_size=(1000, 1000),
+        dtype: str = "uint32",
+        sparse_counts: bool = False,
     ):
         self.cr = cr
         self.fn = zarr_fn
         self.chunkSizes = chunk_size
+        self.sparseCounts = sparse_counts
         self.z = zarr.open(self.fn, mode="w")
         self._ini_cell_data()
         for assay_name in self.cr.assayFeats.columns:
@@ -203,6 +582,7 @@ class CrToZarr:
                 self.cr.feature_ids(assay_name),
                 self.cr.feature_names(assay_name),
                 dtype,
+                sparse_counts,
             )
 
     def _ini_cell_data(self):
@@ -241,7 +621,9 @@ class CrToZarr:
                 lv += j[1] - j[0]
         return feat_offset
 
-    def dump(self, batch_size: int = 1000, lines_in_mem: int = 100000) -> None:
+    def dump(
+        self, batch_size: int = 1000, lines_in_mem: int = 100000, nthreads: int = 2
+    ) -> None:
         """
         Writes the count values into the Zarr matrix
 
@@ -249,6 +631,7 @@ class CrToZarr:
             batch_size: Number of cells to save at a time. (Default value: 1000)
             lines_in_mem: Number of lines to read at a time from MTX file (only used for CrDirReader)
                           (Default value: 100000)
+            nthreads: Number of chunks to be compressed and written in parallel (Default value: 2)
 
         Raises:
             AssertionError: Catches eventual bugs in the class, if number of cells does not match after transformation.
@@ -257,31 +640,48 @@ class CrToZarr:
             None
 
         """
+        from contextlib import ExitStack
+
         input_ranges = self._prep_assay_input_ranges(self.cr.assayFeats)
         stores = {x: self.z[f"{x}/counts"] for x in input_ranges}
         feat_offset = self._prep_feat_index_offset(input_ranges)
         s = 0
         n_chunks = self.cr.nCells // batch_size + 1
-        for a in tqdmbar(self.cr.consume(batch_size, lines_in_mem), total=n_chunks):
-            for assay in input_ranges:
-                idx = np.zeros(a.coords.shape[1]).astype(bool)
-                feat_coords = a.coords[1].copy()
-                for r, of in zip(input_ranges[assay], feat_offset[assay]):
-                    temp = (a.coords[1] >= r[0]) & (a.coords[1] < r[1])
-                    if of != 0:
-                        feat_coords[temp] = (
-                            feat_coords[temp] + of
-                        )  # of is already a negative value
-                    idx = idx | temp
-                if idx.sum() > 0:
-                    stores[assay].set_coordinate_selection(
-                        (s + a.coords[0][idx], feat_coords[idx]), a.data[idx]
+        with ExitStack() as stack:
+            writers = {
+                x: stack.enter_context(ChunkedCountsWriter(stores[x], nthreads))
+                for x in input_ranges
+            }
+            for a in tqdmbar(
+                self.cr.consume(batch_size, lines_in_mem), total=n_chunks
+            ):
+                for assay in input_ranges:
+                    idx = np.zeros(a.coords.shape[1]).astype(bool)
+                    feat_coords = a.coords[1].copy()
+                    for r, of in zip(input_ranges[assay], feat_offset[assay]):
+                        temp = (a.coords[1] >= r[0]) & (a.coords[1] < r[1])
+                        if of != 0:
+                            feat_coords[temp] = (
+                                feat_coords[temp] + of
+                            )  # of is already a negative value
+                        idx = idx | temp
+                    if idx.sum() == 0:
+                        logger.warning(
+                            f"No feature captured from chunk {s} to {s+a.shape[0]} for assay: {assay}"
+                        )
+                    # Empty blocks are written as well to keep the cell positions in order
+                    n_feats = (
+                        stores[assay].attrs["shape"][1]
+                        if self.sparseCounts
+                        else stores[assay].shape[1]
                     )
-                else:
-                    logger.warning(
-                        f"No feature captured from chunk {s} to {s+a.shape[0]} for assay: {assay}"
+                    writers[assay].write(
+                        csr_matrix(
+                            (a.data[idx], (a.coords[0][idx], feat_coords[idx])),
+                            shape=(a.shape[0], n_feats),
+                        )
                     )
-            s += a.shape[0]
+                s += a.shape[0]
         if s != self.cr.nCells:
             raise AssertionError(
                 "ERROR: This is a bug in CrToZarr. All cells might not have been successfully "
@@ -298,11 +698,13 @@ class H5adToZarr:
         zarr_fn: The file name for the Zarr hierarchy.
         assay_name: the name of the assay (e. g. 'RNA')
         chunk_size: The requested size of chunks to load into memory and process.
+        sparse_counts: If True, then the count matrix is saved in sparse CSR layout. (Default value: False)
 
     Attributes:
         h5ad: A h5ad object (h5 file with added AnnData structure).
         fn: The file name for the Zarr hierarchy.
         chunkSizes: The requested size of chunks to load into memory and process.
+        sparseCounts: Whether the count matrix is saved in sparse CSR layout.
         assayName: The Zarr hierarchy (array or group).
         z: The Zarr hierarchy (array or group).
     """
@@ -313,11 +715,13 @@ class H5adToZarr:
         zarr_fn: str,
         assay_name: str = None,
         chunk_size=(1000, 1000),
+        sparse_counts: bool = False,
     ):
         # TODO: support for multiple assay. One of the `var` datasets can be used to group features in separate assays
         self.h5ad = h5ad
         self.fn = zarr_fn
         self.chunkSizes = chunk_size
+        self.sparseCounts = sparse_counts
         if assay_name is None:
             logger.info(
                 f"No value provided for assay names. Will use default value: 'RNA'"
@@ -335,6 +739,7 @@ class H5adToZarr:
             self.h5ad.feat_ids(),
             self.h5ad.feat_names(),
             self.h5ad.matrixDtype,
+            sparse_counts,
         )
         for i, j in self.h5ad.get_feat_columns():
             if i not in self.z[self.assayName]["featureData"]:
@@ -351,9 +756,13 @@ class H5adToZarr:
         for i, j in self.h5ad.get_cell_columns():
             create_zarr_obj_array(g, i, j, j.dtype)
 
-    def dump(self, batch_size: int = 1000) -> None:
+    def dump(self, batch_size: int = 1000, nthreads: int = 2) -> None:
         # TODO: add informed description to docstring
         """
+        Args:
+            batch_size: Number of cells to read at a time. (Default value: 1000)
+            nthreads: Number of chunks to be compressed and written in parallel (Default value: 2)
+
         Raises:
             AssertionError: Catches eventual bugs in the class, if number of cells does not match after transformation.
 
@@ -361,15 +770,12 @@ class H5adToZarr:
             None
         """
         store = self.z["%s/counts" % self.assayName]
-        s, e, = (
-            0,
-            0,
-        )
+        e = 0
         n_chunks = self.h5ad.nCells // batch_size + 1
-        for a in tqdmbar(self.h5ad.consume(batch_size), total=n_chunks):
-            e += a.shape[0]
-            store[s:e] = a
-            s = e
+        with ChunkedCountsWriter(store, nthreads) as writer:
+            for a in tqdmbar(self.h5ad.consume(batch_size), total=n_chunks):
+                e += a.shape[0]
+                writer.write(a)
         if e != self.h5ad.nCells:
             raise AssertionError(
                 "ERROR: This is a bug in H5adToZarr. All cells might not have been successfully "
@@ -432,9 +838,13 @@ class NaboH5ToZarr:
         create_zarr_obj_array(g, "names", self.h5.cell_ids())
         create_zarr_obj_array(g, "I", [True for _ in range(self.h5.nCells)], "bool")
 
-    def dump(self, batch_size: int = 500) -> None:
+    def dump(self, batch_size: int = 500, nthreads: int = 2) -> None:
         # TODO: add informed description to docstring
         """
+        Args:
+            batch_size: Number of cells to read at a time. (Default value: 500)
+            nthreads: Number of chunks to be compressed and written in parallel (Default value: 2)
+
         Raises:
             AssertionError: Catches eventual bugs in the class, if number of cells does not match after transformation.
 
@@ -442,15 +852,12 @@ class NaboH5ToZarr:
             None
         """
         store = self.z["%s/counts" % self.assayName]
-        s, e, = (
-            0,
-            0,
-        )
+        e = 0
         n_chunks = self.h5.nCells // batch_size + 1
-        for a in tqdmbar(self.h5.consume(batch_size), total=n_chunks):
-            e += a.shape[0]
-            store[s:e] = a
-            s = e
+        with ChunkedCountsWriter(store, nthreads) as writer:
+            for a in tqdmbar(self.h5.consume(batch_size), total=n_chunks):
+                e += a.shape[0]
+                writer.write(a)
         if e != self.h5.nCells:
             raise AssertionError(
                 "ERROR: This is a bug in NaboH5ToZarr. All cells might not have been successfully "
@@ -516,9 +923,13 @@ class LoomToZarr:
         for i, j in self.loom.get_cell_attrs():
             create_zarr_obj_array(g, i, j, j.dtype)
 
-    def dump(self, batch_size: int = 1000) -> None:
+    def dump(self, batch_size: int = 1000, nthreads: int = 2) -> None:
         # TODO: add informed description to docstring
         """
+        Args:
+            batch_size: Number of cells to read at a time. (Default value: 1000)
+            nthreads: Number of chunks to be compressed and written in parallel (Default value: 2)
+
         Raises:
             AssertionError: Catches eventual bugs in the class, if number of cells does not match after transformation.
 
@@ -526,15 +937,12 @@ class LoomToZarr:
             None
         """
         store = self.z["%s/counts" % self.assayName]
-        s, e, = (
-            0,
-            0,
-        )
+        e = 0
         n_chunks = self.loom.nCells // batch_size + 1
-        for a in tqdmbar(self.loom.consume(batch_size), total=n_chunks):
-            e += a.shape[0]
-            store[s:e] = a
-            s = e
+        with ChunkedCountsWriter(store, nthreads) as writer:
+            for a in tqdmbar(self.loom.consume(batch_size), total=n_chunks):
+                e += a.shape[0]
+                writer.write(a)
         if e != self.loom.nCells:
             raise AssertionError(
                 "ERROR: This is a bug in LoomToZarr. All cells might not have been successfully "
@@ -553,6 +961,7 @@ class SparseToZarr:
         feature_ids: Feature IDs for the features in the dataset.
         assay_name: Name for the output assay. If not provided then automatically set to RNA.
         chunk_size: The requested size of chunks to load into memory and process.
+        sparse_counts: If True, then the count matrix is saved in sparse CSR layout. (Default value: False)
 
     Raises:
         ValueError: Raised if number of input cell or feature IDs does not match the matrix.
@@ -562,6 +971,7 @@ class SparseToZarr:
         csr_mat:
         fn: The file name for the Zarr hierarchy.
         chunkSizes: The requested size of chunks to load into memory and process.
+        sparseCounts: Whether the count matrix is saved in sparse CSR layout.
         assayName: The Zarr hierarchy (array or group).
         z: The Zarr hierarchy (array or group).
     """
@@ -574,10 +984,12 @@ class SparseToZarr:
         feature_ids: List[str],
         assay_name: str = None,
         chunk_size=(1000, 1000),
+        sparse_counts: bool = False,
     ):
         self.mat = csr_mat
         self.fn = zarr_fn
         self.chunkSizes = chunk_size
+        self.sparseCounts = sparse_counts
         if assay_name is None:
             logger.info(
                 f"No value provided for assay names. Will use default value: 'RNA'"
@@ -605,6 +1017,7 @@ class SparseToZarr:
             feature_ids,
             feature_ids,
             "int64",
+            sparse_counts,
         )
 
     def _ini_cell_data(self, cell_ids):
@@ -613,9 +1026,13 @@ class SparseToZarr:
         create_zarr_obj_array(g, "names", cell_ids)
         create_zarr_obj_array(g, "I", [True for _ in range(self.nCells)], "bool")
 
-    def dump(self, batch_size: int = 1000) -> None:
+    def dump(self, batch_size: int = 1000, nthreads: int = 2) -> None:
         # TODO: add informed description to docstring
         """
+        Args:
+            batch_size: Number of cells to read at a time. (Default value: 1000)
+            nthreads: Number of chunks to be compressed and written in parallel (Default value: 2)
+
         Raises:
             ValueError: Raised if there is any unexpected errors when writing to the Zarr hierarchy.
             AssertionError: Catches eventual bugs in the class, if number of cells does not match after transformation.
@@ -629,18 +1046,19 @@ class SparseToZarr:
             0,
         )
         n_chunks = self.nCells // batch_size + 1
-        for e in tqdmbar(
-            range(batch_size, self.nCells + batch_size, batch_size), total=n_chunks
-        ):
-            if s == self.nCells:
-                raise ValueError(
-                    "Unexpected error encountered in writing to Zarr. The last iteration has failed. "
-                    "Please report this issue."
-                )
-            if e > self.nCells:
-                e = self.nCells
-            store[s:e] = self.mat[:, s:e].todense().T
-            s = e
+        with ChunkedCountsWriter(store, nthreads) as writer:
+            for e in tqdmbar(
+                range(batch_size, self.nCells + batch_size, batch_size), total=n_chunks
+            ):
+                if s == self.nCells:
+                    raise ValueError(
+                        "Unexpected error encountered in writing to Zarr. The last iteration has failed. "
+                        "Please report this issue."
+                    )
+                if e > self.nCells:
+                    e = self.nCells
+                writer.write(self.mat[:, s:e].T.tocsr())
+                s = e
         if e != self.nCells:
             raise AssertionError(
                 "ERROR: This is a bug in SparseToZarr. All cells might not have been successfully "
@@ -648,6 +1066,55 @@ class SparseToZarr:
             )
 
 
+def _subset_zarr_rows(
+    in_arr: zarr.Array,
+    out_arr: zarr.Array,
+    row_idx: np.ndarray,
+    col_idx: np.ndarray = None,
+    nthreads: int = 1,
+    msg: str = None,
+) -> None:
+    """
+    Copies the selected rows (and optionally columns) of a Zarr array into another Zarr array. Each chunk row of
+    the output array is assembled in memory and written exactly once. The selected rows that fall into the same
+    chunk of the input array are read together, so each input chunk is decompressed once per output chunk row
+    that needs it. Output chunk rows are processed in parallel.
+
+    Args:
+        in_arr: Input Zarr array
+        out_arr: Output Zarr array with shape (len(row_idx), len(col_idx))
+        row_idx: Indices of the rows of `in_arr`, in the order in which they are to be written
+        col_idx: Indices of the columns of `in_arr` to be copied. All columns are copied if None.
+        nthreads: Number of output chunk rows to be processed in parallel
+        msg: Message for the progress bar
+
+    Returns:
+        None
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    row_idx = np.asarray(row_idx, dtype=int)
+    cols = slice(None) if col_idx is None else np.asarray(col_idx, dtype=int)
+    in_rows, out_rows = in_arr.chunks[0], out_arr.chunks[0]
+
+    def _write_chunk(start: int) -> None:
+        rows = row_idx[start : start + out_rows]
+        a = np.empty((len(rows), out_arr.shape[1]), dtype=out_arr.dtype)
+        src_chunks = rows // in_rows
+        for c in np.unique(src_chunks):
+            pos = np.where(src_chunks == c)[0]
+            lo, hi = rows[pos].min(), rows[pos].max() + 1
+            v = in_arr.get_orthogonal_selection((slice(lo, hi), cols))
+            a[pos] = v[rows[pos] - lo]
+        out_arr[start : start + len(rows)] = a
+
+    starts = range(0, len(row_idx), out_rows)
+    with ThreadPoolExecutor(max_workers=max(1, nthreads)) as executor:
+        futures = [executor.submit(_write_chunk, x) for x in starts]
+        for f in tqdmbar(as_completed(futures), total=len(futures), desc=msg):
+            f.result()
+
+
 def subset_assay_zarr(
     zarr_fn: str,
     in_grp: str,
@@ -655,20 +1122,19 @@ def subset_assay_zarr(
     cells_idx: np.ndarray,
     feat_idx: np.ndarray,
     chunk_size: tuple,
+    nthreads: int = 2,
 ):
     """
     Selects a subset of the data in an assay in the specified Zarr hierarchy.
 
-    For the arguments `cells_idx` and `feat_idx`, refer to the documentation for numpy.split:
-    https://numpy.org/doc/stable/reference/generated/numpy.split.html
-
     Args:
         zarr_fn: The file name for the Zarr hierarchy.
         in_grp: Group in Zarr hierarchy to subset.
         out_grp: Group name in Zarr hierarchy to write subsetted assay to.
-        cells_idx: A list of cell indices to (keep | drop ?).
-        feat_idx: A list of feature indices to (keep | drop ?).
-        chunk_size: The requested size of chunks to load into memory and process.
+        cells_idx: Indices of the cells to keep.
+        feat_idx: Indices of the features to keep.
+        chunk_size: Chunk size of the subsetted assay.
+        nthreads: Number of chunks to be processed in parallel. (Default value: 2)
 
     Returns:
         None
@@ -678,11 +1144,7 @@ def subset_assay_zarr(
     og = create_zarr_dataset(
         z, out_grp, chunk_size, "uint32", (len(cells_idx), len(feat_idx))
     )
-    pos_start, pos_end = 0, 0
-    for i in tqdmbar(np.array_split(cells_idx, len(cells_idx) // chunk_size[0] + 1)):
-        pos_end += len(i)
-        og[pos_start:pos_end, :] = ig.get_orthogonal_selection((i, feat_idx))
-        pos_start = pos_end
+    _subset_zarr_rows(ig, og, cells_idx, feat_idx, nthreads)
     return None
 
 
@@ -725,6 +1187,8 @@ class SubsetZarr:
                            this parameter to False. (Default value: True)
         overwrite_existing_file: If True, then overwrites the existing data. (Default value: False)
         overwrite_cell_data: If True, then overwrites cell data (Default value: True)
+        nthreads: Number of threads used to copy the cell data columns and the chunks of count matrices.
+                  (Default value: 2)
     """
 
     def __init__(
@@ -736,6 +1200,7 @@ class SubsetZarr:
         reset_cell_filter: bool = True,
         overwrite_existing_file: bool = False,
         overwrite_cell_data: bool = False,
+        nthreads: int = 2,
     ) -> None:
         if cell_key is None and cell_idx is None:
             raise ValueError("Both 'cell_key' and 'cell_idx' parameters cannot be None")
@@ -747,6 +1212,7 @@ class SubsetZarr:
         self.resetCells = reset_cell_filter
         self.overFn = overwrite_existing_file
         self.overcells = overwrite_cell_data
+        self.nthreads = nthreads
 
         self._check_files()
         self.iz = zarr.open(self.iZname)
@@ -781,21 +1247,30 @@ class SubsetZarr:
             self.cellIdx = np.where(idx)[0]
 
     def _prep_cell_data(self):
+        from concurrent.futures import ThreadPoolExecutor
+
         n_cells = len(self.cellIdx)
         if "cellData" in self.oz:
             g = self.oz["cellData"]
         else:
             g = self.oz.create_group("cellData")
 
-        for i in self.iz["cellData"].keys():
-            if i in g and self.overcells is False:
-                continue
+        def _copy_column(i):
             if i in ["I"] and self.resetCells:
                 create_zarr_obj_array(g, "I", [True for _ in range(n_cells)], "bool")
-                continue
+                return None
             v = self.iz["cellData"][i][:][self.cellIdx]
             create_zarr_obj_array(g, i, v, dtype=v.dtype)
 
+        cols = [
+            i
+            for i in self.iz["cellData"].keys()
+            if not (i in g and self.overcells is False)
+        ]
+        with ThreadPoolExecutor(max_workers=max(1, self.nthreads)) as executor:
+            for _ in executor.map(_copy_column, cols):
+                pass
+
     def _get_assays(self):
         assays = []
         for i in self.iz.group_keys():
@@ -804,9 +1279,7 @@ class SubsetZarr:
         return assays
 
     def _get_raw_data(self, assay_name):
-        import dask.array as daskarr
-
-        return daskarr.from_zarr(self.iz[assay_name]["counts"], inline_array=True)
+        return load_zarr_counts(self.iz[assay_name]["counts"])
 
     def _prep_counts(self):
         n_cells = len(self.cellIdx)
@@ -820,12 +1293,23 @@ class SubsetZarr:
                 self.iz[assay_name]["featureData"]["ids"][:],
                 self.iz[assay_name]["featureData"]["names"][:],
                 raw_data.dtype,
+                _is_sparse_counts(self.iz[assay_name]["counts"]),
             )
 
     def dump(self):
         for assay_name in self.assays:
-            raw_data = self._get_raw_data(assay_name)
             store = self.oz[f"{assay_name}/counts"]
+            if not _is_sparse_counts(store):
+                _subset_zarr_rows(
+                    self.iz[assay_name]["counts"],
+                    store,
+                    self.cellIdx,
+                    nthreads=self.nthreads,
+                    msg=f"Subsetting assay: {assay_name}",
+                )
+                continue
+            # Sparse (CSR) counts are appended in order of cells
+            raw_data = self._get_raw_data(assay_name)
             s, e, = (
                 0,
                 0,
@@ -837,7 +1321,7 @@ class SubsetZarr:
             ):
                 if a.shape[0] > 0:
                     e += a.shape[0]
-                    store[s:e] = a.compute()
+                    write_sparse_counts(store, a.compute().tocsr(), s)
                     s = e
 
 
@@ -860,16 +1344,20 @@ class ZarrMerge:
         reset_cell_filter: If True, then the cell filtering information is removed, i.e. even the filtered out cells
                            are set as True as in the 'I' column. To keep the filtering information set the value for
                            this parameter to False. (Default value: True)
+        sparse_counts: If True, then the merged count matrix is saved in sparse CSR layout. (Default value: False)
 
     Attributes:
         assays: List of assay objects to be merged. For example, [ds1.RNA, ds2.RNA].
         names: Names of the each assay objects in the `assays` parameter.
-        mergedCells:
+        resetCellFilter: Whether the cell filtering information is removed.
+        cellColumns: Mapping of the column names of the merged cell table to the names of the corresponding columns
+                     in the cell table of each assay (None if the column is absent in an assay).
         nCells: Number of cells in dataset.
         featCollection:
         mergedFeats:
         nFeats: Number of features in the dataset.
         featOrder:
+        sparseCounts: Whether the merged count matrix is saved in sparse CSR layout.
         z: The merged Zarr file.
         assayGroup:
     """
@@ -885,13 +1373,14 @@ class ZarrMerge:
         overwrite: bool = False,
         prepend_text: str = "orig",
         reset_cell_filter: bool = True,
+        sparse_counts: bool = False,
     ):
         self.assays = assays
         self.names = names
-        self.mergedCells: pd.DataFrame = self._merge_cell_table(
-            reset_cell_filter, prepend_text
-        )
-        self.nCells: int = self.mergedCells.shape[0]
+        self.sparseCounts = sparse_counts
+        self.resetCellFilter = reset_cell_filter
+        self.cellColumns: Dict[str, List[str]] = self._merge_cell_table(prepend_text)
+        self.nCells: int = sum([x.cells.N for x in self.assays])
         self.featCollection: List[Dict[str, str]] = self._get_feat_ids(assays)
         self.mergedFeats = self._merge_order_feats()
         self.nFeats = self.mergedFeats.shape[0]
@@ -911,39 +1400,82 @@ class ZarrMerge:
             list(self.mergedFeats.index),
             list(self.mergedFeats.names.values),
             dtype,
+            sparse_counts,
         )
 
-    def _merge_cell_table(self, reset: bool, prepend_text: str) -> pd.DataFrame:
+    def _merge_cell_table(self, prepend_text: str) -> Dict[str, List[str]]:
         """
-        Merges the cell metadata table for each sample
+        Determines the columns of the merged cell metadata table. The values are not loaded here; the columns are
+        streamed, one at a time, into the merged file by `_ini_cell_data`.
 
         Args:
-            reset: whether to remove filtering information
             prepend_text: string to add as prefix for each cell column
 
         Returns:
+            A dictionary with the merged column names as keys and, as values, the list of corresponding column
+            names in the cell table of each assay (None if the assay lacks the column)
 
         """
-        # TODO: This method is not very memory efficient
-
         if len(self.assays) != len(set(self.names)):
             raise ValueError(
                 "ERROR: A unique name should be provided for each of the assay"
             )
         if prepend_text == "":
             prepend_text = None
-        ret_val = []
-        for assay, name in zip(self.assays, self.names):
-            a = assay.cells.to_pandas_dataframe(assay.cells.columns)
-            a["ids"] = [f"{name}__{x}" for x in a["ids"]]
-            for i in a.columns:
+        ret_val = {}
+        for n, assay in enumerate(self.assays):
+            for i in assay.cells.columns:
                 if i not in ["ids", "I", "names"] and prepend_text is not None:
-                    a[f"{prepend_text}_{i}"] = assay.cells.fetch_all(i)
-                    a = a.drop(columns=[i])
-            if reset:
-                a["I"] = np.ones(len(a["ids"])).astype(bool)
-            ret_val.append(a)
-        return pd.concat(ret_val).reset_index(drop=True)
+                    col = f"{prepend_text}_{i}"
+                else:
+                    col = i
+                if col not in ret_val:
+                    ret_val[col] = [None for _ in self.assays]
+                ret_val[col][n] = i
+        return ret_val
+
+    def _iter_cell_column(self, col: str) -> Generator[np.ndarray, None, None]:
+        """
+        Yields the values of a column of the merged cell table, one assay at a time. None is yielded for the
+        assays that lack the column.
+        """
+        for assay, name, i in zip(self.assays, self.names, self.cellColumns[col]):
+            if i is None:
+                yield None
+            elif col == "ids":
+                yield np.array([f"{name}__{x}" for x in assay.cells.fetch_all(i)])
+            elif col == "I" and self.resetCellFilter:
+                yield np.ones(assay.cells.N).astype(bool)
+            else:
+                yield assay.cells.fetch_all(i)
+
+    def _merged_cell_dtype(self, col: str) -> Tuple[Any, Any]:
+        """
+        Determines the dtype of a column of the merged cell table and the value used to fill the cells of the
+        assays that lack the column. Numeric columns with missing values are cast to float and filled with NaN,
+        while other columns with missing values are saved as strings.
+        """
+        dtypes, max_len = [], 0
+        for v in self._iter_cell_column(col):
+            if v is None:
+                continue
+            dtypes.append(v.dtype)
+            if v.dtype.kind in ("U", "S", "O"):
+                max_len = max(max_len, max([len(str(x)) for x in v], default=0))
+        has_missing = len(dtypes) < len(self.assays)
+        is_str = any([x.kind in ("U", "S", "O") for x in dtypes])
+        if not has_missing and not is_str:
+            return np.result_type(*dtypes), None
+        if has_missing and not is_str and all([x.kind in "iuf" for x in dtypes]):
+            return np.float64, np.NaN
+        if not is_str:
+            max_len = max(
+                [len(str(x)) for v in self._iter_cell_column(col) if v is not None for x in v],
+                default=0,
+            )
+        if has_missing:
+            max_len = max(max_len, len(str(np.NaN)))
+        return f"U{max(max_len, 1)}", str(np.NaN)
 
     @staticmethod
     def _get_feat_ids(assays) -> List[Dict[str, str]]:
@@ -1009,7 +1541,8 @@ class ZarrMerge:
                     )
             try:
                 if not all(
-                    z["cellData"]["ids"][:] == np.array(self.mergedCells["ids"].values)
+                    z["cellData"]["ids"][:]
+                    == np.hstack(list(self._iter_cell_column("ids")))
                 ):
                     raise ValueError(
                         f"ERROR: order of cells does not match the one in existing file: {zarr_path}"
@@ -1037,36 +1570,136 @@ class ZarrMerge:
             None
 
         """
+        from numcodecs import Blosc
+
         if "cellData" not in self.z:
             g = self.z.create_group("cellData")
-            for i in self.mergedCells:
-                vals = self.mergedCells[i].values
-                create_zarr_obj_array(g, i, vals, vals.dtype)
+            compressor = Blosc(cname="lz4", clevel=5, shuffle=Blosc.BITSHUFFLE)
+            for i in self.cellColumns:
+                dtype, fill_value = self._merged_cell_dtype(i)
+                za = g.create_dataset(
+                    i,
+                    chunks=(100000,),
+                    shape=self.nCells,
+                    dtype=dtype,
+                    overwrite=True,
+                    compressor=compressor,
+                )
+                pos = 0
+                for assay, v in zip(self.assays, self._iter_cell_column(i)):
+                    if v is None:
+                        v = np.full(assay.cells.N, fill_value)
+                    za[pos : pos + len(v)] = v.astype(dtype)
+                    pos += len(v)
         else:
             logger.info(f"cellData already exists so skipping _ini_cell_data")
 
-    def dump(self, nthreads=2):
+    def _iter_remapped_blocks(
+        self, assay, feat_order: np.ndarray, nthreads: int, pbar
+    ) -> Generator[csr_matrix, None, None]:
+        """
+        Yields the blocks of an assay as CSR matrices with the columns remapped to the merged feature order.
+        """
+        for i in assay.rawData.blocks:
+            a = _compute_csr_block(i, nthreads)
+            yield csr_matrix(
+                (a.data, feat_order[a.indices], a.indptr),
+                shape=(i.shape[0], self.nFeats),
+            )
+            pbar.update(1)
+
+    def _write_dense(self, mat: csr_matrix, start: int, locks: dict) -> None:
         """
-        Copy the values from individual assays to the merged assay.
+        Scatters the nonzero values of a CSR matrix into a dense buffer of the target dtype and writes it to
+        the merged assay. The rows must lie within one chunk of the merged assay. Writes to chunks that are
+        shared between assays are serialized using the chunk's lock.
+        """
+        a = np.zeros(mat.shape, dtype=self.assayGroup.dtype)
+        coo = mat.tocoo()
+        a[coo.row, coo.col] = coo.data
+        lock = locks.get(start // self.assayGroup.chunks[0])
+        if lock is None:
+            self.assayGroup[start : start + a.shape[0], :] = a
+        else:
+            with lock:
+                self.assayGroup[start : start + a.shape[0], :] = a
+
+    def _dump_dense(
+        self, assay, feat_order: np.ndarray, start: int, nthreads: int, locks, pbar
+    ) -> None:
+        """
+        Copies the values of an assay into its cell range of the merged assay. Each write covers the
+        full width of one row of chunks of the merged assay.
+        """
+        chunk_rows = self.assayGroup.chunks[0]
+        pending, pos = None, start
+        for a in self._iter_remapped_blocks(assay, feat_order, nthreads, pbar):
+            pending = a if pending is None else vstack([pending, a], format="csr")
+            while pending.shape[0] > 0:
+                n = (pos // chunk_rows + 1) * chunk_rows - pos
+                if pending.shape[0] < n:
+                    break
+                self._write_dense(pending[:n], pos, locks)
+                pending, pos = pending[n:], pos + n
+        if pending is not None and pending.shape[0] > 0:
+            self._write_dense(pending, pos, locks)
+
+    def dump(self, nthreads=2, n_workers: int = None):
+        """
+        Copy the values from individual assays to the merged assay. Only the nonzero values are scattered into
+        write buffers, which have the dtype of the merged assay. For the dense layout, the assays are copied
+        concurrently since each of them is written to a separate range of cells. The sparse (CSR) layout must be
+        written in order of cells, hence the assays are copied one after another.
 
         Args:
             nthreads: Number of compute threads to use. (Default value: 2)
+            n_workers: Number of assays to be copied concurrently. Only used for the dense layout.
+                       (Default value: same as `nthreads`)
 
         Returns:
 
         """
-        pos_start, pos_end = 0, 0
-        for assay, feat_order in zip(self.assays, self.featOrder):
-            for i in tqdmbar(
-                assay.rawData.blocks,
-                total=assay.rawData.numblocks[0],
-                desc=f"Writing data to merged file",
+        from concurrent.futures import ThreadPoolExecutor
+        import threading
+
+        starts = np.cumsum([0] + [x.cells.N for x in self.assays])
+        pbar = tqdmbar(
+            total=sum([x.rawData.numblocks[0] for x in self.assays]),
+            desc="Writing data to merged file",
+        )
+        if self.sparseCounts:
+            for assay, feat_order, start in zip(
+                self.assays, self.featOrder, starts
             ):
-                pos_end += i.shape[0]
-                a = np.zeros((i.shape[0], self.nFeats))
-                a[:, feat_order] = controlled_compute(i, nthreads)
-                self.assayGroup[pos_start:pos_end, :] = a
-                pos_start = pos_end
+                pos = start
+                for a in self._iter_remapped_blocks(assay, feat_order, nthreads, pbar):
+                    write_sparse_counts(self.assayGroup, a, pos)
+                    pos += a.shape[0]
+            pbar.close()
+            return None
+
+        # Chunks that hold cells from more than one assay are guarded by a lock
+        chunk_rows = self.assayGroup.chunks[0]
+        locks = {
+            x // chunk_rows: threading.Lock()
+            for x in starts[1:-1]
+            if x % chunk_rows != 0
+        }
+        if n_workers is None:
+            n_workers = nthreads
+        n_workers = max(1, min(n_workers, len(self.assays)))
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = [
+                executor.submit(
+                    self._dump_dense, assay, feat_order, start, nthreads, locks, pbar
+                )
+                for assay, feat_order, start in zip(
+                    self.assays, self.featOrder, starts
+                )
+            ]
+            for f in futures:
+                f.result()
+        pbar.close()
 
 
 def to_h5ad(assay, h5ad_filename: str) -> None:
@@ -1100,7 +1733,7 @@ def to_h5ad(assay, h5ad_filename: str) -> None:
     h5["X/indptr"][:] = np.array([0] + list(n_feats_per_cell.cumsum())).astype(int)
     s, e = 0, 0
     for i in tqdmbar(assay.rawData.blocks, total=assay.rawData.numblocks[0]):
-        i = csr_matrix(i.compute()).astype(int)
+        i = _compute_csr_block(i, assay.nthreads).astype(int)
         e += i.data.shape[0]
         h5["X/data"][s:e] = i.data
         h5["X/indices"][s:e] = i.indices
@@ -1171,7 +1804,7 @@ def to_mtx(assay, mtx_directory: str, compress: bool = False):
     h.write(f"{assay.feats.N} {assay.cells.N} {tot_counts}\n")
     s = 0
     for i in tqdmbar(assay.rawData.blocks, total=assay.rawData.numblocks[0]):
-        i = coo_matrix((i.compute()))
+        i = coo_matrix(_compute_csr_block(i, assay.nthreads))
         df = pd.DataFrame({"col": i.col + 1, "row": i.row + s + 1, "d": i.data})
         df.to_csv(h, sep=" ", header=False, index=False, mode="a", line_terminator="\n")
         s += i.shape[0]